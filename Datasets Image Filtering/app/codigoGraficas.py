@@ -6,6 +6,9 @@ Google Earth Engine y generar las visualizaciones gráficas correspondientes.
 El código para graficar LST y Precipitación se conserva pero está desactivado,
 ya que la lógica para obtener esos datos no se encontró en los scripts de prueba.
 
+Para muchas series sin pantalla, el servidor (app2, POST /graficas) dibuja estas
+mismas gráficas con el backend Agg en un pool de procesos y guarda los PNG/SVG.
+
 Para que este script funcione, necesitas tener instaladas las siguientes librerías:
 - earthengine-api: para interactuar con Google Earth Engine.
 - matplotlib: para generar las gráficas.
@@ -34,6 +37,10 @@ def obtener_serie_temporal_ndvi(lat, lon, anio_inicio=2020, anio_fin=2023):
     
     NOTA: Esta función solo obtiene NDVI. Los valores para LST y precipitación
     se devuelven como None.
+
+    La colección se acota a las escenas que cubren el punto y a los años pedidos.
+    El servidor (app2, POST /serie-ndvi) ofrece la misma serie de forma incremental,
+    guardando los meses ya calculados.
     """
     print(f"Consultando datos de NDVI para lat={lat}, lon={lon}...")
     
@@ -47,7 +54,11 @@ def obtener_serie_temporal_ndvi(lat, lon, anio_inicio=2020, anio_fin=2023):
             ndvi = img.normalizedDifference(['B8', 'B4']).rename('NDVI')
             return img.addBands(ndvi).updateMask(good_quality)
 
-        s2_ndvi = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED').map(add_ndvi)
+        # Sólo las escenas que cubren el punto en los años pedidos, no la colección global
+        s2_ndvi = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
+                   .filterBounds(pt)
+                   .filterDate(f'{anio_inicio}-01-01', f'{anio_fin + 1}-01-01')
+                   .map(add_ndvi))
 
         meses = ee.List.sequence(1, 12)
         anios = ee.List.sequence(anio_inicio, anio_fin)
@@ -59,7 +70,7 @@ def obtener_serie_temporal_ndvi(lat, lon, anio_inicio=2020, anio_fin=2023):
                 return mediana.set('system:time_start', fecha_inicio.millis())
             return meses.map(generar_mediana)
 
-        monthly_ndvi_collection = ee.ImageCollection.fromImages(anios.map(generar_mediana).flatten())
+        monthly_ndvi_collection = ee.ImageCollection.fromImages(anios.map(generar_mediana_mensual).flatten())
 
         def extraer_valor_ndvi(img):
             valor = img.reduceRegion(reducer=ee.Reducer.mean(), geometry=pt, scale=30).get('NDVI')
@@ -115,6 +126,7 @@ def graficar_factores_ambientales(datos_temporales):
     """
     Genera una gráfica comparativa de NDVI, LST y Precipitación.
     NOTA: Esta función no se ejecutará si faltan los datos de LST o precipitación.
+    El servidor (app2, POST /serie-factores) devuelve las tres series en este formato.
     """
     if not datos_temporales or not datos_temporales.get('timeseries'):
         print("No hay datos para graficar.")
@@ -153,6 +165,7 @@ def graficar_factores_ambientales(datos_temporales):
 def graficar_ndvi_con_tendencia(datos_temporales):
     """
     Genera la gráfica de NDVI y superpone la línea de tendencia de regresión lineal.
+    Para mapas de tendencia por píxel de una región entera, ver app2/tendencias.py.
     """
     if not datos_temporales or not datos_temporales.get('timeseries'):
         print("No hay datos para graficar.")
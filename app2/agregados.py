@@ -0,0 +1,54 @@
+# agregados.py
+"""
+Agregados parciales combinables: (suma, conteo, suma de cuadrados).
+
+Una reducción hecha por partes (celdas de la caché espacial, teselas de una
+región grande) se combina sumando los agregados de cada parte; la media y la
+desviación resultantes son exactamente las de reducir la región completa con
+un reductor no ponderado.
+"""
+import math
+
+import ee
+
+# Sufijo de la banda auxiliar con el cuadrado de cada valor
+SUFIJO_CUADRADO = '__cuad'
+
+
+def reductor_agregados():
+    """sum + count no ponderados: cada píxel cuenta entero en la parte que contiene su centro."""
+    return ee.Reducer.sum().combine(ee.Reducer.count(), sharedInputs=True).unweighted()
+
+
+def pila_agregados(bandas):
+    """Imagen con cada banda y su cuadrado, lista para reductor_agregados."""
+    return ee.Image.cat([img.rename(nombre) for nombre, img in bandas.items()]
+                        + [img.pow(2).rename(nombre + SUFIJO_CUADRADO) for nombre, img in bandas.items()])
+
+
+def agregado_desde_salida(salida, nombre):
+    """Lee (suma, conteo, suma_cuadrados) de la salida de reductor_agregados."""
+    conteo = salida.get(f'{nombre}_count') or 0
+    if not conteo:
+        return (0.0, 0, 0.0)
+    return (float(salida.get(f'{nombre}_sum') or 0.0), int(conteo),
+            float(salida.get(f'{nombre}{SUFIJO_CUADRADO}_sum') or 0.0))
+
+
+def sumar(agregados):
+    suma = conteo = cuadrados = 0
+    for s, n, q in agregados:
+        suma += s
+        conteo += n
+        cuadrados += q
+    return (suma, conteo, cuadrados)
+
+
+def resumir(agregado):
+    """-> (media, desviacion poblacional, pixeles); media None si no hay píxeles."""
+    suma, conteo, cuadrados = agregado
+    if not conteo:
+        return None, None, 0
+    media = suma / conteo
+    varianza = max(0.0, cuadrados / conteo - media * media)
+    return media, math.sqrt(varianza), conteo
@@ -1,20 +1,53 @@
 # app.py
-from flask import Flask, render_template, request, jsonify
-import ee
+from flask import Flask, Response, render_template, request, jsonify, send_file, stream_with_context
+import os
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+# Con SUPERBLOOM_EE_BACKEND=local, `ee` se resuelve al backend local sobre NumPy (ee_local.py)
+if os.environ.get('SUPERBLOOM_EE_BACKEND', 'gee') == 'local':
+    import ee_local
+    ee_local.instalar()
+import ee
+import json
+import hashlib
+import math
+import time
+import contextvars
+import threading
+from concurrent.futures import TimeoutError as FuturesTimeout, as_completed
+from cache_resultados import CacheResultados, canonizar_coords, clave_canonica
+from cache_mapas import CacheMapIds
+from cache_celdas import CacheCeldas, ajustar_a_rejilla, area_km2, id_celda, indices_celdas, limites_celda
+from agregados import agregado_desde_salida, pila_agregados, reductor_agregados, resumir, sumar
+from teselas import dividir_igual_area, margen_geodesico, pixeles_estimados, teselas_necesarias
+from coste import ACCIONES, cota_escenas, escenas_por_pixel, factor_reduccion
+from resolucion import elegir_escala, opciones_reduccion
+from muestreo import estimar_estratificado, numero_estratos, tamano_muestra
+from climatologia import AlmacenClimatologia, puntuacion_z
+from trabajos import GestorTrabajos
+from coalescencia import VueloUnico
+from microlotes import AgrupadorGetInfo
+from graficas import FORMATOS, GRAFICAS, TIPOS_MIME, AlmacenGraficas, validar_serie
+from series import AlmacenSeries, id_punto, mediana, mes_consolidado, meses_entre, siguiente_mes
+from ejecutor import (ColaLlena, EjecutorAcotado, Plazo, PlazoExcedido, con_plazo,
+                      plazo_actual, restaurar_plazo, verificar_plazo)
 
 # ===========================================
 # 1️⃣ INICIALIZACIÓN DE EARTH ENGINE
 # ===========================================
-try:
-    ee.Initialize(project='super-bloom')
-    print("✅ Google Earth Engine inicializado correctamente.")
-except Exception as e:
-    print("🪪 Autenticando con Google Earth Engine...")
-    ee.Authenticate()   
-    ee.Initialize(project='super-bloom')
-    print("✅ Autenticación completada.")
+# Con `python app.py`, los procesos de renderizado de gráficas (spawn/forkserver)
+# vuelven a importar este módulo como __mp_main__: en ellos no se inicializa Earth
+# Engine ni se reanudan trabajos, sólo se definen constantes y funciones.
+PROCESO_PRINCIPAL = __name__ != '__mp_main__'
+
+if PROCESO_PRINCIPAL:
+    try:
+        ee.Initialize(project='super-bloom')
+        print("✅ Google Earth Engine inicializado correctamente.")
+    except Exception as e:
+        print("🪪 Autenticando con Google Earth Engine...")
+        ee.Authenticate()
+        ee.Initialize(project='super-bloom')
+        print("✅ Autenticación completada.")
 
 # ===========================================
 # 2️⃣ CONSTANTES Y FUNCIONES AUXILIARES
@@ -22,9 +55,172 @@ except Exception as e:
 S2_COLLECTION = 'COPERNICUS/S2_SR_HARMONIZED'
 LST_COLLECTION = 'MODIS/061/MOD11A2'
 GPM_COLLECTION = 'NASA/GPM_L3/IMERG_V06'
+# NDVI/EVI ya calculados a 250 m: respuesta preliminar del modo progresivo
+MODIS_VI_COLLECTION = 'MODIS/061/MOD13Q1'
+MODIS_VI_ESCALA = 250
 S2_BANDS = {'NIR': 'B8', 'RED': 'B4', 'GREEN': 'B3', 'BLUE': 'B2', 'SCL': 'SCL'}
 EVI_CONSTANTS = {"G": 2.5, "L": 1, "C1": 6, "C2": 7.5}
 
+# Sensor y colección de los que sale cada rama de análisis (se etiqueta cada valor)
+SENSOR_VARIABLE = {
+    'ndvi': ('Sentinel-2 MSI', S2_COLLECTION),
+    'indices': ('Sentinel-2 MSI', S2_COLLECTION),
+    'temperatura': ('MODIS Terra', LST_COLLECTION),
+    'precipitacion': ('GPM IMERG', GPM_COLLECTION),
+    'modis_vi': ('MODIS Terra', MODIS_VI_COLLECTION),
+}
+
+# Lo que se puede pedir con `variables`, `indices` y `layers` (por defecto, todo):
+# ramas de análisis, índices de la mediana S2 actual y capas de mapa por variable
+VARIABLES_ANALISIS = ('ndvi', 'temperatura', 'precipitacion')
+INDICES_S2 = ('evi', 'ndsi_floral')
+CAPAS_MAPA = ('actual', 'historico', 'diferencia')
+SELECCION_COMPLETA = {
+    'variables': list(VARIABLES_ANALISIS),
+    'indices': list(INDICES_S2),
+    'capas': [f'{variable}.{capa}' for variable in VARIABLES_ANALISIS for capa in CAPAS_MAPA],
+}
+
+# Escala de reducción (m) de cada rama de análisis y estadísticos extra del reductor
+ESCALAS_VARIABLE = {'ndvi': 100, 'indices': 100, 'temperatura': 1000, 'precipitacion': 1000}
+# Resolución adaptativa: la escala de cada variable se elige por área y plazo, sin
+# bajar de su resolución útil. Con SUPERBLOOM_RESOLUCION_ADAPTATIVA=0 se usan las fijas.
+RESOLUCION_ADAPTATIVA = os.environ.get('SUPERBLOOM_RESOLUCION_ADAPTATIVA', '1') == '1'
+ESCALAS_MINIMAS = {'ndvi': 10, 'indices': 10, 'temperatura': 1000, 'precipitacion': 1000}
+# Píxeles por segundo de plazo que se presupuestan para cada reducción
+RENDIMIENTO_PIXELES = float(os.environ.get('SUPERBLOOM_RENDIMIENTO_PIXELES', 1e4))
+ESTADISTICAS_EXTRA = tuple(e for e in os.environ.get('SUPERBLOOM_ESTADISTICAS', 'stdDev,count').split(',') if e)
+PERCENTILES = [10, 50, 90]
+
+# Origen de cada variable para el estimador de coste: alias de colección, colección,
+# huella de una escena en km² (None = imagen global) y escenas por píxel y día
+FUENTES_VARIABLE = {
+    'ndvi': ('s2', S2_COLLECTION, 12100, 2 / 5),
+    'indices': ('s2', S2_COLLECTION, 12100, 2 / 5),
+    'temperatura': ('lst', LST_COLLECTION, None, 1 / 8),
+    'precipitacion': ('gpm', GPM_COLLECTION, None, 48),
+}
+# Coste máximo (lecturas píxel-escena) y qué hacer con las peticiones que lo superan
+COSTE_MAX = float(os.environ.get('SUPERBLOOM_COSTE_MAX', 5e9))
+COSTE_ACCION = os.environ.get('SUPERBLOOM_COSTE_ACCION', 'reducir')
+if COSTE_ACCION not in ACCIONES:
+    raise ValueError(f"SUPERBLOOM_COSTE_ACCION debe ser una de {ACCIONES}")
+
+# Modo estimador por muestreo: semiancho del IC95 objetivo en desviaciones típicas
+PRECISION_MUESTREO = float(os.environ.get('SUPERBLOOM_PRECISION_MUESTREO', 0.05))
+
+# Regiones cuya reducción superaría este número de píxeles se reparten en teselas
+TESELA_MAX_PIXELES = float(os.environ.get('SUPERBLOOM_TESELA_MAX_PIXELES', 4e6))
+TESELA_INTENTOS = int(os.environ.get('SUPERBLOOM_TESELA_INTENTOS', 3))
+# Tareas del ejecutor de teselas que puede ocupar una petición
+TESELAS_CONCURRENTES = int(os.environ.get('SUPERBLOOM_TESELAS_CONCURRENTES', 8))
+
+# Ejecutores compartidos por todas las peticiones y plazo máximo por petición
+PLAZO_PETICION = float(os.environ.get('SUPERBLOOM_PLAZO_PETICION', 120))
+PLAZO_TRABAJO = float(os.environ.get('SUPERBLOOM_PLAZO_TRABAJO', 1800))
+ejecutor_analisis = EjecutorAcotado(
+    'analisis',
+    max_workers=int(os.environ.get('SUPERBLOOM_EJECUTOR_WORKERS', 16)),
+    max_cola=int(os.environ.get('SUPERBLOOM_EJECUTOR_COLA', 64)),
+)
+ejecutor_mapas = EjecutorAcotado(
+    'mapid',
+    max_workers=int(os.environ.get('SUPERBLOOM_MAPID_WORKERS', 18)),
+    max_cola=int(os.environ.get('SUPERBLOOM_MAPID_COLA', 200)),
+)
+# Las teselas van a su propio ejecutor: las ramas del stream, que ya son tareas de
+# ejecutor_analisis, esperan a sus teselas, y en el mismo pool podrían no empezar nunca
+ejecutor_teselas = EjecutorAcotado(
+    'teselas',
+    max_workers=int(os.environ.get('SUPERBLOOM_TESELAS_WORKERS', 16)),
+    max_cola=int(os.environ.get('SUPERBLOOM_TESELAS_COLA', 256)),
+)
+# GEE no admite un plazo por llamada: se acota cada llamada HTTP al plazo más largo
+if PROCESO_PRINCIPAL:
+    ee.data.setDeadline(int(max(PLAZO_PETICION, PLAZO_TRABAJO) * 1000))
+
+# Caché de resultados (memoria + disco). Configurable por variables de entorno.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DB = os.environ.get('SUPERBLOOM_CACHE_DB', os.path.join(BASE_DIR, 'cache_resultados.sqlite3'))
+CACHE_PRECISION_COORDS = int(os.environ.get('SUPERBLOOM_CACHE_PRECISION', 3))
+cache_resultados = CacheResultados(
+    CACHE_DB,
+    max_memoria=int(os.environ.get('SUPERBLOOM_CACHE_MAX_MEMORIA', 256)),
+    max_disco=int(os.environ.get('SUPERBLOOM_CACHE_MAX_DISCO', 5000)),
+    ttl_abierto=int(os.environ.get('SUPERBLOOM_CACHE_TTL_ABIERTO', 3600)),
+    ttl_cerrado=int(os.environ.get('SUPERBLOOM_CACHE_TTL_CERRADO', 24 * 3600)),
+)
+# Caché espacial por celdas: rectángulos parecidos reutilizan las celdas ya calculadas.
+# Con SUPERBLOOM_CELDAS_GRADOS=0 se desactiva y se reduce siempre la región exacta.
+cache_celdas = CacheCeldas(
+    os.environ.get('SUPERBLOOM_CELDAS_DB', CACHE_DB),
+    tamano=float(os.environ.get('SUPERBLOOM_CELDAS_GRADOS', 0.01)),
+    max_filas=int(os.environ.get('SUPERBLOOM_CELDAS_MAX_FILAS', 500000)),
+    ttl_abierto=int(os.environ.get('SUPERBLOOM_CACHE_TTL_ABIERTO', 3600)),
+    ttl_cerrado=int(os.environ.get('SUPERBLOOM_CELDAS_TTL_CERRADO', 7 * 24 * 3600)),
+)
+CELDAS_MAX_POR_PETICION = int(os.environ.get('SUPERBLOOM_CELDAS_MAX', 4000))
+# Fracción mínima de la unión de celdas que debe caer dentro del rectángulo pedido
+CELDAS_COBERTURA_MIN = float(os.environ.get('SUPERBLOOM_CELDAS_COBERTURA_MIN', 0.7))
+
+# Línea base climatológica: agregados mensuales por celda precalculados con POST /climatologia.
+# Variable -> (prefijo de sus bandas, si es acumulada) y escala a la que se precalcula.
+CLIMATOLOGIA_VARIABLES = {'ndvi': ('ndvi', False), 'temperatura': ('lst', False), 'precipitacion': ('precip', True)}
+ESCALAS_CLIMATOLOGIA = {'ndvi': 100, 'temperatura': 1000, 'precipitacion': 1000}
+CLIMATOLOGIA_ANIOS_MIN = int(os.environ.get('SUPERBLOOM_CLIMATOLOGIA_ANIOS_MIN', 3))
+CLIMATOLOGIA_MAX_CELDAS = int(os.environ.get('SUPERBLOOM_CLIMATOLOGIA_MAX_CELDAS', 20000))
+almacen_climatologia = AlmacenClimatologia(
+    os.environ.get('SUPERBLOOM_CLIMATOLOGIA_DB', CACHE_DB),
+    tamano=float(os.environ.get('SUPERBLOOM_CLIMATOLOGIA_GRADOS', 0.05)),
+)
+
+# Series mensuales por punto o región: los meses consolidados se anexan y no se vuelven a pedir
+almacen_series = AlmacenSeries(os.environ.get('SUPERBLOOM_SERIES_DB', CACHE_DB))
+SERIE_ESCALA_NDVI = 10
+SERIE_MAX_MESES = int(os.environ.get('SUPERBLOOM_SERIE_MAX_MESES', 120))
+# Variable de la serie -> (rama de análisis, clave en la respuesta, días tras el fin del mes
+# hasta que sus datos se consideran definitivos: IMERG final llega con ~3,5 meses de retraso)
+SERIE_VARIABLES = {
+    'ndvi': ('ndvi', 'ndvi', 5),
+    'lst': ('temperatura', 'lst', 16),
+    'precip': ('precipitacion', 'precipitation', 120),
+}
+
+# Gráficas PNG/SVG dibujadas en un pool de procesos y guardadas por hash de su serie
+almacen_graficas = AlmacenGraficas(
+    os.environ.get('SUPERBLOOM_GRAFICAS_DIR', os.path.join(BASE_DIR, 'graficas')),
+    procesos=int(os.environ.get('SUPERBLOOM_GRAFICAS_PROCESOS', 2)),
+)
+GRAFICAS_MAX_SERIES = int(os.environ.get('SUPERBLOOM_GRAFICAS_MAX_SERIES', 200))
+
+# Peticiones idénticas simultáneas comparten un único cálculo
+vuelos_analisis = VueloUnico('analisis')
+vuelos_getinfo = VueloUnico('getinfo')
+# Microlotes de getInfo: opcionales. Sólo con SUPERBLOOM_GETINFO_VENTANA_MS > 0 las
+# evaluaciones de peticiones concurrentes que llegan dentro de la ventana viajan juntas.
+# No hay una medición que muestre ganancia frente a getInfo independientes, así que por
+# defecto el agrupador ni se crea y cada evaluación es un getInfo directo en su hilo.
+# El pool hace los getInfo conjuntos: al menos tantos hilos como llamadores concurrentes.
+GETINFO_VENTANA = float(os.environ.get('SUPERBLOOM_GETINFO_VENTANA_MS', 0)) / 1000
+agrupador_getinfo = AgrupadorGetInfo(
+    'getinfo',
+    ventana=GETINFO_VENTANA,
+    max_lote=int(os.environ.get('SUPERBLOOM_GETINFO_MAX_LOTE', 32)),
+    max_workers=int(os.environ.get('SUPERBLOOM_GETINFO_WORKERS', ejecutor_analisis.max_workers)),
+) if GETINFO_VENTANA > 0 else None
+
+def evaluar_getinfo(ee_object):
+    if agrupador_getinfo is None:
+        return ee_object.getInfo()
+    return agrupador_getinfo.evaluar(ee_object)
+
+# Caché de MapIds: las URLs de teselas se reutilizan y se renuevan antes de caducar
+cache_mapas = CacheMapIds(
+    duracion_token=int(os.environ.get('SUPERBLOOM_MAPID_DURACION', 4 * 3600)),
+    margen_refresco=float(os.environ.get('SUPERBLOOM_MAPID_MARGEN', 0.2)),
+    ejecutor=ejecutor_mapas,
+)
+
 def mask_s2_clouds(img):
     scl = img.select('SCL')
     good_quality = scl.eq(4).Or(scl.eq(5)).Or(scl.eq(6)).Or(scl.eq(11))
@@ -35,11 +231,27 @@ def to_celsius(img):
     return img.addBands(lst)
 
 def get_info_safe(ee_object, default_value=None):
-    try: return ee_object.getInfo()
+    verificar_plazo()
+    try: return evaluar_getinfo(ee_object)
     except ee.EEException as e:
         print(f"Error GEE: {e}", file=sys.stderr)
         return default_value
 
+# Evalúa un dict {clave: objeto ee} en un solo viaje a GEE. Si el lote falla se
+# reintenta clave por clave con get_info_safe: un valor inválido sólo anula su clave.
+def get_info_lote(ee_objects, default_value=None):
+    if not ee_objects: return {}
+    verificar_plazo()
+    diccionario = ee.Dictionary(ee_objects)
+    # Evaluaciones idénticas en curso (mismo grafo serializado) se comparten
+    clave = hashlib.sha256(diccionario.serialize().encode('utf-8')).hexdigest()
+    try:
+        info = vuelos_getinfo.ejecutar(clave, evaluar_getinfo, diccionario) or {}
+    except ee.EEException as e:
+        print(f"Error GEE (lote): {e}", file=sys.stderr)
+        return {clave: get_info_safe(obj, default_value) for clave, obj in ee_objects.items()}
+    return {clave: default_value if info.get(clave) is None else info[clave] for clave in ee_objects}
+
 def interpretar_cambio(valor, umbral_alto=0.1, umbral_bajo=0.02, tipo=""):
     if valor is None: return "No se pudo calcular."
     if valor > umbral_alto: return f"Aumento significativo de {tipo}."
@@ -48,6 +260,14 @@ def interpretar_cambio(valor, umbral_alto=0.1, umbral_bajo=0.02, tipo=""):
     if valor < -umbral_bajo: return f"Ligero descenso de {tipo}."
     return "Cambio insignificante."
 
+def interpretar_anomalia(z, tipo=""):
+    if z is None: return "Sin climatología suficiente."
+    if z >= 2: return f"Anomalía fuerte: {tipo} muy por encima de lo habitual."
+    if z >= 1: return f"{tipo.capitalize()} por encima de lo habitual."
+    if z <= -2: return f"Anomalía fuerte: {tipo} muy por debajo de lo habitual."
+    if z <= -1: return f"{tipo.capitalize()} por debajo de lo habitual."
+    return "Dentro de lo habitual para la época."
+
 def interpretar_precipitacion(valor):
     if valor is None: return "No se pudo calcular."
     if valor < 1: return "Precipitación muy baja o nula."
@@ -59,148 +279,1075 @@ def interpretar_precipitacion(valor):
 # 3️⃣ FUNCIONES DE ANÁLISIS POR VARIABLE
 # ===========================================
 
-def analizar_ndvi(region, s2_collection, h_start, h_end, c_start, c_end):
-    s2_current_col = s2_collection.filterDate(c_start, c_end).map(mask_s2_clouds)
-    s2_historic_col = s2_collection.filterDate(h_start, h_end).map(mask_s2_clouds)
-    
-    img_current = s2_current_col.median().clip(region)
+# Sólo se piden a GEE las capas seleccionadas (None = todas)
+def urls_capas(variable, capas_mapa, capas=None):
+    if capas is not None:
+        capas_mapa = {nombre: capa for nombre, capa in capas_mapa.items() if nombre in capas}
+    return {variable: cache_mapas.obtener_urls(capas_mapa)} if capas_mapa else {}
+
+# Con historico=False (línea base climatológica) sólo se construye la ventana actual
+def analizar_ndvi(region, s2_collection, img_current, h_start, h_end, c_start, c_end, historico=True, capas=None):
     ndvi_current = img_current.normalizedDifference(['B8', 'B4']).rename('NDVI')
-    ndvi_historic = s2_historic_col.median().normalizedDifference(['B8', 'B4']).rename('NDVI').clip(region)
-    ndvi_diff = ndvi_current.subtract(ndvi_historic).rename('NDVI_diff')
-
-    reducer_mean = ee.Reducer.mean()
-    scale = 100
-    vals = {
-        'ndvi_c': get_info_safe(ndvi_current.reduceRegion(reducer_mean, region, scale).get('NDVI')),
-        'ndvi_h': get_info_safe(ndvi_historic.reduceRegion(reducer_mean, region, scale).get('NDVI')),
-        'ndvi_d': get_info_safe(ndvi_diff.reduceRegion(reducer_mean, region, scale).get('NDVI_diff'))
-    }
+    bandas = {'ndvi_c': ndvi_current}
+    capas_mapa = {'actual': (ndvi_current, {'min': 0, 'max': 0.8, 'palette': ['red', 'yellow', 'green']})}
 
-    map_urls = {
-        'ndvi': {
-            'actual': ndvi_current.getMapId({'min': 0, 'max': 0.8, 'palette': ['red', 'yellow', 'green']})['tile_fetcher'].url_format,
-            'historico': ndvi_historic.getMapId({'min': 0, 'max': 0.8, 'palette': ['red', 'yellow', 'green']})['tile_fetcher'].url_format,
-            'diferencia': ndvi_diff.getMapId({'min': -0.3, 'max': 0.3, 'palette': ['red', 'white', 'green']})['tile_fetcher'].url_format
-        }
-    }
+    if historico:
+        s2_historic_col = s2_collection.filterDate(h_start, h_end).map(mask_s2_clouds)
+        ndvi_historic = s2_historic_col.median().normalizedDifference(['B8', 'B4']).rename('NDVI').clip(region)
+        ndvi_diff = ndvi_current.subtract(ndvi_historic).rename('NDVI_diff')
+        bandas.update({'ndvi_h': ndvi_historic, 'ndvi_d': ndvi_diff})
+        capas_mapa.update({
+            'historico': (ndvi_historic, {'min': 0, 'max': 0.8, 'palette': ['red', 'yellow', 'green']}),
+            'diferencia': (ndvi_diff, {'min': -0.3, 'max': 0.3, 'palette': ['red', 'white', 'green']})
+        })
+
+    map_urls = urls_capas('ndvi', capas_mapa, capas)
 
-    return vals, map_urls
+    return bandas, map_urls
 
-def analizar_lst(region, lst_collection, h_start, h_end, c_start, c_end):
+def analizar_lst(region, lst_collection, h_start, h_end, c_start, c_end, historico=True, capas=None):
     lst_current = lst_collection.filterDate(c_start, c_end).map(to_celsius).select('LST').mean().clip(region)
-    lst_historic = lst_collection.filterDate(h_start, h_end).map(to_celsius).select('LST').mean().clip(region)
-    lst_diff = lst_current.subtract(lst_historic).rename('LST_diff')
-
-    reducer_mean = ee.Reducer.mean()
-    vals = {
-        'lst_c': get_info_safe(lst_current.reduceRegion(reducer_mean, region, 1000).get('LST')),
-        'lst_h': get_info_safe(lst_historic.reduceRegion(reducer_mean, region, 1000).get('LST')),
-        'lst_d': get_info_safe(lst_diff.reduceRegion(reducer_mean, region, 1000).get('LST_diff'))
+    bandas = {'lst_c': lst_current}
+    capas_mapa = {'actual': (lst_current, {'min': 10, 'max': 45, 'palette': ['blue', 'cyan', 'yellow', 'red']})}
+
+    if historico:
+        lst_historic = lst_collection.filterDate(h_start, h_end).map(to_celsius).select('LST').mean().clip(region)
+        lst_diff = lst_current.subtract(lst_historic).rename('LST_diff')
+        bandas.update({'lst_h': lst_historic, 'lst_d': lst_diff})
+        capas_mapa.update({
+            'historico': (lst_historic, {'min': 10, 'max': 45, 'palette': ['blue', 'cyan', 'yellow', 'red']}),
+            'diferencia': (lst_diff, {'min': -5, 'max': 5, 'palette': ['blue', 'white', 'red']})
+        })
+
+    map_urls = urls_capas('temperatura', capas_mapa, capas)
+
+    return bandas, map_urls
+
+def analizar_precip(region, gpm_collection, h_start, h_end, c_start, c_end, historico=True, capas=None):
+    precip_current = gpm_collection.filterDate(c_start, c_end).select('precipitationCal').sum().clip(region)
+    bandas = {'precip_c': precip_current}
+    capas_mapa = {'actual': (precip_current, {'min': 0, 'max': 50, 'palette': ['white', 'blue', 'purple']})}
+
+    if historico:
+        precip_historic = gpm_collection.filterDate(h_start, h_end).select('precipitationCal').sum().clip(region)
+        precip_diff_rel = precip_current.subtract(precip_historic).divide(precip_historic.add(1e-6)).rename('precip_diff_rel')
+        bandas.update({'precip_h': precip_historic, 'precip_d': precip_diff_rel})
+        capas_mapa.update({
+            'historico': (precip_historic, {'min': 0, 'max': 50, 'palette': ['white', 'blue', 'purple']}),
+            'diferencia': (precip_diff_rel, {'min': -1, 'max': 1, 'palette': ['red', 'white', 'blue']})
+        })
+
+    map_urls = urls_capas('precipitacion', capas_mapa, capas)
+
+    return bandas, map_urls
+
+def analizar_indices(region, img_current, indices=INDICES_S2):
+    bandas = {}
+    if 'evi' in indices:
+        bandas['evi_c'] = img_current.expression(
+            'G * ((NIR - RED) / (NIR + C1 * RED - C2 * BLUE + L))',
+            {'NIR': img_current.select('B8'), 'RED': img_current.select('B4'), 'BLUE': img_current.select('B2'), **EVI_CONSTANTS}
+        ).rename('EVI')
+    if 'ndsi_floral' in indices:
+        bandas['ndsi_c'] = img_current.normalizedDifference(['B3', 'B4']).rename('NDSI_floral')
+
+    return bandas, {}
+
+# Versión rápida de NDVI/EVI con MOD13Q1 (sin máscara de nubes ni mediana de S2)
+def analizar_modis_vi(region, h_start, h_end, c_start, c_end):
+    coleccion = ee.ImageCollection(MODIS_VI_COLLECTION).filterBounds(region).select(['NDVI', 'EVI'])
+    vi_current = coleccion.filterDate(c_start, c_end).median().multiply(0.0001).clip(region)
+    vi_historic = coleccion.filterDate(h_start, h_end).median().multiply(0.0001).clip(region)
+    ndvi_current = vi_current.select('NDVI')
+    ndvi_historic = vi_historic.select('NDVI')
+    bandas = {
+        'ndvi_c': ndvi_current,
+        'ndvi_h': ndvi_historic,
+        'ndvi_d': ndvi_current.subtract(ndvi_historic),
+        'evi_c': vi_current.select('EVI'),
     }
+    return bandas, {}
 
-    map_urls = {
-        'temperatura': {
-            'actual': lst_current.getMapId({'min': 10, 'max': 45, 'palette': ['blue', 'cyan', 'yellow', 'red']})['tile_fetcher'].url_format,
-            'historico': lst_historic.getMapId({'min': 10, 'max': 45, 'palette': ['blue', 'cyan', 'yellow', 'red']})['tile_fetcher'].url_format,
-            'diferencia': lst_diff.getMapId({'min': -5, 'max': 5, 'palette': ['blue', 'white', 'red']})['tile_fetcher'].url_format
-        }
+# 'variables', 'indices' y 'layers' de la petición, normalizados; ValueError si alguno no existe.
+# Una capa es 'variable.capa' o sólo 'variable' (sus tres capas).
+def seleccion_pedida(data):
+    seleccion = dict(SELECCION_COMPLETA)
+    if data.get('variables') is not None:
+        seleccion['variables'] = [v for v in VARIABLES_ANALISIS if v in data['variables']]
+        if set(data['variables']) - set(VARIABLES_ANALISIS):
+            raise ValueError(f"'variables' admite: {list(VARIABLES_ANALISIS)}.")
+    if data.get('indices') is not None:
+        seleccion['indices'] = [i for i in INDICES_S2 if i in data['indices']]
+        if set(data['indices']) - set(INDICES_S2):
+            raise ValueError(f"'indices' admite: {list(INDICES_S2)}.")
+    if data.get('layers') is not None:
+        capas = set()
+        for capa in data['layers']:
+            variable, _, nombre = capa.partition('.')
+            if variable not in VARIABLES_ANALISIS or (nombre and nombre not in CAPAS_MAPA):
+                raise ValueError(f"Capa desconocida: {capa!r}.")
+            capas.update(f'{variable}.{n}' for n in ([nombre] if nombre else CAPAS_MAPA))
+        seleccion['capas'] = [c for c in SELECCION_COMPLETA['capas'] if c in capas]
+    # Las capas de variables que no se calculan no se pueden servir
+    seleccion['capas'] = [c for c in seleccion['capas'] if c.split('.')[0] in seleccion['variables']]
+    return seleccion
+
+# Ramas de análisis (claves de ESCALAS_VARIABLE) que hay que lanzar para una selección
+def ramas_seleccionadas(seleccion):
+    seleccion = seleccion or SELECCION_COMPLETA
+    return set(seleccion['variables']) | ({'indices'} if seleccion['indices'] else set())
+
+def capas_de(seleccion, variable):
+    seleccion = seleccion or SELECCION_COMPLETA
+    return {c.split('.')[1] for c in seleccion['capas'] if c.split('.')[0] == variable}
+
+def etiquetar_fuentes(variable, nombres, escala):
+    sensor, coleccion = SENSOR_VARIABLE[variable]
+    return {nombre: {'sensor': sensor, 'coleccion': coleccion, 'resolucion_m': escala} for nombre in nombres}
+
+# ===========================================
+# 🧮 REDUCCIÓN APILADA: un reduceRegion por escala
+# ===========================================
+# Todas las bandas que comparten escala se apilan en una imagen multibanda y se
+# reducen una sola vez con un reductor combinado (media + estadísticos opcionales).
+
+def construir_reductor(extras=ESTADISTICAS_EXTRA):
+    reductor = ee.Reducer.mean()
+    if 'stdDev' in extras:
+        reductor = reductor.combine(ee.Reducer.stdDev(), sharedInputs=True)
+    if 'percentiles' in extras:
+        reductor = reductor.combine(ee.Reducer.percentile(PERCENTILES), sharedInputs=True)
+    if 'count' in extras:
+        reductor = reductor.combine(ee.Reducer.count(), sharedInputs=True)
+    return reductor
+
+def reducir_pilas(region, bandas_por_escala, extras=ESTADISTICAS_EXTRA, opciones=None):
+    reductor = construir_reductor(extras)
+    return {
+        f'escala_{escala}': ee.Image.cat([img.rename(nombre) for nombre, img in bandas.items()])
+                              .reduceRegion(reductor, region, escala, **(opciones or {}).get(escala, {}))
+        for escala, bandas in bandas_por_escala.items() if bandas
     }
 
-    return vals, map_urls
+# Una pila falla entera si falla una de sus bandas (p. ej. el compuesto sin bandas de
+# una ventana sin escenas); entonces se reduce banda por banda, en un único getInfo,
+# para que sólo se anulen las bandas inválidas y no toda la escala
+def reintentar_pilas_por_banda(info, region, bandas_por_escala, extras=ESTADISTICAS_EXTRA, opciones=None):
+    fallidas = {escala: bandas for escala, bandas in bandas_por_escala.items()
+                if bandas and info.get(f'escala_{escala}') is None}
+    if not fallidas:
+        return info
+    sueltas = get_info_lote({
+        f'escala_{escala}:{nombre}': reducir_pilas(region, {escala: {nombre: img}}, extras, opciones)[f'escala_{escala}']
+        for escala, bandas in fallidas.items() for nombre, img in bandas.items()
+    })
+    info = dict(info)
+    for escala, bandas in fallidas.items():
+        salida = {}
+        for nombre in bandas:
+            salida.update(sueltas.get(f'escala_{escala}:{nombre}') or {})
+        info[f'escala_{escala}'] = salida
+    return info
 
-def analizar_precip(region, gpm_collection, h_start, h_end, c_start, c_end):
-    precip_current = gpm_collection.filterDate(c_start, c_end).select('precipitationCal').sum().clip(region)
-    precip_historic = gpm_collection.filterDate(h_start, h_end).select('precipitationCal').sum().clip(region)
-    precip_diff_rel = precip_current.subtract(precip_historic).divide(precip_historic.add(1e-6)).rename('precip_diff_rel')
-
-    reducer_mean = ee.Reducer.mean()
-    vals = {
-        'precip_c': get_info_safe(precip_current.reduceRegion(reducer_mean, region, 1000).get('precipitationCal')),
-        'precip_h': get_info_safe(precip_historic.reduceRegion(reducer_mean, region, 1000).get('precipitationCal')),
-        'precip_d': get_info_safe(precip_diff_rel.reduceRegion(reducer_mean, region, 1000).get('precip_diff_rel'))
+# Separa la salida de reducir_pilas en valores medios y estadísticos por banda
+def extraer_estadisticas(info, bandas_por_escala, extras=ESTADISTICAS_EXTRA):
+    vals, estadisticas = {}, {}
+    for escala, bandas in bandas_por_escala.items():
+        salida = info.get(f'escala_{escala}') or {}
+        for nombre in bandas:
+            # Con un solo reductor GEE nombra la salida como la banda, sin sufijo
+            vals[nombre] = salida.get(f'{nombre}_mean' if extras else nombre)
+            est = {'media': vals[nombre], 'escala': escala}
+            if 'stdDev' in extras:
+                est['desviacion'] = salida.get(f'{nombre}_stdDev')
+            if 'percentiles' in extras:
+                for p in PERCENTILES:
+                    est[f'p{p}'] = salida.get(f'{nombre}_p{p}')
+            if 'count' in extras:
+                est['pixeles'] = salida.get(f'{nombre}_count')
+            estadisticas[nombre] = est
+    return vals, estadisticas
+
+# ===========================================
+# 🧩 REDUCCIÓN POR CELDAS (caché espacial)
+# ===========================================
+# Los agregados (suma, conteo, suma de cuadrados) se guardan por celda, banda,
+# ventana de fechas y escala; sólo las celdas que faltan se reducen en GEE, todas
+# en un único reduceRegions por escala dentro del mismo getInfo.
+
+def usar_celdas(coords):
+    # Los percentiles no se pueden combinar a partir de agregados por celda
+    if cache_celdas.tamano <= 0 or 'percentiles' in ESTADISTICAS_EXTRA:
+        return False
+    if len(indices_celdas(coords, cache_celdas.tamano)) > CELDAS_MAX_POR_PETICION:
+        return False
+    return fraccion_solicitada(coords) >= CELDAS_COBERTURA_MIN
+
+def fraccion_solicitada(coords):
+    area_celdas = area_km2(ajustar_a_rejilla(coords, cache_celdas.tamano))
+    return area_km2(coords) / area_celdas if area_celdas else 0.0
+
+# Ventana de fechas de la que depende cada banda (sufijo _c actual, _h histórico, _d ambas)
+def ventana_banda(nombre, fechas):
+    h_start, h_end, c_start, c_end = fechas
+    sufijo = nombre.rsplit('_', 1)[-1]
+    if sufijo == 'c': return f'{c_start}/{c_end}'
+    if sufijo == 'h': return f'{h_start}/{h_end}'
+    return f'{h_start}/{h_end}|{c_start}/{c_end}'
+
+def coleccion_celdas(indices, ids, faltan, tamano):
+    return ee.FeatureCollection([
+        ee.Feature(ee.Geometry.Rectangle(limites_celda(i, j, tamano), None, False), {'celda': celda})
+        for (i, j), celda in zip(indices, ids) if celda in faltan
+    ])
+
+# Como reintentar_pilas_por_banda, para los reduceRegions por celdas: las propiedades
+# de cada banda se reúnen por celda
+def reintentar_celdas_por_banda(info, faltantes, indices, ids, bandas_por_escala, coords):
+    fallidas = [escala for escala in faltantes if info.get(f'escala_{escala}') is None]
+    if not fallidas:
+        return {}
+    tamano = cache_celdas.tamano
+    expresiones = {}
+    for escala in fallidas:
+        celdas = coleccion_celdas(indices, ids, faltantes[escala], tamano)
+        for nombre, img in bandas_por_escala[escala].items():
+            expresiones[f'escala_{escala}:{nombre}'] = pila_agregados({nombre: img}).reduceRegions(
+                celdas, reductor_agregados(), escala, tileScale=opciones_escala(coords, escala, ('tileScale',))['tileScale'])
+    sueltas = get_info_lote(expresiones)
+    recuperadas = {}
+    for escala in fallidas:
+        por_celda = {}
+        for nombre in bandas_por_escala[escala]:
+            for feature in (sueltas.get(f'escala_{escala}:{nombre}') or {}).get('features', []):
+                por_celda.setdefault(feature['properties']['celda'], {}).update(feature['properties'])
+        if por_celda:
+            recuperadas[f'escala_{escala}'] = {'features': [{'properties': props} for props in por_celda.values()]}
+    return recuperadas
+
+def reducir_por_celdas(coords, bandas_por_escala, fechas):
+    tamano = cache_celdas.tamano
+    indices = indices_celdas(coords, tamano)
+    ids = [id_celda(i, j, tamano) for i, j in indices]
+
+    agregados, faltantes = {}, {}
+    for escala, bandas in bandas_por_escala.items():
+        for nombre in bandas:
+            agregados[nombre] = cache_celdas.obtener(ids, nombre, ventana_banda(nombre, fechas), escala)
+            faltan = {celda for celda in ids if celda not in agregados[nombre]}
+            if faltan:
+                faltantes.setdefault(escala, set()).update(faltan)
+
+    expresiones = {}
+    for escala, faltan in faltantes.items():
+        celdas = coleccion_celdas(indices, ids, faltan, tamano)
+        expresiones[f'escala_{escala}'] = pila_agregados(bandas_por_escala[escala]).reduceRegions(
+            celdas, reductor_agregados(), escala, tileScale=opciones_escala(coords, escala, ('tileScale',))['tileScale'])
+    info = get_info_lote(expresiones)
+    info.update(reintentar_celdas_por_banda(info, faltantes, indices, ids, bandas_por_escala, coords))
+
+    filas, calculadas = [], set()
+    for escala in faltantes:
+        # Si la evaluación falló no se guarda nada: esas celdas quedan sin datos
+        for feature in (info.get(f'escala_{escala}') or {}).get('features', []):
+            props = feature['properties']
+            calculadas.add(props['celda'])
+            for nombre in bandas_por_escala[escala]:
+                if f'{nombre}_count' not in props:
+                    # Banda que falló también por separado: sin datos, no se guarda
+                    continue
+                agregado = agregado_desde_salida(props, nombre)
+                agregados[nombre][props['celda']] = agregado
+                filas.append((props['celda'], nombre, ventana_banda(nombre, fechas), escala, agregado))
+    if filas:
+        # La vigencia depende del fin de la ventana (en las diferencias, el de la actual)
+        cache_celdas.guardar(filas, {ventana: cache_celdas.ttl_para(ventana.rsplit('/', 1)[1])
+                                     for _, _, ventana, _, _ in filas})
+
+    vals, estadisticas = {}, {}
+    sin_datos = set()
+    for escala, bandas in bandas_por_escala.items():
+        for nombre in bandas:
+            presentes = [agregados[nombre][celda] for celda in ids if celda in agregados[nombre]]
+            sin_datos.update(celda for celda in ids if celda not in agregados[nombre])
+            media, desviacion, pixeles = resumir(sumar(presentes))
+            vals[nombre] = media
+            est = {'media': media, 'escala': escala}
+            if 'stdDev' in ESTADISTICAS_EXTRA:
+                est['desviacion'] = desviacion
+            if 'count' in ESTADISTICAS_EXTRA:
+                est['pixeles'] = pixeles
+            estadisticas[nombre] = est
+
+    fraccion = fraccion_solicitada(coords)
+    cobertura = {
+        'modo': 'celdas',
+        'tamano_celda_grados': tamano,
+        'region_efectiva': ajustar_a_rejilla(coords, tamano),
+        'celdas': len(ids),
+        'celdas_cache': len(set(ids) - calculadas - sin_datos),
+        'celdas_calculadas': len(calculadas),
+        'celdas_sin_datos': len(sin_datos),
+        # Fracción de la región efectiva que cae dentro del rectángulo pedido
+        'fraccion_area_solicitada': round(fraccion, 4),
+        'exacto': fraccion > 0.9999 and not sin_datos,
     }
+    return vals, estadisticas, cobertura
 
-    map_urls = {
-        'precipitacion': {
-            'actual': precip_current.getMapId({'min': 0, 'max': 50, 'palette': ['white', 'blue', 'purple']})['tile_fetcher'].url_format,
-            'historico': precip_historic.getMapId({'min': 0, 'max': 50, 'palette': ['white', 'blue', 'purple']})['tile_fetcher'].url_format,
-            'diferencia': precip_diff_rel.getMapId({'min': -1, 'max': 1, 'palette': ['red', 'white', 'blue']})['tile_fetcher'].url_format
-        }
+# ===========================================
+# 🎲 ESTIMADOR POR MUESTREO ESTRATIFICADO
+# ===========================================
+# En lugar de reducir todos los píxeles se toma una muestra aleatoria en estratos
+# de igual área; cada estrato devuelve sólo los píxeles muestreados y, por banda, el
+# conteo de válidos, la media y la varianza, y todos viajan en un único getInfo. Una
+# banda constante sin máscara asegura que cada píxel muestreado cuente, aunque esté
+# enmascarado en todas las demás: así se estima la fracción válida de cada estrato.
+
+BANDA_MUESTREADOS = '__muestreados'
+
+def estimar_por_muestreo(region, coords, bandas_por_escala, precision):
+    muestras = tamano_muestra(precision)
+    estratos = dividir_igual_area(coords, numero_estratos(muestras), margen_geodesico(coords))
+    por_estrato = max(1, -(-muestras // len(estratos)))
+    # Se muestrea a la escala más fina; las bandas gruesas aportan el valor de su píxel
+    escala = min(bandas_por_escala)
+    bandas = {nombre: img for grupo in bandas_por_escala.values() for nombre, img in grupo.items()}
+    pila = ee.Image.cat([img.rename(nombre) for nombre, img in bandas.items()]
+                        + [ee.Image.constant(1).rename(BANDA_MUESTREADOS)])
+
+    expresiones = {}
+    for h, limites in enumerate(estratos):
+        muestra = pila.sample(region=ee.Geometry.Rectangle(limites, None, False), scale=escala,
+                              numPixels=por_estrato, seed=h, dropNulls=False)
+        expresiones[f'estrato_{h}'] = ee.Dictionary({
+            BANDA_MUESTREADOS: muestra.size(),
+            **{nombre: [muestra.aggregate_count(nombre), muestra.aggregate_mean(nombre),
+                        muestra.aggregate_sample_var(nombre)]
+               for nombre in bandas},
+        })
+    info = get_info_lote(expresiones)
+
+    vals, estadisticas = {}, {}
+    escala_banda = {nombre: e for e, grupo in bandas_por_escala.items() for nombre in grupo}
+    for nombre in bandas:
+        resumenes = []
+        for h in range(len(estratos)):
+            estrato = info.get(f'estrato_{h}') or {}
+            n, media, varianza = estrato.get(nombre) or (0, None, None)
+            resumenes.append((int(estrato.get(BANDA_MUESTREADOS) or 0), int(n or 0), media, varianza))
+        estimacion = estimar_estratificado(resumenes)
+        vals[nombre] = estimacion['media']
+        estadisticas[nombre] = dict(estimacion, escala=escala_banda[nombre], escala_muestreo=escala)
+    cobertura = {
+        'modo': 'muestreo',
+        'precision_objetivo': precision,
+        'muestras_objetivo': muestras,
+        'estratos': len(estratos),
+        'exacto': False,
     }
+    return vals, estadisticas, cobertura
+
+# ===========================================
+# 📚 LÍNEA BASE CLIMATOLÓGICA
+# ===========================================
+# El precálculo reduce, por año, los doce compuestos mensuales de cada variable
+# sobre las celdas que faltan (un reduceRegions por variable y año). En la petición
+# la línea base se lee del almacén local: con linea_base='climatologia' la ventana
+# histórica no se calcula y sólo la actual va a Earth Engine.
+
+# Compuesto de una variable en una ventana [inicio, fin), definido igual que en los analizar_*
+def coleccion_ventana(variable, region, inicio, fin):
+    if variable == 'ndvi':
+        return ee.ImageCollection(S2_COLLECTION).filterBounds(region).filterDate(inicio, fin).map(mask_s2_clouds)
+    if variable == 'temperatura':
+        return ee.ImageCollection(LST_COLLECTION).filterBounds(region).filterDate(inicio, fin).map(to_celsius).select('LST')
+    return ee.ImageCollection(GPM_COLLECTION).filterBounds(region).filterDate(inicio, fin).select('precipitationCal')
+
+def componer_ventana(variable, coleccion):
+    if variable == 'ndvi':
+        return coleccion.median().normalizedDifference(['B8', 'B4'])
+    if variable == 'temperatura':
+        return coleccion.mean()
+    return coleccion.sum()
+
+def imagen_ventana(variable, region, inicio, fin):
+    return componer_ventana(variable, coleccion_ventana(variable, region, inicio, fin))
 
-    return vals, map_urls
+# Como imagen_ventana con una sola banda `banda`, pero una ventana sin imágenes da una
+# banda enmascarada (valor None) en lugar de un compuesto sin bandas que invalida la pila
+def imagen_ventana_o_vacia(variable, region, inicio, fin, banda):
+    coleccion = coleccion_ventana(variable, region, inicio, fin)
+    return ee.Image(ee.Algorithms.If(coleccion.size().gt(0),
+                                     componer_ventana(variable, coleccion).rename(banda),
+                                     ee.Image.constant(0).selfMask().rename(banda)))
 
-def analizar_ecosistema_avanzado(coords, h_start, h_end, c_start, c_end):
+def celdas_climatologia(coords):
+    tamano = almacen_climatologia.tamano
+    indices = indices_celdas(coords, tamano)
+    return indices, [id_celda(i, j, tamano) for i, j in indices]
+
+def precalcular_climatologia(coords, anio_inicio, anio_fin, variables=None, progreso=None):
+    progreso = progreso or (lambda fraccion, etapa: None)
+    variables = variables or list(CLIMATOLOGIA_VARIABLES)
+    tamano = almacen_climatologia.tamano
+    indices, ids = celdas_climatologia(coords)
+    if len(ids) > CLIMATOLOGIA_MAX_CELDAS:
+        raise ValueError(f"La región abarca {len(ids)} celdas; el máximo es {CLIMATOLOGIA_MAX_CELDAS}.")
+    # Plano, como las celdas: el rectángulo geodésico no cubre del todo las del borde
+    region = ee.Geometry.Rectangle(ajustar_a_rejilla(coords, tamano), None, False)
+
+    tareas = [(variable, anio) for variable in variables for anio in range(anio_inicio, anio_fin + 1)]
+    guardadas = 0
+    fallidas = []
+    for n, (variable, anio) in enumerate(tareas, 1):
+        escala = ESCALAS_CLIMATOLOGIA[variable]
+        faltan = almacen_climatologia.faltantes(ids, variable, escala, anio)
+        if faltan:
+            celdas = coleccion_celdas(indices, ids, set().union(*faltan.values()), tamano)
+            # Un mes sin escenas aporta una banda enmascarada (conteo 0), no un error que
+            # tumbe el reduceRegions del año entero
+            bandas = {
+                f'm{mes:02d}': imagen_ventana_o_vacia(variable, region, f'{anio}-{mes:02d}-01',
+                                                      f'{anio + mes // 12}-{mes % 12 + 1:02d}-01', f'm{mes:02d}')
+                for mes in faltan
+            }
+            info = get_info_lote({'celdas': pila_agregados(bandas).reduceRegions(
+                celdas, reductor_agregados(), escala, tileScale=opciones_escala(coords, escala, ('tileScale',))['tileScale'])})
+            if info.get('celdas') is None:
+                fallidas.append({'variable': variable, 'anio': anio, 'meses': sorted(faltan)})
+            filas = []
+            # Si la evaluación falló no se guarda nada y esos meses se reintentan la próxima vez
+            for feature in (info.get('celdas') or {}).get('features', []):
+                props = feature['properties']
+                for mes, celdas_mes in faltan.items():
+                    if props['celda'] in celdas_mes:
+                        filas.append((props['celda'], variable, escala, anio, mes,
+                                      agregado_desde_salida(props, f'm{mes:02d}')))
+            almacen_climatologia.guardar(filas)
+            guardadas += len(filas)
+        progreso(n / len(tareas), f'{variable} {anio}')
+    return json.dumps({
+        'region_efectiva': ajustar_a_rejilla(coords, tamano),
+        'celdas': len(ids),
+        'anios': [anio_inicio, anio_fin],
+        'variables': variables,
+        'filas_nuevas': guardadas,
+        'fallidas': fallidas,
+        'completo': not fallidas,
+    })
+
+# {variable: {'media', 'desviacion', 'anios'}} de la ventana actual, para las variables con
+# climatología suficiente; se excluyen los años de la propia ventana
+def lineas_base(coords, c_start, c_end):
+    if almacen_climatologia.tamano <= 0:
+        return {}
+    _, ids = celdas_climatologia(coords)
+    if len(ids) > CLIMATOLOGIA_MAX_CELDAS:
+        return {}
+    excluir = range(int(c_start[:4]), int(c_end[:4]) + 1)
+    lineas = {}
+    for variable, (_, acumulada) in CLIMATOLOGIA_VARIABLES.items():
+        linea = almacen_climatologia.linea_base(ids, variable, ESCALAS_CLIMATOLOGIA[variable], c_start, c_end,
+                                                acumulada, excluir, CLIMATOLOGIA_ANIOS_MIN)
+        if linea:
+            lineas[variable] = linea
+    return lineas
+
+# Rellena *_h y *_d con la media climatológica en las variables que no calcularon la
+# ventana histórica. En precipitación la diferencia relativa es la de las medias
+# regionales, no la media de las diferencias por píxel.
+def completar_con_climatologia(vals, estadisticas, fuentes, lineas, variables):
+    for variable in variables:
+        prefijo, acumulada = CLIMATOLOGIA_VARIABLES[variable]
+        actual, historico = vals.get(f'{prefijo}_c'), lineas[variable]['media']
+        vals[f'{prefijo}_h'] = historico
+        if actual is None:
+            vals[f'{prefijo}_d'] = None
+        elif acumulada:
+            vals[f'{prefijo}_d'] = (actual - historico) / (historico + 1e-6)
+        else:
+            vals[f'{prefijo}_d'] = actual - historico
+        sensor, coleccion = SENSOR_VARIABLE[variable]
+        for sufijo in ('h', 'd'):
+            nombre = f'{prefijo}_{sufijo}'
+            estadisticas[nombre] = {'media': vals[nombre], 'escala': ESCALAS_CLIMATOLOGIA[variable],
+                                    'linea_base': 'climatologia'}
+            fuentes[nombre] = {'sensor': sensor, 'coleccion': coleccion,
+                               'resolucion_m': ESCALAS_CLIMATOLOGIA[variable],
+                               'linea_base': 'climatologia', 'anios': lineas[variable]['anios']}
+
+def anomalias_climatologicas(resultados_vals, lineas):
+    anomalias = {}
+    for variable, linea in (lineas or {}).items():
+        z = puntuacion_z(resultados_vals.get(f'{CLIMATOLOGIA_VARIABLES[variable][0]}_c'), linea)
+        anomalias[variable] = dict(linea, z=z)
+    return anomalias
+
+# ===========================================
+# 🗓️ COMPARACIÓN DE N PERIODOS
+# ===========================================
+# Los compuestos de todas las ventanas se apilan en una imagen por escala (una banda
+# por variable y ventana) y se reducen juntos: N ventanas cuestan una evaluación,
+# no N veces el análisis completo.
+
+VARIABLES_PERIODOS = ('ndvi', 'temperatura', 'precipitacion')
+MAX_VENTANAS = int(os.environ.get('SUPERBLOOM_MAX_VENTANAS', 20))
+
+def comparar_periodos(coords, ventanas, variables=VARIABLES_PERIODOS, escalas=None):
+    escalas = escalas or escalas_adaptativas(coords)
     region = ee.Geometry.Rectangle(coords)
-    s2_collection = ee.ImageCollection(S2_COLLECTION).filterBounds(region)
-    lst_collection = ee.ImageCollection(LST_COLLECTION).filterBounds(region)
-    gpm_collection = ee.ImageCollection(GPM_COLLECTION).filterBounds(region)
+    bandas_por_escala = {}
+    for variable in variables:
+        for k, (inicio, fin) in enumerate(ventanas):
+            imagen = imagen_ventana(variable, region, inicio, fin).clip(region)
+            bandas_por_escala.setdefault(escalas[variable], {})[f'{variable}_{k}'] = imagen
+    info, vals, estadisticas = reducir_region(region, coords, bandas_por_escala,
+                                              {'centro': region.centroid().coordinates()})
 
-    resultados_vals = {}
-    resultados_maps = {}
+    resultado = [{'inicio': inicio, 'fin': fin} for inicio, fin in ventanas]
+    resumen = {}
+    for variable in variables:
+        serie = [vals.get(f'{variable}_{k}') for k in range(len(ventanas))]
+        validos = [v for v in serie if v is not None]
+        media = sum(validos) / len(validos) if validos else None
+        desviacion = (math.sqrt(sum((v - media) ** 2 for v in validos) / (len(validos) - 1))
+                      if len(validos) > 1 else None)
+        for k, valor in enumerate(serie):
+            est = estadisticas.get(f'{variable}_{k}') or {'media': None}
+            # Anomalía de cada ventana frente al conjunto de ventanas pedidas
+            z = (valor - media) / desviacion if valor is not None and desviacion else None
+            resultado[k][variable] = dict(est, anomalia_z=z)
+        resumen[variable] = {'media': media, 'desviacion': desviacion, 'serie': serie}
 
-    with ThreadPoolExecutor() as executor:
-        futures = {
-            executor.submit(analizar_ndvi, region, s2_collection, h_start, h_end, c_start, c_end): 'ndvi',
-            executor.submit(analizar_lst, region, lst_collection, h_start, h_end, c_start, c_end): 'temperatura',
-            executor.submit(analizar_precip, region, gpm_collection, h_start, h_end, c_start, c_end): 'precipitacion'
-        }
+    etiquetas = [f'{inicio} / {fin}' for inicio, fin in ventanas]
+    escalas_usadas = {variable: escalas[variable] for variable in variables}
+    centro = info.get('centro') or [None, None]
+    return {
+        "map_data": {"centro": [centro[1], centro[0]]},
+        "ventanas": resultado,
+        "resumen": resumen,
+        "chart_data": {variable: {"labels": etiquetas,
+                                  "datasets": [{"label": variable, "data": resumen[variable]['serie']}]}
+                       for variable in variables},
+        "resolucion": resolucion_efectiva(escalas_usadas),
+        "fuentes": {variable: etiquetar_fuentes(variable, [variable], escala)[variable]
+                    for variable, escala in escalas_usadas.items()},
+    }
+
+# ===========================================
+# 📈 SERIES TEMPORALES MENSUALES
+# ===========================================
+# Cada variable se acota a la geometría y a los meses que faltan en el almacén, y
+# todas viajan en un único getInfo. NDVI de un punto: cada escena aporta su valor y
+# la mediana mensual se calcula en local (en un solo píxel coincide con la del
+# compuesto mediano). En una región la mediana de las medias por escena no es la
+# media del compuesto, así que el NDVI de regiones, la LST y la precipitación se
+# reducen sobre un compuesto por mes, apilados en una imagen. Un mes sin imágenes
+# (p. ej. el mes en curso, aún sin publicar) queda enmascarado y vale None.
+
+def valores_escenas_ndvi(geometria, inicio, fin, escala=SERIE_ESCALA_NDVI):
+    def valor_escena(img):
+        ndvi = mask_s2_clouds(img).normalizedDifference(['B8', 'B4']).rename('NDVI')
+        valor = ndvi.reduceRegion(ee.Reducer.mean(), geometria, escala).get('NDVI')
+        # Fecha y valor en una sola propiedad: aggregate_array omite los nulos y las
+        # dos listas dejarían de estar alineadas
+        return ee.Feature(None, {'escena': ee.List([img.get('system:time_start'), valor])})
+    coleccion = ee.ImageCollection(S2_COLLECTION).filterBounds(geometria).filterDate(inicio, fin)
+    return ee.FeatureCollection(coleccion.map(valor_escena)).aggregate_array('escena')
+
+# [[millis, valor], ...] -> {mes: (valor agregado, observaciones)}
+def agrupar_por_mes(escenas, agregar=mediana):
+    por_mes = {}
+    for millis, valor in escenas or []:
+        if millis is not None and valor is not None:
+            por_mes.setdefault(time.strftime('%Y-%m', time.gmtime(millis / 1000)), []).append(valor)
+    return {mes: (agregar(valores), len(valores)) for mes, valores in por_mes.items()}
+
+def banda_mes(mes):
+    return 'm' + mes.replace('-', '_')
+
+# por_escena: NDVI escena a escena (puntos); si no, compuesto mensual (regiones)
+def expresion_serie(variable, geometria, escala, meses, por_escena=True):
+    if variable == 'ndvi' and por_escena:
+        # Un único tramo de fechas cubre los meses que faltan (normalmente, los últimos)
+        return valores_escenas_ndvi(geometria, f'{meses[0]}-01', f'{siguiente_mes(meses[-1])}-01', escala)
+    rama = SERIE_VARIABLES[variable][0]
+    return ee.Image.cat([
+        imagen_ventana_o_vacia(rama, geometria, f'{mes}-01', f'{siguiente_mes(mes)}-01', banda_mes(mes))
+        for mes in meses
+    ]).reduceRegion(ee.Reducer.mean(), geometria, escala)
+
+def valores_serie(variable, info, meses, por_escena=True):
+    if variable == 'ndvi' and por_escena:
+        agrupados = agrupar_por_mes(info)
+        return {mes: agrupados.get(mes, (None, 0)) for mes in meses}
+    valores = {mes: info.get(banda_mes(mes)) for mes in meses}
+    return {mes: (valor, int(valor is not None)) for mes, valor in valores.items()}
+
+# {variable: {mes: (valor, observaciones)}} de los meses pedidos: lo consolidado sale del
+# almacén y el resto de todas las variables se calcula en una sola evaluación
+def serie_mensual(geometria, geometria_id, escalas, meses, por_escena=True):
+    if len(meses) > SERIE_MAX_MESES:
+        raise ValueError(f"La serie admite como máximo {SERIE_MAX_MESES} meses.")
+    series, faltan = {}, {}
+    for variable, escala in escalas.items():
+        series[variable] = almacen_series.obtener(geometria_id, variable, escala, meses)
+        pendientes = [mes for mes in meses if mes not in series[variable]]
+        if pendientes:
+            faltan[variable] = pendientes
+    en_almacen = sum(len(valores) for valores in series.values())
 
-        for future in as_completed(futures):
-            key = futures[future]
+    info = get_info_lote({variable: expresion_serie(variable, geometria, escalas[variable], pendientes, por_escena)
+                          for variable, pendientes in faltan.items()})
+    filas = []
+    for variable, pendientes in faltan.items():
+        # Si la evaluación falló no se anexa nada: esos meses se piden en la próxima llamada
+        if info.get(variable) is None:
+            continue
+        calculados = valores_serie(variable, info[variable], pendientes, por_escena)
+        series[variable].update(calculados)
+        margen = SERIE_VARIABLES[variable][2]
+        filas.extend((geometria_id, variable, escalas[variable], mes, valor, n)
+                     for mes, (valor, n) in calculados.items() if mes_consolidado(mes, margen))
+        almacen_series.contar_calculados(len(pendientes))
+    almacen_series.anexar(filas)
+    return series, en_almacen, sum(len(p) for p in faltan.values())
+
+# Filas {date, ndvi, lst, precipitation} (formato de codigoGraficas) de los meses con algún valor
+def filas_serie(series, meses):
+    filas = []
+    for mes in meses:
+        fila = {"date": f'{mes}-01'}
+        for variable, (_, clave, _) in SERIE_VARIABLES.items():
+            fila[clave] = series.get(variable, {}).get(mes, (None, 0))[0]
+        if any(fila[clave] is not None for _, clave, _ in SERIE_VARIABLES.values()):
+            filas.append(fila)
+    return filas
+
+def serie_ndvi_punto(lat, lon, anio_inicio, anio_fin):
+    meses = meses_entre(anio_inicio, anio_fin)
+    series, en_almacen, calculados = serie_mensual(
+        ee.Geometry.Point([lon, lat]), id_punto(lat, lon), {'ndvi': SERIE_ESCALA_NDVI}, meses)
+    ndvi = series['ndvi']
+    return {
+        "punto": {"lat": lat, "lon": lon, "escala_m": SERIE_ESCALA_NDVI},
+        # Mismo formato que codigoGraficas.obtener_serie_temporal_ndvi
+        "timeseries": [{"date": f'{mes}-01', "ndvi": ndvi[mes][0], "observaciones": ndvi[mes][1],
+                        "lst": None, "precipitation": None}
+                       for mes in meses if mes in ndvi and ndvi[mes][0] is not None],
+        "meses_almacen": en_almacen,
+        "meses_calculados": calculados,
+    }
+
+# NDVI + LST + precipitación mensuales de un punto (escalas nativas) o de una región
+# (escalas adaptativas); lo que falta de las tres series cuesta un único getInfo
+def serie_combinada(anio_inicio, anio_fin, lat=None, lon=None, coords=None):
+    meses = meses_entre(anio_inicio, anio_fin)
+    if coords is not None:
+        geometria, geometria_id = ee.Geometry.Rectangle(coords), 'region:' + ','.join(f'{c:g}' for c in coords)
+        escalas_rama = escalas_adaptativas(coords)
+    else:
+        geometria, geometria_id = ee.Geometry.Point([lon, lat]), id_punto(lat, lon)
+        escalas_rama = dict(ESCALAS_MINIMAS, ndvi=SERIE_ESCALA_NDVI)
+    escalas = {variable: escalas_rama[rama] for variable, (rama, _, _) in SERIE_VARIABLES.items()}
+    # En regiones, NDVI del compuesto mensual (observaciones = 1 por mes con valor)
+    series, en_almacen, calculados = serie_mensual(geometria, geometria_id, escalas, meses,
+                                                   por_escena=coords is None)
+    return {
+        "geometria": {"coords": coords} if coords is not None else {"lat": lat, "lon": lon},
+        "escalas_m": {SERIE_VARIABLES[variable][1]: escala for variable, escala in escalas.items()},
+        "timeseries": filas_serie(series, meses),
+        "meses_almacen": en_almacen,
+        "meses_calculados": calculados,
+    }
+
+# Serie de cada elemento de una petición de gráficas: la que trae el propio elemento
+# ('timeseries') o la de su punto/región, calculadas en paralelo (sus getInfo se agrupan)
+def series_para_graficas(elementos, anio_inicio, anio_fin):
+    futuros = {}
+    for n, elemento in enumerate(elementos):
+        if 'timeseries' in elemento:
+            # Antes de lanzar ninguna evaluación: una serie mal formada es un 400 inmediato
             try:
-                vals, maps = future.result()
-                resultados_vals.update(vals)
-                resultados_maps.update(maps)
-            except Exception as e:
-                print(f"Error en {key}: {e}", file=sys.stderr)
-
-    img_current = s2_collection.filterDate(c_start, c_end).map(mask_s2_clouds).median().clip(region)
-    evi_current = img_current.expression(
-        'G * ((NIR - RED) / (NIR + C1 * RED - C2 * BLUE + L))',
-        {'NIR': img_current.select('B8'), 'RED': img_current.select('B4'), 'BLUE': img_current.select('B2'), **EVI_CONSTANTS}
-    ).rename('EVI')
-    ndsi_floral_current = img_current.normalizedDifference(['B3', 'B4']).rename('NDSI_floral')
-
-    reducer_mean = ee.Reducer.mean()
-    resultados_vals['evi_c'] = get_info_safe(evi_current.reduceRegion(reducer_mean, region, 100).get('EVI'))
-    resultados_vals['ndsi_c'] = get_info_safe(ndsi_floral_current.reduceRegion(reducer_mean, region, 100).get('NDSI_floral'))
-
-    # ✨ NUEVA SECCIÓN: PREPARAR DATOS PARA GRÁFICAS ✨
-    chart_data = {
-        "comparative_charts": {
-            "ndvi": {
-                "labels": ["Histórico", "Actual"],
-                "datasets": [{
-                    "label": "NDVI",
-                    "data": [resultados_vals.get('ndvi_h'), resultados_vals.get('ndvi_c')]
-                }]
-            },
-            "temperature": {
-                "labels": ["Histórico (°C)", "Actual (°C)"],
-                "datasets": [{
-                    "label": "Temperatura",
-                    "data": [resultados_vals.get('lst_h'), resultados_vals.get('lst_c')]
-                }]
-            },
-            "precipitation": {
-                "labels": ["Histórico (mm)", "Actual (mm)"],
-                "datasets": [{
-                    "label": "Precipitación",
-                    "data": [resultados_vals.get('precip_h'), resultados_vals.get('precip_c')]
-                }]
-            }
+                validar_serie(elemento['timeseries'])
+            except ValueError as e:
+                raise ValueError(f"Serie {n}: {e}")
+            continue
+        if 'coords' in elemento:
+            ubicacion = {'coords': canonizar_coords(elemento['coords'], CACHE_PRECISION_COORDS)}
+        elif 'lat' in elemento and 'lon' in elemento:
+            ubicacion = {'lat': float(elemento['lat']), 'lon': float(elemento['lon'])}
+        else:
+            raise ValueError(f"Serie {n}: falta 'timeseries', 'coords' o 'lat'/'lon'.")
+        futuros[n] = ejecutor_analisis.submit(serie_combinada, anio_inicio, anio_fin, **ubicacion)
+    return [elemento['timeseries'] if n not in futuros else futuros[n].result(timeout=plazo_actual().restante())['timeseries']
+            for n, elemento in enumerate(elementos)]
+
+# ===========================================
+# 🔭 RESOLUCIÓN ADAPTATIVA
+# ===========================================
+# El presupuesto de píxeles es RENDIMIENTO_PIXELES × segundos de plazo: una misma
+# región se calcula más fina como trabajo asíncrono que en una petición síncrona.
+
+def escalas_adaptativas(coords, presupuesto=PLAZO_PETICION):
+    if not RESOLUCION_ADAPTATIVA:
+        return dict(ESCALAS_VARIABLE)
+    area = area_km2(coords)
+    return {variable: elegir_escala(area, minima, RENDIMIENTO_PIXELES * presupuesto)
+            for variable, minima in ESCALAS_MINIMAS.items()}
+
+# Opciones de reducción realmente pasadas a GEE en la petición en curso, por escala. Las
+# tareas del ejecutor heredan el contextvar y anotan en el mismo diccionario.
+opciones_peticion = contextvars.ContextVar('opciones_peticion', default=None)
+lock_opciones = threading.Lock()
+
+# `claves`: las opciones que el llamador pasa de verdad (las demás quedan por defecto)
+def opciones_escala(coords, escala, claves=('tileScale', 'bestEffort')):
+    plazo = plazo_actual()
+    presupuesto = plazo.restante() if plazo else PLAZO_PETICION
+    opciones = opciones_reduccion(pixeles_estimados(coords, escala), RENDIMIENTO_PIXELES * presupuesto)
+    opciones = {clave: opciones[clave] for clave in claves}
+    registro = opciones_peticion.get()
+    if registro is not None:
+        # Varias reducciones a la misma escala (teselas, celdas): la mayor tileScale usada
+        # y bestEffort si alguna lo usó
+        with lock_opciones:
+            usadas = registro.setdefault(escala, {'tileScale': 1, 'bestEffort': False})
+            usadas['tileScale'] = max(usadas['tileScale'], opciones.get('tileScale', 1))
+            usadas['bestEffort'] = usadas['bestEffort'] or opciones.get('bestEffort', False)
+    return opciones
+
+# Escala efectiva de cada variable y opciones con que se redujo en esta petición, para la
+# respuesta; sin opciones si no hubo reducción a esa escala (todo salió de caché)
+def resolucion_efectiva(escalas):
+    usadas = opciones_peticion.get() or {}
+    return {variable: {'escala': escala, **usadas.get(escala, {})} for variable, escala in escalas.items()}
+
+# ===========================================
+# 💰 ESTIMACIÓN DE COSTE (plan sin ejecutar)
+# ===========================================
+# Píxeles por variable a partir del área y la escala; escenas por colección y
+# ventana con un único getInfo de metadatos (size() de cada filtro), que sólo se
+# hace si la cota por revisita supera el máximo o si se pide el plan explícito.
+
+def contar_escenas(coords, fechas):
+    region = ee.Geometry.Rectangle(coords)
+    h_start, h_end, c_start, c_end = fechas
+    expresiones = {}
+    for alias, coleccion, _, _ in FUENTES_VARIABLE.values():
+        base = ee.ImageCollection(coleccion).filterBounds(region)
+        expresiones[f'{alias}_historico'] = base.filterDate(h_start, h_end).size()
+        expresiones[f'{alias}_actual'] = base.filterDate(c_start, c_end).size()
+    return get_info_lote(expresiones)
+
+def costear_variables(coords, fechas, escalas, escenas=None, muestras=None, seleccion=None):
+    area = area_km2(coords)
+    ventanas = {'historico': fechas[:2], 'actual': fechas[2:]}
+    ramas = ramas_seleccionadas(seleccion)
+    variables, total = {}, 0.0
+    for variable, (alias, coleccion, huella, por_dia) in FUENTES_VARIABLE.items():
+        if variable not in ramas:
+            continue
+        # EVI y NDSI_floral sólo usan la mediana actual
+        usadas = {'actual': ventanas['actual']} if variable == 'indices' else ventanas
+        conteo, por_pixel = {}, 0.0
+        for nombre, (inicio, fin) in usadas.items():
+            contadas = (escenas or {}).get(f'{alias}_{nombre}')
+            if contadas is None:
+                conteo[nombre] = cota_escenas(inicio, fin, por_dia)
+                por_pixel += conteo[nombre]
+            else:
+                conteo[nombre] = int(contadas)
+                por_pixel += escenas_por_pixel(contadas, area, huella)
+        pixeles = pixeles_estimados(coords, escalas[variable])
+        if muestras is not None:
+            # En modo muestreo sólo se leen los píxeles de la muestra
+            pixeles = min(pixeles, muestras)
+        coste = pixeles * por_pixel
+        total += coste
+        variables[variable] = {
+            'coleccion': coleccion,
+            'filtros': {'filterBounds': coords, 'filterDate': {n: list(v) for n, v in usadas.items()}},
+            'escala': escalas[variable],
+            'pixeles': round(pixeles),
+            'escenas': conteo,
+            'coste': round(coste),
+        }
+    return variables, total
+
+def planificar(coords, fechas, escalas=None, contar=False, precision=None, seleccion=None):
+    escalas = dict(escalas or escalas_adaptativas(coords))
+    muestras = tamano_muestra(precision) if precision is not None else None
+    escenas = contar_escenas(coords, fechas) if contar else None
+    variables, total = costear_variables(coords, fechas, escalas, escenas, muestras, seleccion)
+    if escenas is None and total > COSTE_MAX:
+        # La cota por revisita es pesimista: sólo entonces se cuentan las escenas reales
+        escenas = contar_escenas(coords, fechas)
+        variables, total = costear_variables(coords, fechas, escalas, escenas, muestras, seleccion)
+
+    decision, coste_original = 'ejecutar', total
+    if total > COSTE_MAX:
+        decision = COSTE_ACCION
+        if decision == 'reducir':
+            factor = factor_reduccion(total, COSTE_MAX)
+            escalas = {variable: escala * factor for variable, escala in escalas.items()}
+            variables, total = costear_variables(coords, fechas, escalas, escenas, muestras, seleccion)
+
+    celdas = precision is None and usar_celdas(coords)
+    teselas = {escala: teselas_necesarias(coords, escala, TESELA_MAX_PIXELES) for escala in set(escalas.values())}
+    return {
+        'region': coords,
+        'area_km2': round(area_km2(coords), 3),
+        'variables': variables,
+        'reduccion': ({'muestreo': {'muestras': muestras}} if muestras is not None else
+                      'celdas' if celdas else {f'escala_{e}': {'teselas': n} for e, n in teselas.items()}),
+        'llamadas_remotas': {
+            'metadatos': 1 if escenas is not None else 0,
+            # Capas seleccionadas (por defecto actual, histórico y diferencia de NDVI, temperatura
+            # y precipitación); como máximo: las que ya estén en la caché de MapIds no se piden
+            'getmapid': len((seleccion or SELECCION_COMPLETA)['capas']),
+            # Teselas: una llamada cada una; el resto de escalas va en un único getInfo
+            'getinfo': 1 if celdas or muestras is not None else
+                       sum(n for n in teselas.values() if n > 1) + int(any(n == 1 for n in teselas.values())),
         },
-        "gauge_charts": {
+        'escenas_contadas': escenas is not None,
+        'coste': round(total),
+        'coste_estimado_original': round(coste_original),
+        'coste_max': COSTE_MAX,
+        'decision': decision,
+        'escalas': escalas,
+    }
+
+# ===========================================
+# 🗺️ REDUCCIÓN POR TESELAS (regiones grandes)
+# ===========================================
+# Si la estimación local de píxeles de una escala supera TESELA_MAX_PIXELES, la
+# región se parte en teselas de igual área que se reducen en paralelo, cada una
+# con sus reintentos, y se combinan exactamente sumando (suma, conteo, cuadrados).
+
+def reducir_tesela(imagen, limites, escala):
+    geometria = ee.Geometry.Rectangle(limites, None, False)
+    tile_scale = opciones_escala(limites, escala, ('tileScale',))['tileScale']
+    expresion = imagen.reduceRegion(reductor_agregados(), geometria, escala, maxPixels=1e10, tileScale=tile_scale)
+    for intento in range(1, TESELA_INTENTOS + 1):
+        verificar_plazo()
+        try:
+            return expresion.getInfo() or {}
+        except ee.EEException as e:
+            print(f"Error GEE (tesela {limites}, intento {intento}): {e}", file=sys.stderr)
+            if intento < TESELA_INTENTOS:
+                plazo = plazo_actual()
+                time.sleep(min(2 ** intento, plazo.restante() if plazo else 2 ** intento))
+    return None
+
+# Cada tarea reduce en serie su parte de las teselas, para no acaparar el ejecutor
+def reducir_teselas_serie(imagen, teselas, escala):
+    return [reducir_tesela(imagen, limites, escala) for limites in teselas]
+
+def lanzar_teselas(coords, bandas_por_escala):
+    lanzadas = {}
+    for escala, bandas in bandas_por_escala.items():
+        imagen = pila_agregados(bandas)
+        teselas = dividir_igual_area(coords, teselas_necesarias(coords, escala, TESELA_MAX_PIXELES),
+                                     margen_geodesico(coords))
+        lanzadas[escala] = [ejecutor_teselas.submit(reducir_teselas_serie, imagen, teselas[k::TESELAS_CONCURRENTES], escala)
+                            for k in range(min(TESELAS_CONCURRENTES, len(teselas)))]
+    return lanzadas
+
+def combinar_teselas(lanzadas, bandas_por_escala, extras=ESTADISTICAS_EXTRA):
+    for _ in completadas_con_plazo([f for futures in lanzadas.values() for f in futures]):
+        pass
+    vals, estadisticas = {}, {}
+    for escala, futures in lanzadas.items():
+        salidas = [salida for future in futures for salida in future.result()]
+        validas = [salida for salida in salidas if salida is not None]
+        for nombre in bandas_por_escala[escala]:
+            media, desviacion, pixeles = resumir(sumar(agregado_desde_salida(salida, nombre) for salida in validas))
+            vals[nombre] = media
+            est = {'media': media, 'escala': escala, 'teselas': len(salidas),
+                   'teselas_fallidas': len(salidas) - len(validas)}
+            if 'stdDev' in extras:
+                est['desviacion'] = desviacion
+            if 'percentiles' in extras:
+                # Los percentiles no se pueden combinar entre teselas
+                for p in PERCENTILES:
+                    est[f'p{p}'] = None
+            if 'count' in extras:
+                est['pixeles'] = pixeles
+            estadisticas[nombre] = est
+    return vals, estadisticas
+
+# Reduce las pilas de todas las escalas: las grandes por teselas (en paralelo) y el
+# resto en un único getInfo junto con las expresiones de `extra`
+def reducir_region(region, coords, bandas_por_escala, extra=None):
+    grandes = {escala: bandas for escala, bandas in bandas_por_escala.items()
+               if bandas and teselas_necesarias(coords, escala, TESELA_MAX_PIXELES) > 1}
+    normales = {escala: bandas for escala, bandas in bandas_por_escala.items() if escala not in grandes}
+    lanzadas = lanzar_teselas(coords, grandes)
+    opciones = {escala: opciones_escala(coords, escala) for escala in normales}
+    expresiones = reducir_pilas(region, normales, opciones=opciones)
+    expresiones.update(extra or {})
+    info = reintentar_pilas_por_banda(get_info_lote(expresiones), region, normales, opciones=opciones)
+    vals, estadisticas = extraer_estadisticas(info, normales)
+    vals_teselas, est_teselas = combinar_teselas(lanzadas, grandes)
+    vals.update(vals_teselas)
+    estadisticas.update(est_teselas)
+    return info, vals, estadisticas
+
+# Tarea de una rama que además reduce sus bandas: (bandas, urls, reducir(rama, bandas))
+def rama_con_reduccion(reducir, key, analizar, *args):
+    bandas, maps = analizar(*args)
+    return bandas, maps, reducir(key, bandas)
+
+# Lanza los analizar_* en paralelo; cada tarea devuelve (bandas ee, urls de teselas)
+# Sólo se programan las ramas, índices y capas de la selección (None = todo)
+# Con `reducir`, cada tarea reduce también su rama y devuelve (bandas, urls, reducción)
+def lanzar_analisis(executor, coords, h_start, h_end, c_start, c_end, sin_historico=(), seleccion=None, reducir=None,
+                    geodesica=True):
+    seleccion = seleccion or SELECCION_COMPLETA
+    ramas = ramas_seleccionadas(seleccion)
+    region = ee.Geometry.Rectangle(coords, None, geodesica)
+    futures = {}
+
+    def enviar(key, analizar, *args):
+        if reducir is None:
+            futures[executor.submit(analizar, *args)] = key
+        else:
+            futures[executor.submit(rama_con_reduccion, reducir, key, analizar, *args)] = key
+    if ramas & {'ndvi', 'indices'}:
+        s2_collection = ee.ImageCollection(S2_COLLECTION).filterBounds(region)
+        # La mediana S2 actual se construye una sola vez para NDVI, EVI y NDSI_floral
+        img_current = s2_collection.filterDate(c_start, c_end).map(mask_s2_clouds).median().clip(region)
+    if 'ndvi' in ramas:
+        enviar('ndvi', analizar_ndvi, region, s2_collection, img_current, h_start, h_end, c_start, c_end,
+               'ndvi' not in sin_historico, capas_de(seleccion, 'ndvi'))
+    if 'temperatura' in ramas:
+        lst_collection = ee.ImageCollection(LST_COLLECTION).filterBounds(region)
+        enviar('temperatura', analizar_lst, region, lst_collection, h_start, h_end, c_start, c_end,
+               'temperatura' not in sin_historico, capas_de(seleccion, 'temperatura'))
+    if 'precipitacion' in ramas:
+        gpm_collection = ee.ImageCollection(GPM_COLLECTION).filterBounds(region)
+        enviar('precipitacion', analizar_precip, region, gpm_collection, h_start, h_end, c_start, c_end,
+               'precipitacion' not in sin_historico, capas_de(seleccion, 'precipitacion'))
+    if 'indices' in ramas:
+        enviar('indices', analizar_indices, region, img_current, seleccion['indices'])
+    return region, futures
+
+# as_completed acotado por el plazo de la petición; al vencer se cancela lo pendiente
+def completadas_con_plazo(futures):
+    plazo = plazo_actual()
+    try:
+        yield from as_completed(futures, timeout=plazo.restante() if plazo else None)
+    except FuturesTimeout:
+        plazo.cancelar()
+        raise PlazoExcedido("Se agotó el tiempo de la petición.")
+
+def analizar_ecosistema_avanzado(coords, h_start, h_end, c_start, c_end, progreso=None, escalas=None, precision=None,
+                                 linea_base=None, seleccion=None):
+    progreso = progreso or (lambda fraccion, etapa: None)
+    escalas = escalas or escalas_adaptativas(coords)
+    lineas = lineas_base(coords, c_start, c_end)
+    # Con linea_base='climatologia' la ventana histórica sólo se calcula si falta climatología
+    sin_historico = set(lineas) & ramas_seleccionadas(seleccion) if linea_base == 'climatologia' else set()
+
+    # Los analizar_* sólo construyen el grafo: los escalares se piden todos juntos al final.
+    bandas_por_escala = {}
+    resultados_maps = {}
+    fuentes = {}
+
+    # Con la caché por celdas se analiza la región ajustada a la rejilla, para que las
+    # celdas del borde no queden recortadas por el clip de los analizar_*. Las celdas son
+    # rectángulos planos, así que el clip también: el rectángulo geodésico se curva entre
+    # vértices y dejaría sin cubrir parte de las celdas del borde norte o sur, cuyas sumas
+    # parciales se cachearían y reutilizarían.
+    celdas = precision is None and usar_celdas(coords)
+    region_analisis = ajustar_a_rejilla(coords, cache_celdas.tamano) if celdas else coords
+    region, futures = lanzar_analisis(ejecutor_analisis, region_analisis, h_start, h_end, c_start, c_end, sin_historico,
+                                      seleccion, geodesica=not celdas)
+    completadas = 0
+    for future in completadas_con_plazo(futures):
+        key = futures[future]
+        try:
+            bandas, maps = future.result()
+            bandas_por_escala.setdefault(escalas[key], {}).update(bandas)
+            resultados_maps.update(maps)
+            fuentes.update(etiquetar_fuentes(key, bandas, escalas[key]))
+        except PlazoExcedido:
+            raise
+        except Exception as e:
+            print(f"Error en {key}: {e}", file=sys.stderr)
+        completadas += 1
+        progreso(0.15 * completadas, key)
+
+    # Un único getInfo con una reducción por escala (antes ~14 viajes y 11 reduceRegion)
+    progreso(0.7, 'valores')
+    cobertura = None
+    if precision is not None:
+        region_info = get_info_lote({'centro': region.centroid().coordinates()})
+        resultados_vals, estadisticas, cobertura = estimar_por_muestreo(region, coords, bandas_por_escala, precision)
+        centro = region_info.get('centro') or [None, None]
+    elif celdas:
+        resultados_vals, estadisticas, cobertura = reducir_por_celdas(
+            coords, bandas_por_escala, [h_start, h_end, c_start, c_end])
+        centro = [(coords[0] + coords[2]) / 2, (coords[1] + coords[3]) / 2]
+    else:
+        info, resultados_vals, estadisticas = reducir_region(
+            region, coords, bandas_por_escala, {'centro': region.centroid().coordinates()})
+        centro = info.get('centro') or [None, None]
+    completar_con_climatologia(resultados_vals, estadisticas, fuentes, lineas, sin_historico)
+    return construir_respuesta(resultados_vals, resultados_maps, centro, estadisticas, cobertura,
+                               resolucion_efectiva(escalas), fuentes, lineas, seleccion)
+
+# ✨ DATOS PARA GRÁFICAS: se construyen por variable para poder enviarlos por partes ✨
+def fragmento_grafica(variable, resultados_vals):
+    if variable == 'ndvi':
+        return {"comparative_charts": {"ndvi": {
+            "labels": ["Histórico", "Actual"],
+            "datasets": [{
+                "label": "NDVI",
+                "data": [resultados_vals.get('ndvi_h'), resultados_vals.get('ndvi_c')]
+            }]
+        }}}
+    if variable == 'temperatura':
+        return {"comparative_charts": {"temperature": {
+            "labels": ["Histórico (°C)", "Actual (°C)"],
+            "datasets": [{
+                "label": "Temperatura",
+                "data": [resultados_vals.get('lst_h'), resultados_vals.get('lst_c')]
+            }]
+        }}}
+    if variable == 'precipitacion':
+        return {"comparative_charts": {"precipitation": {
+            "labels": ["Histórico (mm)", "Actual (mm)"],
+            "datasets": [{
+                "label": "Precipitación",
+                "data": [resultados_vals.get('precip_h'), resultados_vals.get('precip_c')]
+            }]
+        }}}
+    if variable == 'indices':
+        return {"gauge_charts": {
             "ndvi": {"valor": resultados_vals.get('ndvi_c')},
             "evi": {"valor": resultados_vals.get('evi_c')},
             "ndsi_floral": {"valor": resultados_vals.get('ndsi_c')}
-        }
-    }
+        }}
+    return {}
 
+# Sólo las gráficas de lo que se calculó según la selección
+def construir_chart_data(resultados_vals, seleccion=None):
+    seleccion = seleccion or SELECCION_COMPLETA
+    chart_data = {"comparative_charts": {}, "gauge_charts": {}}
+    for variable in seleccion['variables'] + ['indices']:
+        for seccion, graficas in fragmento_grafica(variable, resultados_vals).items():
+            chart_data[seccion].update(graficas)
+    medidores = set(seleccion['indices']) | ({'ndvi'} & set(seleccion['variables']))
+    chart_data["gauge_charts"] = {k: v for k, v in chart_data["gauge_charts"].items() if k in medidores}
+    return chart_data
+
+def construir_respuesta(resultados_vals, resultados_maps, centro, estadisticas=None, cobertura=None,
+                        resolucion=None, fuentes=None, lineas=None, seleccion=None):
+    anomalias = anomalias_climatologicas(resultados_vals, lineas)
     return {
-        "map_data": {"centro": [region.centroid().coordinates().get(1).getInfo(),
-                                region.centroid().coordinates().get(0).getInfo()],
+        "map_data": {"centro": [centro[1], centro[0]],
                      "tile_urls": resultados_maps},
         "dashboard_data": {
             "actual": {
@@ -212,16 +1359,199 @@ def analizar_ecosistema_avanzado(coords, h_start, h_end, c_start, c_end):
             },
             "comparativo": {
                 "ndvi_historico": {"valor": resultados_vals.get('ndvi_h')},
-                "cambio_ndvi": {"valor": resultados_vals.get('ndvi_d'), "interpretacion": interpretar_cambio(resultados_vals.get('ndvi_d'), 0.1, 0.02, 'vegetación')},
+                "cambio_ndvi": {"valor": resultados_vals.get('ndvi_d'), "interpretacion": interpretar_cambio(resultados_vals.get('ndvi_d'), 0.1, 0.02, 'vegetación'),
+                                "anomalia_z": anomalias.get('ndvi', {}).get('z'), "interpretacion_anomalia": interpretar_anomalia(anomalias.get('ndvi', {}).get('z'), 'vegetación')},
                 "temperatura_historica": {"valor": resultados_vals.get('lst_h')},
-                "cambio_temperatura": {"valor": resultados_vals.get('lst_d'), "interpretacion": interpretar_cambio(resultados_vals.get('lst_d'), 2, 0.5, 'temperatura')},
+                "cambio_temperatura": {"valor": resultados_vals.get('lst_d'), "interpretacion": interpretar_cambio(resultados_vals.get('lst_d'), 2, 0.5, 'temperatura'),
+                                       "anomalia_z": anomalias.get('temperatura', {}).get('z'), "interpretacion_anomalia": interpretar_anomalia(anomalias.get('temperatura', {}).get('z'), 'temperatura')},
                 "precipitacion_historica": {"valor": resultados_vals.get('precip_h')},
-                "cambio_precipitacion_rel": {"valor": resultados_vals.get('precip_d'), "interpretacion": interpretar_cambio(resultados_vals.get('precip_d'), 0.5, 0.1, 'precipitación')}
+                "cambio_precipitacion_rel": {"valor": resultados_vals.get('precip_d'), "interpretacion": interpretar_cambio(resultados_vals.get('precip_d'), 0.5, 0.1, 'precipitación'),
+                                             "anomalia_z": anomalias.get('precipitacion', {}).get('z'), "interpretacion_anomalia": interpretar_anomalia(anomalias.get('precipitacion', {}).get('z'), 'precipitación')}
             }
         },
-        "chart_data": chart_data # <-- Se añade el nuevo objeto a la respuesta
+        "chart_data": construir_chart_data(resultados_vals, seleccion),
+        "estadisticas": estadisticas or {},
+        "cobertura": cobertura or {"modo": "exacto", "exacto": True},
+        "resolucion": resolucion or {},
+        "fuentes": fuentes or {},
+        "climatologia": anomalias
     }
 
+# Variante por partes: cada rama se reduce en su propia tarea del ejecutor y se emite en
+# cuanto termina, sin esperar a las demás (NDVI no espera a GPM).
+# Produce tuplas (evento, datos); el último evento es 'resumen' con la respuesta completa.
+# Con progresivo=True se emite primero un evento 'preliminar' con NDVI/EVI de MOD13Q1, que
+# los valores de Sentinel-2 sustituyen al llegar (o completan el resumen si S2 falla).
+def analizar_ecosistema_stream(coords, h_start, h_end, c_start, c_end, escalas=None, progresivo=False, seleccion=None):
+    escalas = escalas or escalas_adaptativas(coords)
+    resultados_vals = {}
+    resultados_maps = {}
+    estadisticas = {}
+    fuentes = {}
+    preliminares = {}
+    centro = None
+
+    region = ee.Geometry.Rectangle(coords)
+
+    # Una reducción apilada por rama; el centro viaja con cada una (se usa el primero que llega)
+    def reducir(key, bandas):
+        return reducir_region(region, coords, {escalas[key]: bandas}, {'centro': region.centroid().coordinates()})
+
+    _, futures = lanzar_analisis(ejecutor_analisis, coords, h_start, h_end, c_start, c_end, seleccion=seleccion,
+                                      reducir=reducir)
+    # La respuesta preliminar sólo tiene sentido si se pidió NDVI o EVI
+    if progresivo and ('ndvi' in ramas_seleccionadas(seleccion) or 'evi' in (seleccion or SELECCION_COMPLETA)['indices']):
+        # Mientras se evalúa MOD13Q1 (un getInfo barato), las ramas S2 avanzan en el ejecutor
+        bandas, _ = analizar_modis_vi(region, h_start, h_end, c_start, c_end)
+        pedidas = ({'ndvi_c', 'ndvi_h', 'ndvi_d'} if 'ndvi' in ramas_seleccionadas(seleccion) else set()) | \
+                  ({'evi_c'} if 'evi' in (seleccion or SELECCION_COMPLETA)['indices'] else set())
+        bandas = {nombre: imagen for nombre, imagen in bandas.items() if nombre in pedidas}
+        escala = max(MODIS_VI_ESCALA, escalas['ndvi'])
+        info, valores, est = reducir_region(region, coords, {escala: bandas},
+                                            {'centro': region.centroid().coordinates()})
+        centro = info.get('centro') or [None, None]
+        preliminares = {'valores': valores, 'estadisticas': est,
+                        'fuentes': etiquetar_fuentes('modis_vi', bandas, escala)}
+        yield 'preliminar', {
+            "variable": 'modis_vi',
+            "valores": valores,
+            "estadisticas": est,
+            "fuentes": preliminares['fuentes'],
+            "chart_data": {**fragmento_grafica('ndvi', valores), **fragmento_grafica('indices', valores)},
+            "centro": [centro[1], centro[0]]
+        }
+
+    for future in completadas_con_plazo(futures):
+        key = futures[future]
+        try:
+            bandas, maps, (info, valores, est) = future.result()
+        except PlazoExcedido:
+            raise
+        except Exception as e:
+            print(f"Error en {key}: {e}", file=sys.stderr)
+            yield 'error', {"variable": key, "error": str(e)}
+            continue
+
+        if centro is None or centro[0] is None:
+            centro = info.get('centro') or [None, None]
+        etiquetas = etiquetar_fuentes(key, bandas, escalas[key])
+        resultados_vals.update(valores)
+        resultados_maps.update(maps)
+        estadisticas.update(est)
+        fuentes.update(etiquetas)
+        yield 'variable', {
+            "variable": key,
+            "valores": valores,
+            "estadisticas": est,
+            "fuentes": etiquetas,
+            "tile_urls": maps,
+            "chart_data": fragmento_grafica(key, resultados_vals),
+            "centro": [centro[1], centro[0]]
+        }
+
+    # Lo que Sentinel-2 no pudo calcular se queda con el valor MODIS, etiquetado como tal
+    for nombre, valor in preliminares.get('valores', {}).items():
+        if resultados_vals.get(nombre) is None and valor is not None:
+            resultados_vals[nombre] = valor
+            estadisticas[nombre] = preliminares['estadisticas'][nombre]
+            fuentes[nombre] = preliminares['fuentes'][nombre]
+
+    yield 'resumen', construir_respuesta(resultados_vals, resultados_maps, centro or [None, None], estadisticas,
+                                         resolucion=resolucion_efectiva(escalas), fuentes=fuentes,
+                                         lineas=lineas_base(coords, c_start, c_end), seleccion=seleccion)
+
+# No se guarda en caché una respuesta sin ningún valor (p. ej. GEE caído)
+def resultado_cacheable(resultados):
+    actual = resultados["dashboard_data"]["actual"]
+    return any(v.get("valor") is not None for v in actual.values())
+
+REQUIRED_KEYS = ['coords', 'historic_start', 'historic_end', 'current_start', 'current_end']
+# Parámetros opcionales que también viajan con los trabajos asíncronos
+CLAVES_SELECCION = ['variables', 'indices', 'layers']
+OPTIONAL_KEYS = ['modo', 'precision', 'linea_base'] + CLAVES_SELECCION
+LINEAS_BASE = ('ventana', 'climatologia')
+
+# None salvo en modo muestreo ("modo": "muestreo"); ValueError si la precisión no es válida
+def precision_muestreo(data):
+    if data.get('modo') != 'muestreo':
+        return None
+    precision = float(data.get('precision') or PRECISION_MUESTREO)
+    if not 0 < precision < 1:
+        raise ValueError("'precision' debe estar entre 0 y 1.")
+    return precision
+
+# 'ventana' (por defecto) calcula la ventana histórica pedida; 'climatologia' usa la climatología
+def linea_base_pedida(data):
+    linea_base = data.get('linea_base') or 'ventana'
+    if linea_base not in LINEAS_BASE:
+        raise ValueError(f"'linea_base' debe ser una de {LINEAS_BASE}.")
+    return linea_base
+
+# Se analizan las coords ya redondeadas para que el resultado corresponda a la clave.
+# Las escalas sólo entran en la clave si difieren de las habituales.
+def parametros_canonicos(data, escalas=None):
+    coords = canonizar_coords(data['coords'], CACHE_PRECISION_COORDS)
+    fechas = [data['historic_start'], data['historic_end'], data['current_start'], data['current_end']]
+    extra = {'escalas': escalas} if escalas and escalas != ESCALAS_VARIABLE else {}
+    precision = precision_muestreo(data)
+    if precision is not None:
+        extra['muestreo'] = precision
+    if linea_base_pedida(data) != 'ventana':
+        extra['linea_base'] = linea_base_pedida(data)
+    if seleccion_pedida(data) != SELECCION_COMPLETA:
+        extra['seleccion'] = seleccion_pedida(data)
+    return coords, fechas, clave_canonica(coords, fechas, CACHE_PRECISION_COORDS, extra or None)
+
+# Devuelve el JSON ya serializado, desde la caché o calculándolo
+def resolver_analisis(data, progreso=None, escalas=None):
+    coords, fechas, clave = parametros_canonicos(data, escalas)
+    payload = cache_resultados.obtener(clave)
+    if payload is None:
+        payload = vuelos_analisis.ejecutar(clave, calcular_analisis, clave, coords, fechas, progreso, escalas,
+                                           precision_muestreo(data), linea_base_pedida(data), seleccion_pedida(data))
+    return payload
+
+def calcular_analisis(clave, coords, fechas, progreso=None, escalas=None, precision=None, linea_base=None,
+                      seleccion=None):
+    resultados = analizar_ecosistema_avanzado(coords, *fechas, progreso=progreso, escalas=escalas,
+                                              precision=precision, linea_base=linea_base, seleccion=seleccion)
+    payload = json.dumps(resultados)
+    if resultado_cacheable(resultados):
+        cache_resultados.guardar(clave, payload, cache_resultados.ttl_para(fechas[3]))
+    return payload
+
+# Ejecuta fn con un plazo propio; al salir se cancela cualquier tarea que siga pendiente
+def con_plazo_peticion(segundos, fn, *args, **kwargs):
+    plazo = Plazo(segundos)
+    token = con_plazo(plazo)
+    token_opciones = opciones_peticion.set({})
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        opciones_peticion.reset(token_opciones)
+        restaurar_plazo(token)
+        plazo.cancelar()
+
+# Los trabajos tienen más plazo, así que la resolución adaptativa elige escalas más finas.
+# El precálculo de climatología también se ejecuta como trabajo asíncrono.
+def ejecutar_trabajo(parametros, progreso):
+    if parametros.get('tipo') == 'climatologia':
+        return con_plazo_peticion(PLAZO_TRABAJO, precalcular_climatologia, parametros['coords'],
+                                  parametros['anio_inicio'], parametros['anio_fin'], parametros.get('variables'), progreso)
+    escalas = parametros.get('escalas') or escalas_adaptativas(
+        canonizar_coords(parametros['coords'], CACHE_PRECISION_COORDS), PLAZO_TRABAJO)
+    return con_plazo_peticion(PLAZO_TRABAJO, resolver_analisis, parametros, progreso, escalas)
+
+# Trabajos asíncronos: estado persistido en SQLite junto a la caché
+TRABAJOS_DB = os.environ.get('SUPERBLOOM_TRABAJOS_DB', os.path.join(BASE_DIR, 'trabajos.sqlite3'))
+gestor_trabajos = GestorTrabajos(
+    TRABAJOS_DB, ejecutar_trabajo,
+    max_workers=int(os.environ.get('SUPERBLOOM_TRABAJOS_WORKERS', 2)),
+    concesion=float(os.environ.get('SUPERBLOOM_TRABAJOS_CONCESION', 60)),
+)
+if PROCESO_PRINCIPAL:
+    gestor_trabajos.reanudar_pendientes()
+
 # ===========================================
 # 4️⃣ CONFIGURACIÓN DEL SERVIDOR FLASK
 # ===========================================
@@ -235,18 +1565,289 @@ def home():
 def analizar_endpoint():
     try:
         data = request.get_json()
-        required_keys = ['coords', 'historic_start', 'historic_end', 'current_start', 'current_end']
-        if not all(key in data for key in required_keys):
+        if not all(key in data for key in REQUIRED_KEYS):
             return jsonify({"error": "Faltan parámetros."}), 400
 
-        resultados = analizar_ecosistema_avanzado(
-            data['coords'], data['historic_start'], data['historic_end'],
-            data['current_start'], data['current_end']
-        )
-        return jsonify(resultados)
+        # Modo progresivo: respuesta inmediata con MODIS y refinado con Sentinel-2 por SSE
+        if request.args.get('progresivo') == '1' or data.get('progresivo'):
+            return respuesta_stream(data, progresivo=True)
+        return con_plazo_peticion(PLAZO_PETICION, responder_analisis, data)
+    except ColaLlena as e:
+        return jsonify({"error": f"Servidor ocupado, inténtalo más tarde: {str(e)}"}), 503
+    except PlazoExcedido as e:
+        return jsonify({"error": str(e)}), 504
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error en servidor: {e}", file=sys.stderr)
         return jsonify({"error": f"Error interno del servidor: {str(e)}"}), 500
 
+# Una petición que no está en caché pasa antes por el estimador de coste: si supera
+# el máximo se rechaza, se convierte en trabajo asíncrono o se calcula a escala más gruesa
+def responder_analisis(data):
+    coords, fechas, _ = parametros_canonicos(data)
+    escalas = escalas_adaptativas(coords)
+    _, _, clave = parametros_canonicos(data, escalas)
+    payload = cache_resultados.obtener(clave)
+    if payload is None:
+        plan = planificar(coords, fechas, escalas, precision=precision_muestreo(data), seleccion=seleccion_pedida(data))
+        if plan['decision'] == 'rechazar':
+            return jsonify({"error": "El análisis supera el coste máximo permitido.", "plan": plan}), 422
+        if plan['decision'] == 'encolar':
+            return jsonify(dict(encolar_trabajo(data), plan=plan)), 202
+        payload = resolver_analisis(data, escalas=plan['escalas'])
+    return app.response_class(payload, mimetype='application/json')
+
+def evento_sse(evento, datos):
+    return f"event: {evento}\ndata: {json.dumps(datos)}\n\n"
+
+# Igual que /analizar-avanzado pero emite cada variable en cuanto está lista (Server-Sent Events)
+@app.route('/analizar-avanzado/stream', methods=['POST'])
+def analizar_stream_endpoint():
+    data = request.get_json()
+    if not data or not all(key in data for key in REQUIRED_KEYS):
+        return jsonify({"error": "Faltan parámetros."}), 400
+    try:
+        return respuesta_stream(data, progresivo=request.args.get('progresivo') == '1' or bool(data.get('progresivo')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+def respuesta_stream(data, progresivo=False):
+    # El stream siempre calcula la reducción exacta (sin modo muestreo)
+    data = {key: data[key] for key in REQUIRED_KEYS + CLAVES_SELECCION if key in data}
+    coords, fechas, _ = parametros_canonicos(data)
+    seleccion = seleccion_pedida(data)
+    escalas = escalas_adaptativas(coords)
+    _, _, clave = parametros_canonicos(data, escalas)
+
+    def generar():
+        payload = cache_resultados.obtener(clave)
+        if payload is not None:
+            yield f"event: resumen\ndata: {payload}\n\n"
+            return
+        # Si el cliente se desconecta el generador se cierra y el finally cancela lo pendiente
+        plazo = Plazo(PLAZO_PETICION)
+        token = con_plazo(plazo)
+        token_opciones = opciones_peticion.set({})
+        try:
+            plan = planificar(coords, fechas, escalas, seleccion=seleccion)
+            yield evento_sse('plan', plan)
+            if plan['decision'] == 'rechazar':
+                yield evento_sse('error', {"error": "El análisis supera el coste máximo permitido."})
+                return
+            if plan['decision'] == 'encolar':
+                yield evento_sse('trabajo', encolar_trabajo(data))
+                return
+            _, _, clave_escalas = parametros_canonicos(data, plan['escalas'])
+            for evento, datos in analizar_ecosistema_stream(coords, *fechas, escalas=plan['escalas'], progresivo=progresivo,
+                                                            seleccion=seleccion):
+                if evento == 'resumen':
+                    payload = json.dumps(datos)
+                    if resultado_cacheable(datos):
+                        cache_resultados.guardar(clave_escalas, payload, cache_resultados.ttl_para(data['current_end']))
+                    yield f"event: resumen\ndata: {payload}\n\n"
+                else:
+                    yield evento_sse(evento, datos)
+        except (ColaLlena, PlazoExcedido) as e:
+            yield evento_sse('error', {"error": str(e)})
+        except Exception as e:
+            print(f"Error en stream: {e}", file=sys.stderr)
+            yield evento_sse('error', {"error": f"Error interno del servidor: {str(e)}"})
+        finally:
+            opciones_peticion.reset(token_opciones)
+            restaurar_plazo(token)
+            plazo.cancelar()
+
+    return Response(stream_with_context(generar()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def encolar_trabajo(data):
+    _, _, clave = parametros_canonicos(data)
+    parametros = {key: data[key] for key in REQUIRED_KEYS + OPTIONAL_KEYS if key in data}
+    job_id, nuevo = gestor_trabajos.enviar(clave, parametros, ttl=cache_resultados.ttl_para(data['current_end']))
+    trabajo = gestor_trabajos.obtener(job_id)
+    return {"job_id": job_id, "estado": trabajo['estado'], "nuevo": nuevo}
+
+@app.route('/jobs', methods=['POST'])
+def crear_trabajo():
+    data = request.get_json()
+    if not data or not all(key in data for key in REQUIRED_KEYS):
+        return jsonify({"error": "Faltan parámetros."}), 400
+    try:
+        return jsonify(encolar_trabajo(data)), 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+# Plan del análisis (colecciones, filtros, escalas, llamadas remotas y coste) sin ejecutarlo
+@app.route('/explain', methods=['POST'])
+def explicar_analisis():
+    data = request.get_json()
+    if not data or not all(key in data for key in REQUIRED_KEYS):
+        return jsonify({"error": "Faltan parámetros."}), 400
+    try:
+        coords, fechas, clave = parametros_canonicos(data)
+        plan = con_plazo_peticion(PLAZO_PETICION, planificar, coords, fechas, contar=True,
+                                  precision=precision_muestreo(data), seleccion=seleccion_pedida(data))
+        plan['en_cache'] = cache_resultados.obtener(clave) is not None
+        return jsonify(plan)
+    except PlazoExcedido as e:
+        return jsonify({"error": str(e)}), 504
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+# Compara las mismas variables en N ventanas de fechas (p. ej. cada primavera de los últimos años)
+@app.route('/comparar-periodos', methods=['POST'])
+def comparar_periodos_endpoint():
+    data = request.get_json()
+    if not data or 'coords' not in data or not data.get('ventanas'):
+        return jsonify({"error": "Faltan parámetros."}), 400
+    ventanas = [list(ventana) for ventana in data['ventanas']]
+    if len(ventanas) > MAX_VENTANAS:
+        return jsonify({"error": f"Se admiten como máximo {MAX_VENTANAS} ventanas."}), 400
+    if any(len(ventana) != 2 or not ventana[0] < ventana[1] for ventana in ventanas):
+        return jsonify({"error": "Cada ventana debe ser [inicio, fin] con inicio < fin."}), 400
+    variables = data.get('variables') or list(VARIABLES_PERIODOS)
+    if any(variable not in VARIABLES_PERIODOS for variable in variables):
+        return jsonify({"error": f"Variables disponibles: {list(VARIABLES_PERIODOS)}."}), 400
+
+    coords = canonizar_coords(data['coords'], CACHE_PRECISION_COORDS)
+    # El presupuesto de píxeles se reparte entre las ventanas
+    escalas = escalas_adaptativas(coords, PLAZO_PETICION / len(ventanas))
+    clave = clave_canonica(coords, [fecha for ventana in ventanas for fecha in ventana], CACHE_PRECISION_COORDS,
+                           {'periodos': variables, 'escalas': escalas})
+    try:
+        payload = cache_resultados.obtener(clave)
+        if payload is None:
+            resultado = con_plazo_peticion(PLAZO_PETICION, comparar_periodos, coords, ventanas, variables, escalas)
+            payload = json.dumps(resultado)
+            if any(v is not None for r in resultado['resumen'].values() for v in r['serie']):
+                cache_resultados.guardar(clave, payload, cache_resultados.ttl_para(max(fin for _, fin in ventanas)))
+        return app.response_class(payload, mimetype='application/json')
+    except ColaLlena as e:
+        return jsonify({"error": f"Servidor ocupado, inténtalo más tarde: {str(e)}"}), 503
+    except PlazoExcedido as e:
+        return jsonify({"error": str(e)}), 504
+
+# Serie mensual de NDVI en un punto; sólo los meses que no están en el almacén van a GEE
+@app.route('/serie-ndvi', methods=['POST'])
+def serie_ndvi_endpoint():
+    data = request.get_json()
+    if not data or 'lat' not in data or 'lon' not in data:
+        return jsonify({"error": "Faltan parámetros."}), 400
+    try:
+        anio_fin = int(data.get('anio_fin') or time.gmtime().tm_year)
+        anio_inicio = int(data.get('anio_inicio') or anio_fin - 3)
+        return jsonify(con_plazo_peticion(PLAZO_PETICION, serie_ndvi_punto, float(data['lat']), float(data['lon']),
+                                          anio_inicio, anio_fin))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except PlazoExcedido as e:
+        return jsonify({"error": str(e)}), 504
+
+# Serie mensual conjunta de NDVI, LST y precipitación para un punto (lat, lon) o una región (coords)
+@app.route('/serie-factores', methods=['POST'])
+def serie_factores_endpoint():
+    data = request.get_json()
+    if not data or not ('coords' in data or ('lat' in data and 'lon' in data)):
+        return jsonify({"error": "Faltan parámetros."}), 400
+    try:
+        anio_fin = int(data.get('anio_fin') or time.gmtime().tm_year)
+        anio_inicio = int(data.get('anio_inicio') or anio_fin - 3)
+        if 'coords' in data:
+            ubicacion = {'coords': canonizar_coords(data['coords'], CACHE_PRECISION_COORDS)}
+        else:
+            ubicacion = {'lat': float(data['lat']), 'lon': float(data['lon'])}
+        return jsonify(con_plazo_peticion(PLAZO_PETICION, serie_combinada, anio_inicio, anio_fin, **ubicacion))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except PlazoExcedido as e:
+        return jsonify({"error": str(e)}), 504
+
+# Gráficas de muchas series a la vez: {series: [{timeseries} | {lat, lon} | {coords}], tipos, formato}.
+# Devuelve la URL de cada archivo; las ya dibujadas para la misma serie no se repiten.
+@app.route('/graficas', methods=['POST'])
+def crear_graficas():
+    data = request.get_json()
+    if not data or not data.get('series'):
+        return jsonify({"error": "Faltan parámetros."}), 400
+    if not isinstance(data['series'], list) or not all(isinstance(e, dict) for e in data['series']):
+        return jsonify({"error": "'series' debe ser una lista de objetos."}), 400
+    if not isinstance(data.get('tipos') or [], list):
+        return jsonify({"error": "'tipos' debe ser una lista."}), 400
+    if len(data['series']) > GRAFICAS_MAX_SERIES:
+        return jsonify({"error": f"Como máximo {GRAFICAS_MAX_SERIES} series por petición."}), 400
+    tipos = data.get('tipos') or list(GRAFICAS)
+    formato = data.get('formato', 'png')
+    try:
+        anio_fin = int(data.get('anio_fin') or time.gmtime().tm_year)
+        anio_inicio = int(data.get('anio_inicio') or anio_fin - 3)
+        series = con_plazo_peticion(PLAZO_PETICION, series_para_graficas, data['series'], anio_inicio, anio_fin)
+        resultados = almacen_graficas.renderizar_lote(
+            [(tipo, timeseries) for timeseries in series for tipo in tipos], formato)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ColaLlena as e:
+        return jsonify({"error": f"Servidor ocupado, inténtalo más tarde: {str(e)}"}), 503
+    except (PlazoExcedido, FuturesTimeout):
+        return jsonify({"error": "Se agotó el tiempo de la petición."}), 504
+    for resultado in resultados:
+        if 'huella' in resultado:
+            resultado['url'] = f"/graficas/{resultado['huella']}.{formato}"
+    return jsonify({"graficas": [resultados[i:i + len(tipos)] for i in range(0, len(resultados), len(tipos))]})
+
+# El nombre es el hash del contenido: el archivo nunca cambia y se puede cachear indefinidamente
+@app.route('/graficas/<huella>.<formato>', methods=['GET'])
+def servir_grafica(huella, formato):
+    if formato not in FORMATOS or len(huella) != 64 or any(c not in '0123456789abcdef' for c in huella):
+        return jsonify({"error": "Gráfica no encontrada."}), 404
+    ruta = almacen_graficas.ruta(huella, formato)
+    if not os.path.exists(ruta):
+        return jsonify({"error": "Gráfica no encontrada."}), 404
+    respuesta = send_file(ruta, mimetype=TIPOS_MIME[formato], etag=huella, conditional=True, max_age=31536000)
+    respuesta.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return respuesta
+
+# Precalcula la climatología mensual de una región (trabajo asíncrono, consultar con /jobs/<id>)
+@app.route('/climatologia', methods=['POST'])
+def crear_climatologia():
+    data = request.get_json()
+    if not data or not all(key in data for key in ('coords', 'anio_inicio', 'anio_fin')):
+        return jsonify({"error": "Faltan parámetros."}), 400
+    variables = data.get('variables') or list(CLIMATOLOGIA_VARIABLES)
+    if any(variable not in CLIMATOLOGIA_VARIABLES for variable in variables):
+        return jsonify({"error": f"Variables disponibles: {list(CLIMATOLOGIA_VARIABLES)}."}), 400
+    coords = canonizar_coords(data['coords'], CACHE_PRECISION_COORDS)
+    if len(celdas_climatologia(coords)[1]) > CLIMATOLOGIA_MAX_CELDAS:
+        return jsonify({"error": f"La región supera el máximo de {CLIMATOLOGIA_MAX_CELDAS} celdas."}), 400
+    parametros = {'tipo': 'climatologia', 'coords': coords, 'anio_inicio': int(data['anio_inicio']),
+                  'anio_fin': int(data['anio_fin']), 'variables': variables}
+    clave = clave_canonica(coords, [str(parametros['anio_inicio']), str(parametros['anio_fin'])],
+                           CACHE_PRECISION_COORDS, {'climatologia': variables})
+    # Un precálculo completado se puede repetir: sólo calcula los meses que aún falten
+    job_id, nuevo = gestor_trabajos.enviar(clave, parametros, ttl=0)
+    trabajo = gestor_trabajos.obtener(job_id)
+    return jsonify({"job_id": job_id, "estado": trabajo['estado'], "nuevo": nuevo}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def consultar_trabajo(job_id):
+    trabajo = gestor_trabajos.obtener(job_id)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado."}), 404
+    return jsonify(trabajo)
+
+@app.route('/estado', methods=['GET'])
+def estado_servidor():
+    return jsonify({
+        "ejecutores": [ejecutor_analisis.estadisticas(), ejecutor_teselas.estadisticas(), ejecutor_mapas.estadisticas()],
+        "cache_resultados": cache_resultados.estadisticas(),
+        "cache_mapas": cache_mapas.estadisticas(),
+        "cache_celdas": cache_celdas.estadisticas(),
+        "climatologia": almacen_climatologia.estadisticas(),
+        "series": almacen_series.estadisticas(),
+        "graficas": almacen_graficas.estadisticas(),
+        "coalescencia": [vuelos_analisis.estadisticas(), vuelos_getinfo.estadisticas()],
+        "microlotes": agrupador_getinfo.estadisticas() if agrupador_getinfo is not None else None
+    })
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
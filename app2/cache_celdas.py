@@ -0,0 +1,134 @@
+# cache_celdas.py
+"""
+Caché espacial de estadísticos por celda.
+
+El plano se divide en celdas de una rejilla fija en grados. Por cada celda,
+banda, ventana de fechas y escala se guarda un agregado combinable (suma,
+conteo, suma de cuadrados; ver agregados.py), de modo que un rectángulo
+cualquiera se responde sumando las celdas que lo cubren y sólo las celdas que
+faltan se piden a Earth Engine.
+
+La respuesta corresponde a la unión de celdas (el rectángulo ajustado hacia
+fuera a la rejilla), no al rectángulo exacto: `cobertura` indica qué fracción de
+esa unión pidió realmente el usuario.
+"""
+import math
+import sqlite3
+import threading
+import time
+
+from cache_resultados import ventana_cerrada
+
+RADIO_TIERRA_KM = 6371.0088
+_EPS = 1e-9
+
+
+def indices_celdas(coords, tamano):
+    """Índices (i, j) de las celdas que cubren el rectángulo [xmin, ymin, xmax, ymax]."""
+    xmin, ymin, xmax, ymax = coords
+    i0, i1 = math.floor(xmin / tamano + _EPS), math.ceil(xmax / tamano - _EPS)
+    j0, j1 = math.floor(ymin / tamano + _EPS), math.ceil(ymax / tamano - _EPS)
+    return [(i, j) for i in range(i0, max(i1, i0 + 1)) for j in range(j0, max(j1, j0 + 1))]
+
+
+def limites_celda(i, j, tamano):
+    return [round(i * tamano, 9) + 0.0, round(j * tamano, 9) + 0.0,
+            round((i + 1) * tamano, 9) + 0.0, round((j + 1) * tamano, 9) + 0.0]
+
+
+def ajustar_a_rejilla(coords, tamano):
+    """Rectángulo ajustado hacia fuera a los bordes de celda."""
+    celdas = indices_celdas(coords, tamano)
+    i0, j0 = min(i for i, _ in celdas), min(j for _, j in celdas)
+    i1, j1 = max(i for i, _ in celdas), max(j for _, j in celdas)
+    return limites_celda(i0, j0, tamano)[:2] + limites_celda(i1, j1, tamano)[2:]
+
+
+def id_celda(i, j, tamano):
+    return f'{tamano:g}:{i}:{j}'
+
+
+def area_km2(coords):
+    """Área esférica de un rectángulo lon/lat."""
+    xmin, ymin, xmax, ymax = coords
+    return (RADIO_TIERRA_KM ** 2 * math.radians(xmax - xmin)
+            * abs(math.sin(math.radians(ymax)) - math.sin(math.radians(ymin))))
+
+
+class CacheCeldas:
+    def __init__(self, ruta_db, tamano=0.01, max_filas=500000,
+                 ttl_abierto=3600, ttl_cerrado=7 * 24 * 3600):
+        self.ruta_db = ruta_db
+        self.tamano = tamano
+        self.max_filas = max_filas
+        self.ttl_abierto = ttl_abierto
+        self.ttl_cerrado = ttl_cerrado
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        with self._conectar() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS celdas (
+                    celda TEXT NOT NULL,
+                    banda TEXT NOT NULL,
+                    ventana TEXT NOT NULL,
+                    escala INTEGER NOT NULL,
+                    suma REAL NOT NULL,
+                    conteo INTEGER NOT NULL,
+                    suma_cuadrados REAL NOT NULL,
+                    expira REAL NOT NULL,
+                    accedido REAL NOT NULL,
+                    PRIMARY KEY (celda, banda, ventana, escala)
+                )""")
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta_db, timeout=30)
+
+    def ttl_para(self, fecha_fin):
+        return self.ttl_cerrado if ventana_cerrada(fecha_fin) else self.ttl_abierto
+
+    def obtener(self, celdas, banda, ventana, escala):
+        """-> {celda: (suma, conteo, suma_cuadrados)} de las celdas presentes y vigentes."""
+        ahora = time.time()
+        encontradas = {}
+        with self._conectar() as con:
+            # SQLite limita el número de parámetros por consulta
+            for inicio in range(0, len(celdas), 500):
+                lote = celdas[inicio:inicio + 500]
+                filas = con.execute(
+                    f"""SELECT celda, suma, conteo, suma_cuadrados FROM celdas
+                        WHERE banda = ? AND ventana = ? AND escala = ? AND expira > ?
+                        AND celda IN ({','.join('?' * len(lote))})""",
+                    (banda, ventana, escala, ahora, *lote)).fetchall()
+                encontradas.update({celda: (s, n, q) for celda, s, n, q in filas})
+            if encontradas:
+                con.executemany("UPDATE celdas SET accedido = ? WHERE celda = ? AND banda = ? AND ventana = ? AND escala = ?",
+                                [(ahora, celda, banda, ventana, escala) for celda in encontradas])
+        with self._lock:
+            self.aciertos += len(encontradas)
+            self.fallos += len(celdas) - len(encontradas)
+        return encontradas
+
+    def guardar(self, filas, ttl_por_ventana):
+        """filas: [(celda, banda, ventana, escala, (suma, conteo, suma_cuadrados))]."""
+        ahora = time.time()
+        with self._conectar() as con:
+            con.executemany("INSERT OR REPLACE INTO celdas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+                (celda, banda, ventana, escala, s, n, q, ahora + ttl_por_ventana[ventana], ahora)
+                for celda, banda, ventana, escala, (s, n, q) in filas])
+            con.execute("DELETE FROM celdas WHERE expira <= ?", (ahora,))
+            con.execute("""
+                DELETE FROM celdas WHERE rowid IN (
+                    SELECT rowid FROM celdas ORDER BY accedido DESC LIMIT -1 OFFSET ?
+                )""", (self.max_filas,))
+
+    def estadisticas(self):
+        with self._conectar() as con:
+            filas = con.execute("SELECT COUNT(*) FROM celdas").fetchone()[0]
+        with self._lock:
+            return {
+                'tamano_grados': self.tamano,
+                'filas': filas,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+            }
@@ -0,0 +1,138 @@
+# cache_mapas.py
+"""
+Caché de MapIds (URLs de teselas) de Earth Engine.
+
+La clave es el grafo serializado de la imagen más los parámetros de
+visualización, así que imágenes idénticas comparten la misma URL. Las que faltan
+se piden en paralelo y un hilo en segundo plano renueva los tokens antes de que
+caduquen, mientras la capa se siga consultando.
+"""
+import hashlib
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from coalescencia import VueloUnico
+from ejecutor import plazo_actual
+
+
+def clave_mapa(imagen, vis):
+    texto = imagen.serialize() + json.dumps(vis, sort_keys=True)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+class _EntradaMapa:
+    __slots__ = ('imagen', 'vis', 'url', 'expira', 'accedido')
+
+    def __init__(self, imagen, vis, url, expira):
+        self.imagen = imagen
+        self.vis = vis
+        self.url = url
+        self.expira = expira
+        self.accedido = time.time()
+
+
+class CacheMapIds:
+    def __init__(self, duracion_token=4 * 3600, margen_refresco=0.2,
+                 intervalo_revision=60, max_hilos=9, ejecutor=None):
+        self.duracion_token = duracion_token
+        # Se renueva cuando queda menos de esta fracción de vida del token
+        self.margen_refresco = margen_refresco
+        self.intervalo_revision = intervalo_revision
+        self._entradas = {}
+        self._lock = threading.Lock()
+        # Admite un ejecutor compartido (p. ej. EjecutorAcotado) con la interfaz submit()
+        self._pool = ejecutor or ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix='mapid')
+        self._hilo_refresco = None
+        # La misma capa pedida a la vez por varias peticiones se solicita una sola vez
+        self.vuelos = VueloUnico('mapid')
+        self.aciertos = 0
+        self.fallos = 0
+        self.renovaciones = 0
+
+    def _pedir_url(self, imagen, vis):
+        return imagen.getMapId(vis)['tile_fetcher'].url_format
+
+    def obtener_urls(self, capas):
+        """capas: {nombre: (imagen, vis)} -> {nombre: url_format}."""
+        self._iniciar_refresco()
+        ahora = time.time()
+        urls, faltantes = {}, {}
+        with self._lock:
+            for nombre, (imagen, vis) in capas.items():
+                clave = clave_mapa(imagen, vis)
+                entrada = self._entradas.get(clave)
+                if entrada is not None and entrada.expira > ahora:
+                    entrada.accedido = ahora
+                    urls[nombre] = entrada.url
+                    self.aciertos += 1
+                else:
+                    faltantes[nombre] = (clave, imagen, vis)
+                    self.fallos += 1
+
+        futures = {nombre: self._pool.submit(self.vuelos.ejecutar, clave, self._pedir_url, imagen, vis)
+                   for nombre, (clave, imagen, vis) in faltantes.items()}
+        plazo = plazo_actual()
+        for nombre, future in futures.items():
+            clave, imagen, vis = faltantes[nombre]
+            url = future.result(timeout=plazo.restante() if plazo else None)
+            urls[nombre] = url
+            with self._lock:
+                self._entradas[clave] = _EntradaMapa(imagen, vis, url, time.time() + self.duracion_token)
+        return urls
+
+    def _iniciar_refresco(self):
+        if self._hilo_refresco is not None:
+            return
+        with self._lock:
+            if self._hilo_refresco is None:
+                self._hilo_refresco = threading.Thread(target=self._bucle_refresco,
+                                                       name='mapid-refresco', daemon=True)
+                self._hilo_refresco.start()
+
+    def _bucle_refresco(self):
+        while True:
+            time.sleep(self.intervalo_revision)
+            try:
+                self.refrescar()
+            except Exception as e:
+                print(f"Error renovando MapIds: {e}", file=sys.stderr)
+
+    def refrescar(self):
+        ahora = time.time()
+        margen = self.duracion_token * self.margen_refresco
+        por_renovar = []
+        with self._lock:
+            for clave, entrada in list(self._entradas.items()):
+                if entrada.expira <= ahora or ahora - entrada.accedido > self.duracion_token:
+                    # Caducada o sin uso durante una vida completa: se descarta
+                    del self._entradas[clave]
+                elif entrada.expira - ahora < margen:
+                    por_renovar.append((clave, entrada))
+
+        futures = {clave: self._pool.submit(self._pedir_url, entrada.imagen, entrada.vis)
+                   for clave, entrada in por_renovar}
+        for clave, future in futures.items():
+            try:
+                url = future.result()
+            except Exception as e:
+                print(f"Error renovando MapId: {e}", file=sys.stderr)
+                continue
+            with self._lock:
+                entrada = self._entradas.get(clave)
+                if entrada is not None:
+                    entrada.url = url
+                    entrada.expira = time.time() + self.duracion_token
+                    self.renovaciones += 1
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'renovaciones': self.renovaciones,
+                'coalescencia': self.vuelos.estadisticas(),
+            }
@@ -0,0 +1,129 @@
+# cache_resultados.py
+"""
+Caché de dos niveles para las respuestas de /analizar-avanzado.
+
+- Nivel 1: LRU en memoria del proceso (rápido, se pierde al reiniciar).
+- Nivel 2: SQLite en disco, compartido entre reinicios y entre workers de gunicorn.
+
+Se guarda el JSON ya serializado, así que un acierto devuelve exactamente los
+mismos bytes que la respuesta original.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+
+def canonizar_coords(coords, precision):
+    # "+ 0.0" evita que -0.0 y 0.0 generen claves distintas
+    return [round(float(c), precision) + 0.0 for c in coords]
+
+
+def clave_canonica(coords, fechas, precision=3, extra=None):
+    """Clave estable a partir de coords redondeadas y las cuatro fechas."""
+    base = {'coords': canonizar_coords(coords, precision), 'fechas': list(fechas)}
+    if extra:
+        base['extra'] = extra
+    texto = json.dumps(base, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def ventana_cerrada(fecha_fin, hoy=None):
+    """True si la ventana terminó antes de hoy: sus datos ya no cambian."""
+    hoy = hoy or date.today()
+    try:
+        return date.fromisoformat(fecha_fin) < hoy
+    except (TypeError, ValueError):
+        return False
+
+
+class CacheResultados:
+    def __init__(self, ruta_db, max_memoria=256, max_disco=5000,
+                 ttl_abierto=3600, ttl_cerrado=24 * 3600):
+        self.ruta_db = ruta_db
+        self.max_memoria = max_memoria
+        self.max_disco = max_disco
+        self.ttl_abierto = ttl_abierto
+        self.ttl_cerrado = ttl_cerrado
+        self._memoria = OrderedDict()  # clave -> (expira, payload)
+        self._lock = threading.Lock()
+        self.aciertos_memoria = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        with self._conectar() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS resultados (
+                    clave TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    creado REAL NOT NULL,
+                    expira REAL NOT NULL,
+                    accedido REAL NOT NULL
+                )""")
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta_db, timeout=30)
+
+    def ttl_para(self, fecha_fin_actual):
+        # Ventanas ya cerradas no cambian; las abiertas pueden recibir escenas nuevas.
+        return self.ttl_cerrado if ventana_cerrada(fecha_fin_actual) else self.ttl_abierto
+
+    def obtener(self, clave):
+        ahora = time.time()
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None:
+                expira, payload = entrada
+                if expira > ahora:
+                    self._memoria.move_to_end(clave)
+                    self.aciertos_memoria += 1
+                    return payload
+                del self._memoria[clave]
+
+        with self._conectar() as con:
+            fila = con.execute("SELECT payload, expira FROM resultados WHERE clave = ?", (clave,)).fetchone()
+            if fila is None or fila[1] <= ahora:
+                if fila is not None:
+                    con.execute("DELETE FROM resultados WHERE clave = ?", (clave,))
+                with self._lock:
+                    self.fallos += 1
+                return None
+            con.execute("UPDATE resultados SET accedido = ? WHERE clave = ?", (ahora, clave))
+
+        payload, expira = fila
+        with self._lock:
+            self.aciertos_disco += 1
+            self._guardar_memoria(clave, expira, payload)
+        return payload
+
+    def guardar(self, clave, payload, ttl):
+        ahora = time.time()
+        expira = ahora + ttl
+        with self._lock:
+            self._guardar_memoria(clave, expira, payload)
+        with self._conectar() as con:
+            con.execute("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?)",
+                        (clave, payload, ahora, expira, ahora))
+            con.execute("DELETE FROM resultados WHERE expira <= ?", (ahora,))
+            # Desalojo LRU en disco cuando se supera el máximo de entradas
+            con.execute("""
+                DELETE FROM resultados WHERE clave IN (
+                    SELECT clave FROM resultados ORDER BY accedido DESC LIMIT -1 OFFSET ?
+                )""", (self.max_disco,))
+
+    def _guardar_memoria(self, clave, expira, payload):
+        self._memoria[clave] = (expira, payload)
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'entradas_memoria': len(self._memoria),
+                'aciertos_memoria': self.aciertos_memoria,
+                'aciertos_disco': self.aciertos_disco,
+                'fallos': self.fallos,
+            }
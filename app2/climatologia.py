@@ -0,0 +1,175 @@
+# climatologia.py
+"""
+Línea base climatológica por celda, variable, año y mes.
+
+Un precálculo guarda, por celda de una rejilla fija, el agregado combinable
+(suma, conteo, suma de cuadrados; ver agregados.py) del compuesto mensual de
+cada variable. Con eso la línea base de cualquier ventana se obtiene en local:
+para cada año se combinan los valores regionales de los meses que cubre la
+ventana (ponderados por los días cubiertos), y la media y la desviación de esos
+valores entre años son la climatología. La anomalía de la ventana actual se
+expresa como puntuación z frente a esa distribución.
+"""
+import calendar
+import math
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+from agregados import resumir, sumar
+
+
+def dias_por_mes(inicio, fin):
+    """{(años desde el de inicio, mes): días de la ventana [inicio, fin) en ese mes}.
+
+    Así una ventana que cruza el fin de año (p. ej. noviembre-febrero) se
+    traslada a otros años sin mezclar meses de inviernos distintos.
+    """
+    dia, fin = date.fromisoformat(inicio[:10]), date.fromisoformat(fin[:10])
+    anio_inicio = dia.year
+    dias = {}
+    while dia < fin:
+        clave = (dia.year - anio_inicio, dia.month)
+        dias[clave] = dias.get(clave, 0) + 1
+        dia += timedelta(days=1)
+    return dias
+
+
+def mes_cerrado(anio, mes, hoy=None):
+    """True si el mes ya terminó: su compuesto mensual ya no cambia."""
+    return date(anio, mes, calendar.monthrange(anio, mes)[1]) < (hoy or date.today())
+
+
+def valor_ventana(mensuales, dias, anio, acumulada=False):
+    """Valor de la ventana trasladada al año `anio`, a partir de los valores
+    mensuales de la región {(anio, mes): valor}.
+
+    Las variables acumuladas (precipitación) suman la parte proporcional de cada
+    mes; las demás promedian los meses ponderando por días. None si falta un mes.
+    """
+    valores = {}
+    for desplazamiento, mes in dias:
+        valor = mensuales.get((anio + desplazamiento, mes))
+        if valor is None:
+            return None
+        valores[(desplazamiento, mes)] = valor
+    if acumulada:
+        return sum(valores[(d, mes)] * n / calendar.monthrange(anio + d, mes)[1] for (d, mes), n in dias.items())
+    return sum(valores[clave] * n for clave, n in dias.items()) / sum(dias.values())
+
+
+def puntuacion_z(valor, linea):
+    if valor is None or not linea or not linea.get('desviacion'):
+        return None
+    return (valor - linea['media']) / linea['desviacion']
+
+
+class AlmacenClimatologia:
+    def __init__(self, ruta_db, tamano=0.05):
+        self.ruta_db = ruta_db
+        self.tamano = tamano
+        self._lock = threading.Lock()
+        self.consultas = 0
+        self.disponibles = 0
+        with self._conectar() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS climatologia (
+                    celda TEXT NOT NULL,
+                    variable TEXT NOT NULL,
+                    escala INTEGER NOT NULL,
+                    anio INTEGER NOT NULL,
+                    mes INTEGER NOT NULL,
+                    suma REAL NOT NULL,
+                    conteo INTEGER NOT NULL,
+                    suma_cuadrados REAL NOT NULL,
+                    actualizado REAL NOT NULL,
+                    PRIMARY KEY (celda, variable, escala, anio, mes)
+                )""")
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta_db, timeout=30)
+
+    def _filas(self, con, consulta, celdas, parametros):
+        # SQLite limita el número de parámetros por consulta
+        for inicio in range(0, len(celdas), 500):
+            lote = celdas[inicio:inicio + 500]
+            yield from con.execute(consulta.format(','.join('?' * len(lote))), (*parametros, *lote))
+
+    def faltantes(self, celdas, variable, escala, anio):
+        """{mes: celdas sin agregado} de los meses ya cerrados del año."""
+        with self._conectar() as con:
+            presentes = set(self._filas(
+                con, """SELECT celda, mes FROM climatologia
+                        WHERE variable = ? AND escala = ? AND anio = ? AND celda IN ({})""",
+                celdas, (variable, escala, anio)))
+        faltan = {}
+        for mes in range(1, 13):
+            if mes_cerrado(anio, mes):
+                celdas_mes = [celda for celda in celdas if (celda, mes) not in presentes]
+                if celdas_mes:
+                    faltan[mes] = celdas_mes
+        return faltan
+
+    def guardar(self, filas):
+        """filas: [(celda, variable, escala, anio, mes, (suma, conteo, suma_cuadrados))]."""
+        ahora = time.time()
+        with self._conectar() as con:
+            con.executemany("INSERT OR REPLACE INTO climatologia VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+                (celda, variable, escala, anio, mes, s, n, q, ahora)
+                for celda, variable, escala, anio, mes, (s, n, q) in filas])
+
+    def mensuales(self, celdas, variable, escala, meses):
+        """{(anio, mes): agregado de la región} de los meses con todas las celdas presentes."""
+        agregados, presentes = {}, {}
+        with self._conectar() as con:
+            for anio, mes, s, n, q, filas in self._filas(
+                    con, f"""SELECT anio, mes, SUM(suma), SUM(conteo), SUM(suma_cuadrados), COUNT(*)
+                             FROM climatologia WHERE variable = ? AND escala = ?
+                             AND mes IN ({','.join('?' * len(meses))}) AND celda IN ({{}})
+                             GROUP BY anio, mes""",
+                    celdas, (variable, escala, *meses)):
+                agregados[(anio, mes)] = sumar([agregados.get((anio, mes), (0, 0, 0)), (s, n, q)])
+                presentes[(anio, mes)] = presentes.get((anio, mes), 0) + filas
+        return {clave: agregado for clave, agregado in agregados.items() if presentes[clave] == len(celdas)}
+
+    def linea_base(self, celdas, variable, escala, inicio, fin, acumulada=False, excluir=(), anios_min=3):
+        """{'media', 'desviacion', 'anios'} de la ventana [inicio, fin) entre años, o None.
+
+        Se descartan los años cuya ventana toca alguno de `excluir` (los de la
+        ventana actual) y los que no tienen todos sus meses; hacen falta al menos
+        `anios_min`.
+        """
+        dias = dias_por_mes(inicio, fin)
+        meses = sorted({mes for _, mes in dias})
+        mensuales = self.mensuales(celdas, variable, escala, meses) if dias else {}
+        medias = {clave: resumir(agregado)[0] for clave, agregado in mensuales.items()}
+        desplazamientos = {d for d, _ in dias}
+        valores = {}
+        for anio in sorted({anio for anio, _ in mensuales}):
+            if any(anio + d in excluir for d in desplazamientos):
+                continue
+            valor = valor_ventana(medias, dias, anio, acumulada)
+            if valor is not None:
+                valores[anio] = valor
+        suficientes = len(valores) >= max(2, anios_min)
+        with self._lock:
+            self.consultas += 1
+            self.disponibles += suficientes
+        if not suficientes:
+            return None
+        media = sum(valores.values()) / len(valores)
+        varianza = sum((v - media) ** 2 for v in valores.values()) / (len(valores) - 1)
+        return {'media': media, 'desviacion': math.sqrt(varianza), 'anios': sorted(valores)}
+
+    def estadisticas(self):
+        with self._conectar() as con:
+            filas, celdas = con.execute("SELECT COUNT(*), COUNT(DISTINCT celda) FROM climatologia").fetchone()
+        with self._lock:
+            return {
+                'tamano_grados': self.tamano,
+                'filas': filas,
+                'celdas': celdas,
+                'consultas': self.consultas,
+                'disponibles': self.disponibles,
+            }
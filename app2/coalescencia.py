@@ -0,0 +1,71 @@
+# coalescencia.py
+"""
+Coalescencia de peticiones ("single flight").
+
+Si llega una petición idéntica a otra que todavía se está calculando, espera el
+mismo future en lugar de repetir el cálculo en Earth Engine. Se usa tanto para
+análisis completos como para subcálculos (evaluaciones getInfo, MapIds).
+
+Cada seguidor espera con su propio plazo. Si el líder falla porque se agotó o se
+canceló el suyo, un seguidor al que aún le queda tiempo repite el cálculo (como
+nuevo líder) en lugar de heredar ese fallo.
+"""
+import threading
+from concurrent.futures import CancelledError, Future
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+from ejecutor import PlazoExcedido, plazo_actual
+
+
+class VueloUnico:
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self._en_vuelo = {}
+        self._lock = threading.Lock()
+        self.lideres = 0
+        self.coalescidas = 0
+
+    def ejecutar(self, clave, fn, *args, **kwargs):
+        while True:
+            with self._lock:
+                future = self._en_vuelo.get(clave)
+                seguidor = future is not None
+                if seguidor:
+                    self.coalescidas += 1
+                else:
+                    future = Future()
+                    self._en_vuelo[clave] = future
+                    self.lideres += 1
+            if not seguidor:
+                break
+
+            plazo = plazo_actual()
+            try:
+                return future.result(timeout=plazo.restante() if plazo else None)
+            except FuturesTimeout:
+                raise PlazoExcedido("Se agotó el tiempo de la petición.")
+            except (PlazoExcedido, CancelledError):
+                # Fallo del plazo del líder, no del cálculo: se reintenta si queda tiempo
+                if plazo is not None and plazo.vencido():
+                    raise
+
+        try:
+            resultado = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(resultado)
+            return resultado
+        finally:
+            with self._lock:
+                del self._en_vuelo[clave]
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'nombre': self.nombre,
+                'en_vuelo': len(self._en_vuelo),
+                'lideres': self.lideres,
+                'coalescidas': self.coalescidas,
+            }
@@ -0,0 +1,38 @@
+# coste.py
+"""
+Estimación del coste de un análisis antes de ejecutarlo.
+
+El coste se mide en lecturas píxel-escena: píxeles de la región a la escala de
+reducción por el número de escenas que cubren cada píxel en las dos ventanas.
+Los píxeles salen del área (sin llamadas remotas); las escenas, de un recuento
+de la colección o, si no se pide, de una cota superior por tasa de revisita.
+"""
+import math
+from datetime import date
+
+ACCIONES = ('rechazar', 'encolar', 'reducir')
+
+
+def dias(inicio, fin):
+    return max(0, (date.fromisoformat(fin[:10]) - date.fromisoformat(inicio[:10])).days)
+
+
+def escenas_por_pixel(escenas, area_km2, huella_km2):
+    """Escenas que cubren un píxel típico: las globales lo cubren todas; las
+    teseladas (p. ej. S2) sólo en la fracción huella/área cuando la región es mayor."""
+    if huella_km2 is None or area_km2 <= 0:
+        return escenas
+    return escenas * min(1.0, huella_km2 / area_km2)
+
+
+def cota_escenas(inicio, fin, por_dia):
+    return math.ceil(dias(inicio, fin) * por_dia)
+
+
+def factor_reduccion(coste, maximo):
+    """Menor potencia de 2 por la que multiplicar la escala para que el coste
+    (que decrece con el cuadrado de la escala) quede por debajo del máximo."""
+    factor = 1
+    while coste / (factor * factor) > maximo and factor < 1024:
+        factor *= 2
+    return factor
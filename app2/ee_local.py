@@ -0,0 +1,1106 @@
+# ee_local.py
+"""
+Backend local compatible con el subconjunto de la API `ee` que usan app.py y los
+scripts de pruebaspython, ejecutado sobre arreglos NumPy (ver motor_local.py).
+
+Las colecciones se leen de SUPERBLOOM_EE_LOCAL_DATOS/<id con '/' -> '_'>.npz,
+con un arreglo (t, y, x) por banda, 'fechas' (ISO) y 'limites'
+[xmin, ymin, xmax, ymax] en grados. Todo se evalúa de inmediato; getInfo()
+sólo convierte a tipos de Python; como en GEE, una operación inválida (p. ej.
+sobre el compuesto sin bandas de una ventana vacía) sólo falla al evaluarla con
+getInfo(). Limitaciones conocidas:
+- reduceRegion trabaja a la resolución nativa del archivo (se ignora `scale`).
+- Entre imágenes con rejillas distintas se remuestrea por vecino más cercano.
+- getMapId devuelve URLs de teselas ficticias (no hay servidor de teselas).
+
+Para usarlo sin tocar el código:
+    SUPERBLOOM_EE_BACKEND=local python app.py
+    python ee_local.py ../pruebaAPI/pruebaspython/prueba12.py
+    python ee_local.py --sintetico [directorio]   # genera datos de ejemplo
+"""
+import functools
+import hashlib
+import json
+import math
+import os
+import re
+import runpy
+import sys
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import motor_local
+
+DATOS_DIR = os.environ.get('SUPERBLOOM_EE_LOCAL_DATOS', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datos_locales'))
+
+
+class EEException(Exception):
+    pass
+
+
+def Initialize(*args, **kwargs):
+    pass
+
+
+def Authenticate(*args, **kwargs):
+    pass
+
+
+class _Data:
+    def __init__(self):
+        self.deadline_ms = None
+
+    def setDeadline(self, milisegundos):
+        self.deadline_ms = milisegundos
+
+
+data = _Data()
+
+
+def instalar():
+    """Registra este módulo como `ee`, de modo que `import ee` lo devuelva."""
+    sys.modules['ee'] = sys.modules[__name__]
+
+
+# ===========================================
+# 🔧 UTILIDADES
+# ===========================================
+
+def _valor(x):
+    """Convierte valores de este módulo (Number, List, ...) a Python, recursivamente.
+    Imágenes, geometrías y demás objetos se devuelven tal cual."""
+    if isinstance(x, (Number, String, List, Dictionary)) or type(x) is ComputedObject:
+        return _valor(x._valor)
+    if isinstance(x, dict):
+        return {k: _valor(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [_valor(v) for v in x]
+    if isinstance(x, np.generic):
+        return x.item()
+    return x
+
+
+def _firma(x):
+    if isinstance(x, ComputedObject):
+        return x._firma
+    return json.dumps(_valor(x), sort_keys=True, default=str)
+
+
+def _info(x):
+    """getInfo de un valor arbitrario: NaN y ±inf se devuelven como None."""
+    if isinstance(x, ComputedObject):
+        return x.getInfo()
+    if isinstance(x, dict):
+        return {k: _info(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [_info(v) for v in x]
+    if isinstance(x, (float, np.floating)):
+        return float(x) if math.isfinite(x) else None
+    if isinstance(x, np.generic):
+        return x.item()
+    return x
+
+
+def _a_millis(fecha):
+    fecha = _valor(fecha)
+    if isinstance(fecha, Date):
+        return fecha._millis
+    if isinstance(fecha, (int, float)):
+        return int(fecha)
+    dt = datetime.fromisoformat(str(fecha))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+class ComputedObject:
+    def __init__(self, valor=None, firma=None):
+        self._valor = valor
+        self._firma = firma or _firma(valor)
+
+    def getInfo(self):
+        return _info(self._valor)
+
+    def serialize(self):
+        return self._firma
+
+    def evaluate(self, callback):
+        callback(self.getInfo(), None)
+
+    def __repr__(self):
+        return f"ee_local.{type(self).__name__}({self._firma[:80]})"
+
+
+class _Error(ComputedObject):
+    """Resultado de una operación inválida: el error se difiere hasta getInfo(), como en
+    GEE, y cualquier operación encadenada sobre él devuelve el mismo error."""
+    def __init__(self, mensaje):
+        self._mensaje = mensaje
+        ComputedObject.__init__(self, None, f'Error({mensaje!r})')
+
+    def __getattr__(self, nombre):
+        if nombre.startswith('_'):
+            raise AttributeError(nombre)
+        return lambda *args, **kwargs: self
+
+    def getInfo(self):
+        raise EEException(self._mensaje)
+
+    def getMapId(self, vis_params=None):
+        raise EEException(self._mensaje)
+
+
+def _error_en(valor):
+    if isinstance(valor, _Error):
+        return valor
+    if isinstance(valor, (list, tuple)):
+        return next((v for v in valor if isinstance(v, _Error)), None)
+    return None
+
+
+def _diferido(metodo):
+    @functools.wraps(metodo)
+    def envoltura(*args, **kwargs):
+        for arg in (*args, *kwargs.values()):
+            error = _error_en(arg)
+            if error is not None:
+                return error
+        try:
+            return metodo(*args, **kwargs)
+        except EEException as e:
+            return _Error(str(e))
+    return envoltura
+
+
+def _diferir_errores(clase):
+    """Aplica _diferido a los métodos públicos de la clase salvo a los que, como getInfo y
+    getMapId, son llamadas al servidor y fallan en el acto."""
+    for nombre, atributo in list(vars(clase).items()):
+        if nombre.startswith('_') or nombre in ('getInfo', 'getMapId', 'serialize', 'evaluate'):
+            continue
+        if isinstance(atributo, staticmethod):
+            setattr(clase, nombre, staticmethod(_diferido(atributo.__func__)))
+        elif callable(atributo):
+            setattr(clase, nombre, _diferido(atributo))
+    return clase
+
+
+class Number(ComputedObject):
+    def __init__(self, valor):
+        super().__init__(float(_valor(valor)) if _valor(valor) is not None else None)
+
+    def _op(self, otro, fn):
+        return Number(fn(self._valor, _valor(otro)))
+
+    def gt(self, otro): return self._op(otro, lambda a, b: float(a > b))
+
+    def add(self, otro): return self._op(otro, lambda a, b: a + b)
+    def subtract(self, otro): return self._op(otro, lambda a, b: a - b)
+    def multiply(self, otro): return self._op(otro, lambda a, b: a * b)
+    def divide(self, otro): return self._op(otro, lambda a, b: a / b)
+    def int(self): return Number(int(self._valor))
+
+    # Permite usar ee.Number en aritmética de Python dentro de funciones map()
+    def __int__(self): return int(self._valor)
+    def __float__(self): return float(self._valor)
+    def __index__(self): return int(self._valor)
+    def __add__(self, otro): return self._valor + _valor(otro)
+    def __radd__(self, otro): return _valor(otro) + self._valor
+    def __sub__(self, otro): return self._valor - _valor(otro)
+    def __rsub__(self, otro): return _valor(otro) - self._valor
+
+
+class String(ComputedObject):
+    pass
+
+
+@_diferir_errores
+class List(ComputedObject):
+    def __init__(self, valores):
+        super().__init__(list(_valor(valores)) if not isinstance(valores, List) else valores._valor)
+
+    @staticmethod
+    def sequence(inicio, fin, paso=1):
+        inicio, fin, paso = _valor(inicio), _valor(fin), _valor(paso)
+        return List([inicio + i * paso for i in range(int((fin - inicio) // paso) + 1)])
+
+    def map(self, fn):
+        return List([fn(_envolver(v)) for v in self._valor])
+
+    def get(self, indice):
+        return _envolver(self._valor[int(_valor(indice))])
+
+    def size(self):
+        return Number(len(self._valor))
+
+    def flatten(self):
+        plano = []
+        for v in self._valor:
+            v = v._valor if isinstance(v, List) else v
+            plano.extend(v if isinstance(v, list) else [v])
+        return List(plano)
+
+    def getInfo(self):
+        return _info(self._valor)
+
+
+def _envolver(v):
+    if isinstance(v, ComputedObject):
+        return v
+    if isinstance(v, (int, float)):
+        return Number(v)
+    if isinstance(v, str):
+        return String(v)
+    if isinstance(v, list):
+        return List(v)
+    if isinstance(v, dict):
+        return Dictionary(v)
+    return ComputedObject(v)
+
+
+class Algorithms:
+    @staticmethod
+    def If(condicion, verdadero, falso):
+        # GEE sólo evalúa la rama elegida; aquí las dos ya están construidas, pero un
+        # error en la descartada (un _Error) no se propaga
+        return verdadero if _valor(condicion) else falso
+
+
+@_diferir_errores
+class Dictionary(ComputedObject):
+    def __init__(self, valores=None):
+        valores = valores._valor if isinstance(valores, Dictionary) else dict(valores or {})
+        ComputedObject.__init__(self, valores, 'Dictionary(' + json.dumps(
+            {k: _firma(v) for k, v in valores.items()}, sort_keys=True) + ')')
+
+    def get(self, clave, default=None):
+        if clave not in self._valor:
+            if default is not None:
+                return _envolver(default)
+            raise EEException(f"Dictionary.get: Dictionary does not contain key: {clave}.")
+        return _envolver(self._valor[clave])
+
+    def keys(self):
+        return List(list(self._valor))
+
+    def combine(self, otro):
+        return Dictionary({**self._valor, **_valor(otro)})
+
+    def getInfo(self):
+        return {k: _info(v) for k, v in self._valor.items()}
+
+
+class Date(ComputedObject):
+    def __init__(self, fecha):
+        self._millis = _a_millis(fecha)
+        ComputedObject.__init__(self, self._millis, f'Date({self._millis})')
+
+    @staticmethod
+    def fromYMD(anio, mes, dia):
+        return Date(datetime(int(_valor(anio)), int(_valor(mes)), int(_valor(dia)), tzinfo=timezone.utc).isoformat())
+
+    def _dt(self):
+        return datetime.fromtimestamp(self._millis / 1000, tz=timezone.utc)
+
+    def advance(self, cantidad, unidad):
+        cantidad, dt = _valor(cantidad), self._dt()
+        if unidad in ('month', 'year'):
+            meses = int(cantidad) * (12 if unidad == 'year' else 1)
+            indice = dt.month - 1 + meses
+            return Date(dt.replace(year=dt.year + indice // 12, month=indice % 12 + 1).isoformat())
+        segundos = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400, 'week': 604800}[unidad]
+        return Date((dt + timedelta(seconds=cantidad * segundos)).isoformat())
+
+    def millis(self):
+        return Number(self._millis)
+
+    def format(self, patron=None):
+        dt = self._dt()
+        if not patron:
+            return String(dt.strftime('%Y-%m-%dT%H:%M:%S'))
+        py = patron.replace('YYYY', '%Y').replace('MM', '%m').replace('dd', '%d')
+        return String(dt.strftime(py))
+
+    def get(self, unidad):
+        return Number(getattr(self._dt(), unidad))
+
+
+# ===========================================
+# 🗺️ GEOMETRÍAS
+# ===========================================
+
+class Geometry(ComputedObject):
+    def __init__(self, geojson):
+        self._geojson = geojson
+        ComputedObject.__init__(self, geojson, 'Geometry(' + json.dumps(geojson, sort_keys=True) + ')')
+
+    @staticmethod
+    def Rectangle(coords, *args, **kwargs):
+        c = _valor(coords)
+        if c and isinstance(c[0], (list, tuple)):
+            (xmin, ymin), (xmax, ymax) = c[0], c[1]
+        else:
+            xmin, ymin, xmax, ymax = c
+        xmin, xmax = sorted((xmin, xmax))
+        ymin, ymax = sorted((ymin, ymax))
+        anillo = [[xmin, ymin], [xmax, ymin], [xmax, ymax], [xmin, ymax], [xmin, ymin]]
+        return Geometry({'type': 'Polygon', 'coordinates': [anillo]})
+
+    @staticmethod
+    def Point(coords, *args, **kwargs):
+        return Geometry({'type': 'Point', 'coordinates': [float(c) for c in _valor(coords)]})
+
+    @staticmethod
+    def Polygon(coords, *args, **kwargs):
+        return Geometry({'type': 'Polygon', 'coordinates': _valor(coords)})
+
+    def limites(self):
+        if self._geojson['type'] == 'Point':
+            x, y = self._geojson['coordinates']
+            return x, y, x, y
+        puntos = [p for anillo in self._geojson['coordinates'] for p in anillo]
+        xs, ys = [p[0] for p in puntos], [p[1] for p in puntos]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def centroid(self, *args, **kwargs):
+        xmin, ymin, xmax, ymax = self.limites()
+        return Geometry.Point([(xmin + xmax) / 2, (ymin + ymax) / 2])
+
+    def bounds(self, *args, **kwargs):
+        return Geometry.Rectangle(list(self.limites()))
+
+    def coordinates(self):
+        return List(self._geojson['coordinates'])
+
+    def area(self, *args, **kwargs):
+        xmin, ymin, xmax, ymax = self.limites()
+        radio = 6371008.8
+        return Number(radio ** 2 * math.radians(xmax - xmin)
+                      * (math.sin(math.radians(ymax)) - math.sin(math.radians(ymin))))
+
+    def getInfo(self):
+        return dict(self._geojson)
+
+
+# ===========================================
+# 📊 REDUCTORES
+# ===========================================
+
+def _percentil(p):
+    return lambda v: float(np.percentile(v, p)) if v.size else None
+
+
+class Reducer(ComputedObject):
+    def __init__(self, salidas, firma, ponderado=True):
+        # salidas: lista de (nombre, función sobre un vector 1D de píxeles válidos)
+        self._salidas = salidas
+        self._ponderado = ponderado
+        ComputedObject.__init__(self, None, firma)
+
+    @staticmethod
+    def mean():
+        return Reducer([('mean', lambda v: float(v.mean()) if v.size else None)], 'Reducer.mean')
+
+    @staticmethod
+    def median():
+        return Reducer([('median', _percentil(50))], 'Reducer.median')
+
+    @staticmethod
+    def sum():
+        return Reducer([('sum', lambda v: float(v.sum()))], 'Reducer.sum')
+
+    @staticmethod
+    def count():
+        return Reducer([('count', lambda v: int(v.size))], 'Reducer.count')
+
+    @staticmethod
+    def min():
+        return Reducer([('min', lambda v: float(v.min()) if v.size else None)], 'Reducer.min')
+
+    @staticmethod
+    def max():
+        return Reducer([('max', lambda v: float(v.max()) if v.size else None)], 'Reducer.max')
+
+    @staticmethod
+    def stdDev():
+        return Reducer([('stdDev', lambda v: float(v.std()) if v.size else None)], 'Reducer.stdDev')
+
+    @staticmethod
+    def variance():
+        return Reducer([('variance', lambda v: float(v.var()) if v.size else None)], 'Reducer.variance')
+
+    @staticmethod
+    def percentile(percentiles, *args, **kwargs):
+        return Reducer([(f'p{p}', _percentil(p)) for p in percentiles], f'Reducer.percentile({percentiles})')
+
+    def combine(self, reducer2, outputPrefix='', sharedInputs=False):
+        otras = [(outputPrefix + nombre, fn) for nombre, fn in reducer2._salidas]
+        return Reducer(self._salidas + otras, f'{self._firma}.combine({reducer2._firma})', self._ponderado)
+
+    def unweighted(self):
+        # Los píxeles siempre pesan lo mismo; sólo cambia que una geometría menor que
+        # un píxel ya no toma el píxel que la contiene (cuenta sólo centros interiores)
+        return Reducer(self._salidas, f'{self._firma}.unweighted()', ponderado=False)
+
+    def setOutputs(self, nombres):
+        return Reducer([(n, fn) for n, (_, fn) in zip(nombres, self._salidas)],
+                       f'{self._firma}.setOutputs({nombres})', self._ponderado)
+
+    def aplicar(self, bandas):
+        """bandas: {nombre: vector de píxeles válidos} -> dict de salidas con la convención de GEE."""
+        resultado = {}
+        for banda, valores in bandas.items():
+            for salida, fn in self._salidas:
+                clave = banda if len(self._salidas) == 1 else f'{banda}_{salida}'
+                resultado[clave] = fn(valores)
+        return resultado
+
+
+# ===========================================
+# 🖼️ IMÁGENES
+# ===========================================
+
+class _Rejilla:
+    """Rejilla regular en grados, norte arriba."""
+    def __init__(self, limites, alto, ancho):
+        self.xmin, self.ymin, self.xmax, self.ymax = (float(v) for v in limites)
+        self.alto, self.ancho = int(alto), int(ancho)
+
+    def __eq__(self, otra):
+        return isinstance(otra, _Rejilla) and self.clave() == otra.clave()
+
+    def clave(self):
+        return (self.xmin, self.ymin, self.xmax, self.ymax, self.alto, self.ancho)
+
+    def centros(self):
+        dx = (self.xmax - self.xmin) / self.ancho
+        dy = (self.ymax - self.ymin) / self.alto
+        xs = self.xmin + (np.arange(self.ancho) + 0.5) * dx
+        ys = self.ymax - (np.arange(self.alto) + 0.5) * dy
+        return xs, ys
+
+    def indice(self, x, y):
+        fila = int((self.ymax - y) / (self.ymax - self.ymin) * self.alto)
+        col = int((x - self.xmin) / (self.xmax - self.xmin) * self.ancho)
+        return min(max(fila, 0), self.alto - 1), min(max(col, 0), self.ancho - 1)
+
+    def mascara(self, geometria, contenedor=True):
+        """Píxeles cuyo centro cae dentro de la geometría (o, con `contenedor`, el que la contiene).
+
+        Como en GEE, el borde es semiabierto: un centro sobre el lado compartido de
+        dos rectángulos contiguos cuenta sólo en uno de ellos.
+        """
+        xmin, ymin, xmax, ymax = geometria.limites()
+        mascara = np.zeros((self.alto, self.ancho), dtype=bool)
+        if geometria._geojson['type'] != 'Point':
+            xs, ys = self.centros()
+            mascara = ((ys[:, None] >= ymin) & (ys[:, None] < ymax)
+                       & (xs[None, :] >= xmin) & (xs[None, :] < xmax))
+        if contenedor and not mascara.any():
+            x, y = (xmin + xmax) / 2, (ymin + ymax) / 2
+            if self.xmin <= x <= self.xmax and self.ymin <= y <= self.ymax:
+                mascara[self.indice(x, y)] = True
+        return mascara
+
+
+def _remuestrear(arreglo, origen, destino):
+    """Vecino más cercano de la rejilla `origen` a la rejilla `destino`."""
+    if origen is None or destino is None or origen == destino or np.ndim(arreglo) == 0:
+        return arreglo
+    xs, ys = destino.centros()
+    cols = np.floor((xs - origen.xmin) / (origen.xmax - origen.xmin) * origen.ancho).astype(int)
+    filas = np.floor((origen.ymax - ys) / (origen.ymax - origen.ymin) * origen.alto).astype(int)
+    fuera = ((cols < 0) | (cols >= origen.ancho))[None, :] | ((filas < 0) | (filas >= origen.alto))[:, None]
+    resultado = arreglo[np.clip(filas, 0, origen.alto - 1)][:, np.clip(cols, 0, origen.ancho - 1)]
+    return np.where(fuera, np.nan, resultado)
+
+
+@_diferir_errores
+class Image(ComputedObject):
+    def __new__(cls, bandas=None, *args, **kwargs):
+        # ee.Image(error) sigue siendo el mismo error
+        if isinstance(bandas, _Error):
+            return bandas
+        return super().__new__(cls)
+
+    def __init__(self, bandas=None, rejilla=None, propiedades=None, firma=None):
+        if isinstance(bandas, (int, float)):
+            bandas = {'constant': np.asarray(float(bandas))}
+            firma = firma or f'Image.constant({bandas["constant"]})'
+        elif isinstance(bandas, Image):
+            bandas, rejilla, propiedades, firma = bandas._bandas, bandas._rejilla, bandas._propiedades, bandas._firma
+        self._bandas = dict(bandas or {})
+        self._rejilla = rejilla
+        self._propiedades = dict(propiedades or {})
+        ComputedObject.__init__(self, None, firma or 'Image()')
+
+    def _nueva(self, bandas, op, *args, propiedades=None):
+        firma = f'{self._firma}.{op}(' + ','.join(_firma(a) for a in args) + ')'
+        return Image(bandas, self._rejilla, self._propiedades if propiedades is None else propiedades, firma)
+
+    @staticmethod
+    def cat(imagenes):
+        imagenes = [i if isinstance(i, Image) else Image(i) for i in _lista(imagenes)]
+        base = next((i for i in imagenes if i._rejilla is not None), imagenes[0])
+        bandas = {}
+        for img in imagenes:
+            for nombre, arr in img._bandas.items():
+                bandas[nombre] = _remuestrear(arr, img._rejilla, base._rejilla)
+        return Image(bandas, base._rejilla, base._propiedades,
+                     'Image.cat(' + ','.join(i._firma for i in imagenes) + ')')
+
+    @staticmethod
+    def constant(valor):
+        return Image(valor)
+
+    # --- bandas y propiedades ---
+    def bandNames(self):
+        return List(list(self._bandas))
+
+    def select(self, seleccion, nuevos=None):
+        nombres = []
+        for patron in _lista(seleccion):
+            if isinstance(patron, int):
+                nombres.append(list(self._bandas)[patron])
+            elif patron in self._bandas:
+                nombres.append(patron)
+            else:
+                coincidencias = [b for b in self._bandas if re.fullmatch(patron, b)]
+                if not coincidencias:
+                    raise EEException(f"Image.select: Pattern '{patron}' did not match any bands.")
+                nombres.extend(coincidencias)
+        nuevos = _lista(nuevos) if nuevos is not None else nombres
+        return self._nueva({n: self._bandas[o] for o, n in zip(nombres, nuevos)}, 'select', nombres, nuevos)
+
+    def rename(self, *nombres):
+        nombres = _lista(nombres[0]) if len(nombres) == 1 else list(nombres)
+        if len(nombres) != len(self._bandas):
+            raise EEException("Image.rename: number of names must match the number of bands.")
+        return self._nueva(dict(zip(nombres, self._bandas.values())), 'rename', nombres)
+
+    def addBands(self, otra, names=None, overwrite=False):
+        bandas = dict(self._bandas)
+        for nombre, arr in otra._bandas.items():
+            if names is not None and nombre not in names:
+                continue
+            if nombre in bandas and not overwrite:
+                raise EEException(f"Image.addBands: Band '{nombre}' already exists.")
+            bandas[nombre] = _remuestrear(arr, otra._rejilla, self._rejilla)
+        return self._nueva(bandas, 'addBands', otra)
+
+    def set(self, *args):
+        props = dict(self._propiedades)
+        props.update(args[0] if len(args) == 1 else {args[0]: _valor(args[1])})
+        return self._nueva(self._bandas, 'set', props, propiedades=props)
+
+    def get(self, propiedad):
+        return _envolver(self._propiedades.get(propiedad))
+
+    def propertyNames(self):
+        return List(list(self._propiedades))
+
+    def copyProperties(self, origen, propiedades=None, exclude=None):
+        props = dict(self._propiedades)
+        for clave in (_lista(propiedades) if propiedades is not None else origen._propiedades):
+            if clave in origen._propiedades:
+                props[clave] = origen._propiedades[clave]
+        return self._nueva(self._bandas, 'copyProperties', origen, propiedades=props)
+
+    # --- álgebra por bandas (NaN = enmascarado) ---
+    def _binaria(self, otra, fn, op, nombres_de_otra=False):
+        if not isinstance(otra, Image):
+            otra = Image(float(_valor(otra)))
+        mias = list(self._bandas.items())
+        suyas = [_remuestrear(a, otra._rejilla, self._rejilla) for a in otra._bandas.values()]
+        if len(suyas) == 1:
+            suyas = suyas * len(mias)
+        elif len(mias) == 1:
+            mias = [(n, mias[0][1]) for n in otra._bandas]
+        bandas = {}
+        with np.errstate(all='ignore'):
+            for (nombre, a), b in zip(mias, suyas):
+                bandas[nombre] = fn(a, b)
+        return self._nueva(bandas, op, otra)
+
+    def add(self, otra): return self._binaria(otra, np.add, 'add')
+    def subtract(self, otra): return self._binaria(otra, np.subtract, 'subtract')
+    def multiply(self, otra): return self._binaria(otra, np.multiply, 'multiply')
+    def divide(self, otra): return self._binaria(otra, np.divide, 'divide')
+    def pow(self, otra): return self._binaria(otra, np.power, 'pow')
+    def max(self, otra): return self._binaria(otra, np.fmax, 'max')
+    def min(self, otra): return self._binaria(otra, np.fmin, 'min')
+
+    def _comparacion(self, otra, fn, op):
+        return self._binaria(otra, lambda a, b: np.where(np.isnan(a) | np.isnan(b), np.nan, fn(a, b).astype(float)), op)
+
+    def eq(self, otra): return self._comparacion(otra, np.equal, 'eq')
+    def neq(self, otra): return self._comparacion(otra, np.not_equal, 'neq')
+    def gt(self, otra): return self._comparacion(otra, np.greater, 'gt')
+    def gte(self, otra): return self._comparacion(otra, np.greater_equal, 'gte')
+    def lt(self, otra): return self._comparacion(otra, np.less, 'lt')
+    def lte(self, otra): return self._comparacion(otra, np.less_equal, 'lte')
+    def And(self, otra): return self._comparacion(otra, lambda a, b: (a != 0) & (b != 0), 'And')
+    def Or(self, otra): return self._comparacion(otra, lambda a, b: (a != 0) | (b != 0), 'Or')
+
+    def Not(self):
+        return self._nueva({n: np.where(np.isnan(a), np.nan, (a == 0).astype(float)) for n, a in self._bandas.items()}, 'Not')
+
+    def abs(self):
+        return self._nueva({n: np.abs(a) for n, a in self._bandas.items()}, 'abs')
+
+    def toFloat(self):
+        return self
+
+    # --- máscaras y recortes ---
+    def updateMask(self, mascara):
+        m = [_remuestrear(a, mascara._rejilla, self._rejilla) for a in mascara._bandas.values()]
+        if len(m) == 1:
+            m = m * len(self._bandas)
+        bandas = {n: np.where(np.isnan(mb) | (mb == 0), np.nan, a)
+                  for (n, a), mb in zip(self._bandas.items(), m)}
+        return self._nueva(bandas, 'updateMask', mascara)
+
+    def unmask(self, valor=0, *args, **kwargs):
+        return self._nueva({n: np.where(np.isnan(a), float(valor), a) for n, a in self._bandas.items()}, 'unmask', valor)
+
+    def selfMask(self):
+        return self.updateMask(self)
+
+    def clip(self, geometria):
+        if self._rejilla is None:
+            return self._nueva(self._bandas, 'clip', geometria)
+        dentro = self._rejilla.mascara(geometria)
+        return self._nueva({n: np.where(dentro, a, np.nan) for n, a in self._bandas.items()}, 'clip', geometria)
+
+    # --- índices ---
+    def normalizedDifference(self, bandas=None):
+        nombres = _lista(bandas) if bandas is not None else list(self._bandas)[:2]
+        faltan = [n for n in nombres if n not in self._bandas]
+        if faltan or len(nombres) != 2:
+            raise EEException(f"Image.normalizedDifference: No band named '{(faltan or nombres)[0] if nombres else ''}'.")
+        a, b = (self._bandas[n] for n in nombres)
+        return self._nueva({'nd': motor_local.diferencia_normalizada(a, b)}, 'normalizedDifference', bandas)
+
+    def expression(self, expresion, mapa=None):
+        variables = {}
+        for nombre, v in (mapa or {}).items():
+            if isinstance(v, Image):
+                variables[nombre] = _remuestrear(next(iter(v._bandas.values())), v._rejilla, self._rejilla)
+            else:
+                variables[nombre] = float(_valor(v))
+        with np.errstate(all='ignore'):
+            resultado = _Expresion(expresion, variables, self._bandas).evaluar()
+        resultado = np.where(np.isfinite(resultado), resultado, np.nan) if np.ndim(resultado) else resultado
+        return self._nueva({'constant': np.asarray(resultado, dtype=float)}, 'expression', expresion, mapa or {})
+
+    # --- reducciones ---
+    def reduceRegion(self, reducer=None, geometry=None, scale=None, crs=None, crsTransform=None,
+                     bestEffort=False, maxPixels=None, tileScale=1, **kwargs):
+        if self._rejilla is None:
+            valores = {n: a.reshape(-1) for n, a in self._bandas.items()}
+        else:
+            dentro = self._rejilla.mascara(geometry, reducer._ponderado) if geometry is not None else np.ones(
+                (self._rejilla.alto, self._rejilla.ancho), dtype=bool)
+            valores = {n: a[dentro & np.isfinite(a)] if np.ndim(a) else np.asarray([a]) for n, a in self._bandas.items()}
+        return Dictionary(reducer.aplicar(valores))
+
+    def reduceRegions(self, collection, reducer, scale=None, **kwargs):
+        features = []
+        for f in collection._features:
+            props = dict(f._propiedades)
+            props.update(self.reduceRegion(reducer, f._geometria, scale)._valor)
+            features.append(Feature(f._geometria, props))
+        return FeatureCollection(features)
+
+    def sample(self, region=None, scale=None, numPixels=None, seed=0, geometries=False, **kwargs):
+        dentro = self._rejilla.mascara(region) if region is not None else np.ones((self._rejilla.alto, self._rejilla.ancho), dtype=bool)
+        filas, cols = np.nonzero(dentro)
+        if numPixels is not None and numPixels < filas.size:
+            elegidos = np.random.default_rng(seed).choice(filas.size, int(numPixels), replace=False)
+            filas, cols = filas[elegidos], cols[elegidos]
+        features = []
+        for f, c in zip(filas, cols):
+            pixel = {n: a[f, c] if np.ndim(a) else a for n, a in self._bandas.items()}
+            props = {n: float(v) for n, v in pixel.items() if np.isfinite(v)}
+            if props:
+                features.append(Feature(None, props))
+        return FeatureCollection(features)
+
+    # --- visualización ---
+    def getMapId(self, vis_params=None):
+        mapid = 'local/' + hashlib.sha1((self._firma + json.dumps(vis_params or {}, sort_keys=True)).encode()).hexdigest()
+        return {'mapid': mapid, 'token': '', 'tile_fetcher': _TileFetcher(f'/local-tiles/{mapid}/{{z}}/{{x}}/{{y}}')}
+
+    def getInfo(self):
+        return {'type': 'Image', 'bands': [{'id': n} for n in self._bandas], 'properties': _info(self._propiedades)}
+
+
+class _TileFetcher:
+    def __init__(self, url_format):
+        self.url_format = url_format
+
+
+def _lista(x):
+    x = _valor(x)
+    if isinstance(x, (list, tuple)):
+        return list(x)
+    return [x]
+
+
+# ===========================================
+# 🧾 EXPRESIONES (sintaxis de Image.expression)
+# ===========================================
+
+class _Expresion:
+    """Analizador descendente recursivo para la sintaxis tipo C de GEE:
+    ?:, ||, &&, comparaciones, + - * / % **, unarios, b('banda'), variables y números."""
+
+    _TOKENS = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+)|(b\(\s*'[^']*'\s*\)|b\(\s*\"[^\"]*\"\s*\))|([A-Za-z_][A-Za-z0-9_]*)|(\*\*|==|!=|<=|>=|&&|\|\||[-+*/%()<>?:!]))")
+
+    def __init__(self, texto, variables, bandas):
+        self.variables, self.bandas = variables, bandas
+        self.tokens, pos = [], 0
+        texto = texto.strip()
+        while pos < len(texto):
+            m = self._TOKENS.match(texto, pos)
+            if not m:
+                raise EEException(f"Expresión no válida cerca de: {texto[pos:]}")
+            self.tokens.append(m.groups())
+            pos = m.end()
+        self.i = 0
+
+    def _ver(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else (None, None, None, None)
+
+    def _op(self, *ops):
+        if self._ver()[3] in ops:
+            self.i += 1
+            return self.tokens[self.i - 1][3]
+        return None
+
+    def evaluar(self):
+        valor = self._ternario()
+        if self.i != len(self.tokens):
+            raise EEException("Expresión no válida: tokens sobrantes.")
+        return valor
+
+    def _ternario(self):
+        cond = self._o()
+        if self._op('?'):
+            si = self._ternario()
+            if not self._op(':'):
+                raise EEException("Expresión no válida: falta ':'.")
+            no = self._ternario()
+            return np.where(np.isnan(cond), np.nan, np.where(cond != 0, si, no))
+        return cond
+
+    def _o(self):
+        v = self._y()
+        while self._op('||'):
+            v = ((v != 0) | (self._y() != 0)).astype(float)
+        return v
+
+    def _y(self):
+        v = self._comparacion()
+        while self._op('&&'):
+            v = ((v != 0) & (self._comparacion() != 0)).astype(float)
+        return v
+
+    def _comparacion(self):
+        v = self._suma()
+        fns = {'==': np.equal, '!=': np.not_equal, '<': np.less, '<=': np.less_equal,
+               '>': np.greater, '>=': np.greater_equal}
+        while True:
+            op = self._op(*fns)
+            if not op:
+                return v
+            otro = self._suma()
+            v = np.where(np.isnan(v) | np.isnan(otro), np.nan, fns[op](v, otro).astype(float))
+
+    def _suma(self):
+        v = self._producto()
+        while True:
+            op = self._op('+', '-')
+            if not op:
+                return v
+            v = v + self._producto() if op == '+' else v - self._producto()
+
+    def _producto(self):
+        v = self._unario()
+        while True:
+            op = self._op('*', '/', '%')
+            if not op:
+                return v
+            otro = self._unario()
+            v = v * otro if op == '*' else v / otro if op == '/' else np.fmod(v, otro)
+
+    def _unario(self):
+        if self._op('-'):
+            return -self._unario()
+        if self._op('+'):
+            return self._unario()
+        if self._op('!'):
+            return (self._unario() == 0).astype(float)
+        return self._potencia()
+
+    def _potencia(self):
+        base = self._atomo()
+        if self._op('**'):
+            return base ** self._unario()
+        return base
+
+    def _atomo(self):
+        numero, banda, nombre, op = self._ver()
+        self.i += 1
+        if numero is not None:
+            return np.float64(numero)
+        if banda is not None:
+            return self.bandas[re.search(r"['\"]([^'\"]*)['\"]", banda).group(1)]
+        if nombre is not None:
+            if nombre in self.variables:
+                return self.variables[nombre]
+            if nombre in self.bandas:
+                return self.bandas[nombre]
+            raise EEException(f"Variable desconocida en expresión: {nombre}")
+        if op == '(':
+            v = self._ternario()
+            if not self._op(')'):
+                raise EEException("Expresión no válida: falta ')'.")
+            return v
+        raise EEException("Expresión no válida.")
+
+
+# ===========================================
+# 🗂️ COLECCIONES
+# ===========================================
+
+def _imagen_de_escena(bandas, rejilla, millis, firma):
+    return Image(bandas, rejilla, {'system:time_start': millis}, firma)
+
+
+@_diferir_errores
+class ImageCollection(ComputedObject):
+    def __init__(self, origen, _imagenes=None, _plantilla=None, firma=None):
+        if _imagenes is not None:
+            self._imagenes, self._plantilla = _imagenes, _plantilla
+            ComputedObject.__init__(self, None, firma)
+            return
+        if isinstance(origen, ImageCollection):
+            self._imagenes, self._plantilla = origen._imagenes, origen._plantilla
+            ComputedObject.__init__(self, None, origen._firma)
+            return
+        if isinstance(origen, (list, tuple)):
+            coleccion = ImageCollection.fromImages(origen)
+            self._imagenes, self._plantilla = coleccion._imagenes, coleccion._plantilla
+            ComputedObject.__init__(self, None, coleccion._firma)
+            return
+
+        ruta = os.path.join(DATOS_DIR, origen.replace('/', '_') + '.npz')
+        if not os.path.exists(ruta):
+            raise EEException(f"ImageCollection.load: colección local no encontrada: {ruta}")
+        pila = motor_local.cargar_pila(ruta)
+        if pila.get('limites') is None:
+            raise EEException(f"{ruta}: falta el arreglo 'limites' [xmin, ymin, xmax, ymax].")
+        primera = next(iter(pila['bandas'].values()))
+        rejilla = _Rejilla(pila['limites'], primera.shape[1], primera.shape[2])
+        self._imagenes = [
+            _imagen_de_escena({n: a[t] for n, a in pila['bandas'].items()}, rejilla,
+                              _a_millis(fecha), f'Image({origen}#{fecha})')
+            for t, fecha in enumerate(pila['fechas'])
+        ]
+        # Escena vacía (todo enmascarado) que sigue las mismas operaciones que la colección,
+        # para que los compuestos de una colección filtrada a cero escenas conserven sus bandas.
+        self._plantilla = _imagen_de_escena({n: np.full(primera.shape[1:], np.nan) for n in pila['bandas']},
+                                            rejilla, 0, f'Image({origen}#vacia)')
+        ComputedObject.__init__(self, None, f'ImageCollection({origen})')
+
+    def _nueva(self, imagenes, op, *args, plantilla=None):
+        firma = f'{self._firma}.{op}(' + ','.join(_firma(a) for a in args) + ')'
+        return ImageCollection(None, imagenes, plantilla or self._plantilla, firma)
+
+    @staticmethod
+    def fromImages(imagenes):
+        imagenes = [i for i in _lista(imagenes)]
+        plantilla = imagenes[0] if imagenes else Image()
+        return ImageCollection(None, imagenes, plantilla,
+                               'ImageCollection.fromImages(' + ','.join(i._firma for i in imagenes) + ')')
+
+    def filterBounds(self, geometria):
+        xmin, ymin, xmax, ymax = geometria.limites()
+        rej = self._plantilla._rejilla
+        if rej is not None and (xmax < rej.xmin or xmin > rej.xmax or ymax < rej.ymin or ymin > rej.ymax):
+            return self._nueva([], 'filterBounds', geometria)
+        return self._nueva(self._imagenes, 'filterBounds', geometria)
+
+    def filterDate(self, inicio, fin=None):
+        ini = _a_millis(inicio)
+        fn = _a_millis(fin) if fin is not None else ini + 86400000
+        imagenes = [i for i in self._imagenes if ini <= i._propiedades.get('system:time_start', 0) < fn]
+        return self._nueva(imagenes, 'filterDate', ini, fn)
+
+    def filter(self, filtro):
+        return self._nueva([i for i in self._imagenes if filtro(i)], 'filter', filtro._firma)
+
+    def map(self, fn):
+        firma_fn = getattr(fn, '__qualname__', repr(fn))
+        return self._nueva([fn(i) for i in self._imagenes], 'map', firma_fn, plantilla=fn(self._plantilla))
+
+    def select(self, *args):
+        return self._nueva([i.select(*args) for i in self._imagenes], 'select', *args,
+                           plantilla=self._plantilla.select(*args))
+
+    def _reducir(self, fn, op):
+        # Como en GEE, el compuesto de una colección vacía es una imagen sin bandas
+        if not self._imagenes:
+            return Image({}, self._plantilla._rejilla, {}, f'{self._firma}.{op}()')
+        base = self._imagenes
+        rejilla = base[0]._rejilla
+        bandas = {n: fn(np.stack([_remuestrear(i._bandas[n], i._rejilla, rejilla) for i in base]))
+                  for n in base[0]._bandas}
+        return Image(bandas, rejilla, {}, f'{self._firma}.{op}()')
+
+    def median(self): return self._reducir(motor_local.compuesto_mediana, 'median')
+    def mean(self): return self._reducir(motor_local.compuesto_media, 'mean')
+    def sum(self): return self._reducir(motor_local.compuesto_suma, 'sum')
+
+    def max(self):
+        return self._reducir(lambda a: motor_local._reducir_tiempo(np.nanmax, a), 'max')
+
+    def min(self):
+        return self._reducir(lambda a: motor_local._reducir_tiempo(np.nanmin, a), 'min')
+
+    def first(self):
+        return self._imagenes[0] if self._imagenes else self._plantilla
+
+    def size(self):
+        return Number(len(self._imagenes))
+
+    def toList(self, cantidad, inicio=0):
+        return List(self._imagenes[int(inicio):int(inicio) + int(cantidad)])
+
+    def aggregate_array(self, propiedad):
+        return List([i._propiedades.get(propiedad) for i in self._imagenes])
+
+    def getInfo(self):
+        return {'type': 'ImageCollection', 'features': [i.getInfo() for i in self._imagenes]}
+
+
+@_diferir_errores
+class Feature(ComputedObject):
+    def __init__(self, geometria, propiedades=None):
+        if isinstance(geometria, Feature):
+            geometria, propiedades = geometria._geometria, geometria._propiedades
+        self._geometria = geometria
+        self._propiedades = dict(propiedades or {})
+        ComputedObject.__init__(self, None, 'Feature(' + _firma(geometria) + ',' + _firma(self._propiedades) + ')')
+
+    def get(self, propiedad):
+        return _envolver(self._propiedades.get(propiedad))
+
+    def set(self, *args):
+        props = dict(self._propiedades)
+        props.update(args[0] if len(args) == 1 else {args[0]: args[1]})
+        return Feature(self._geometria, props)
+
+    def geometry(self):
+        return self._geometria
+
+    def getInfo(self):
+        return {'type': 'Feature',
+                'geometry': self._geometria.getInfo() if self._geometria is not None else None,
+                'properties': _info(self._propiedades)}
+
+
+@_diferir_errores
+class FeatureCollection(ComputedObject):
+    def __init__(self, features):
+        if isinstance(features, FeatureCollection):
+            features = features._features
+        elif isinstance(features, ImageCollection):
+            features = features._imagenes
+        elif isinstance(features, Geometry):
+            features = [Feature(features)]
+        self._features = list(_lista(features)) if not isinstance(features, list) else features
+        ComputedObject.__init__(self, None, 'FeatureCollection(' + ','.join(f._firma for f in self._features) + ')')
+
+    def map(self, fn):
+        return FeatureCollection([fn(f) for f in self._features])
+
+    def size(self):
+        return Number(len(self._features))
+
+    def aggregate_array(self, propiedad):
+        return List([f._propiedades.get(propiedad) for f in self._features])
+
+    def _valores(self, propiedad):
+        return np.array([v for v in (f._propiedades.get(propiedad) for f in self._features) if v is not None], dtype=float)
+
+    def aggregate_count(self, propiedad):
+        return Number(int(self._valores(propiedad).size))
+
+    def aggregate_mean(self, propiedad):
+        valores = self._valores(propiedad)
+        return Number(float(valores.mean()) if valores.size else None)
+
+    def aggregate_sample_var(self, propiedad):
+        valores = self._valores(propiedad)
+        return Number(float(valores.var(ddof=1)) if valores.size > 1 else None)
+
+    def getInfo(self):
+        return {'type': 'FeatureCollection', 'features': [f.getInfo() for f in self._features]}
+
+
+# ===========================================
+# 🧪 DATOS SINTÉTICOS (pruebas y benchmarks)
+# ===========================================
+
+def generar_datos_sinteticos(directorio, limites=(-116.0, 32.0, -114.0, 33.5), anios=(2022, 2023, 2024),
+                             tamano_s2=100, tamano_modis=40, semilla=0):
+    """Escribe colecciones S2, MOD11A2, IMERG y MOD13Q1 con valores plausibles y estacionalidad."""
+    rng = np.random.default_rng(semilla)
+    os.makedirs(directorio, exist_ok=True)
+    fechas = [f'{a}-{m:02d}-{d:02d}' for a in anios for m in range(1, 13) for d in (5, 20)]
+    estacion = np.array([math.sin(2 * math.pi * (int(f[5:7]) - 3) / 12) for f in fechas])[:, None, None]
+    t = len(fechas)
+
+    def escribir(colecciones, **bandas):
+        for coleccion in colecciones.split():
+            np.savez_compressed(os.path.join(directorio, coleccion.replace('/', '_') + '.npz'),
+                                fechas=np.array(fechas), limites=np.array(limites, dtype=float), **bandas)
+
+    forma = (t, tamano_s2, tamano_s2)
+    verdor = (0.35 + 0.2 * estacion + 0.05 * rng.standard_normal(forma)).clip(0.02, 0.9)
+    red = rng.uniform(400, 1200, forma)
+    escribir('COPERNICUS/S2_SR_HARMONIZED COPERNICUS/S2_SR',
+             B2=red * 0.8, B3=red * (1 + 0.3 * verdor), B4=red, B8=red * (1 + verdor) / (1 - verdor),
+             SCL=rng.choice([3, 4, 5, 6, 8, 9, 11], forma, p=[.05, .4, .2, .15, .1, .05, .05]).astype(float))
+
+    forma = (t, tamano_modis, tamano_modis)
+    escribir('MODIS/061/MOD11A2',
+             LST_Day_1km=(273.15 + 25 + 10 * estacion + rng.standard_normal(forma)) / 0.02)
+    lluvia = rng.gamma(0.6, 1.5 * (1.2 - estacion), forma)
+    escribir('NASA/GPM_L3/IMERG_V06', precipitationCal=lluvia)
+    # En V07 la banda calibrada pasó a llamarse 'precipitation'
+    escribir('NASA/GPM_L3/IMERG_V07', precipitation=lluvia)
+    escribir('MODIS/061/MOD13Q1',
+             NDVI=(0.35 + 0.2 * estacion + 0.05 * rng.standard_normal(forma)) * 10000,
+             EVI=(0.25 + 0.15 * estacion + 0.05 * rng.standard_normal(forma)) * 10000)
+
+
+# ===========================================
+# ▶️ EJECUCIÓN DE SCRIPTS SIN MODIFICARLOS
+# ===========================================
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    if sys.argv[1] == '--sintetico':
+        generar_datos_sinteticos(sys.argv[2] if len(sys.argv) > 2 else DATOS_DIR)
+        sys.exit(0)
+    instalar()
+    script = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    runpy.run_path(script, run_name='__main__')
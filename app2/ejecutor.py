@@ -0,0 +1,135 @@
+# ejecutor.py
+"""
+Ejecutor compartido por todas las peticiones, con tamaño y cola acotados.
+
+Cada petición lleva un Plazo (fecha límite) que viaja en un contextvar hasta los
+hilos del pool; get_info_safe / getMapId lo consultan antes de cada llamada
+remota, y al vencer o cancelarse (p. ej. el cliente se desconectó) se cancela el
+trabajo que aún no empezó.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PlazoExcedido(Exception):
+    pass
+
+
+class ColaLlena(Exception):
+    pass
+
+
+class Plazo:
+    def __init__(self, segundos):
+        self.limite = time.monotonic() + segundos
+        self._cancelado = threading.Event()
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def restante(self):
+        return max(0.0, self.limite - time.monotonic())
+
+    def vencido(self):
+        return self._cancelado.is_set() or time.monotonic() >= self.limite
+
+    def verificar(self):
+        if self._cancelado.is_set():
+            raise PlazoExcedido("La petición fue cancelada.")
+        if time.monotonic() >= self.limite:
+            raise PlazoExcedido("Se agotó el tiempo de la petición.")
+
+    def registrar(self, future):
+        with self._lock:
+            self._futures.append(future)
+        if self._cancelado.is_set():
+            future.cancel()
+
+    def cancelar(self):
+        self._cancelado.set()
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+
+
+_plazo_actual = contextvars.ContextVar('plazo_actual', default=None)
+
+
+def plazo_actual():
+    return _plazo_actual.get()
+
+
+def con_plazo(plazo):
+    """Fija el plazo del contexto actual; devuelve el token para restaurarlo."""
+    return _plazo_actual.set(plazo)
+
+
+def restaurar_plazo(token):
+    _plazo_actual.reset(token)
+
+
+def verificar_plazo():
+    plazo = _plazo_actual.get()
+    if plazo is not None:
+        plazo.verificar()
+
+
+class EjecutorAcotado:
+    def __init__(self, nombre, max_workers, max_cola):
+        self.nombre = nombre
+        self.max_workers = max_workers
+        self.max_cola = max_cola
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=nombre)
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self.enviados = 0
+        self.completados = 0
+        self.rechazados = 0
+        self.cancelados = 0
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._pendientes >= self.max_workers + self.max_cola:
+                self.rechazados += 1
+                raise ColaLlena(f"Ejecutor '{self.nombre}' saturado.")
+            self._pendientes += 1
+            self.enviados += 1
+
+        # El contexto (y con él el plazo) se copia al hilo que ejecuta la tarea
+        contexto = contextvars.copy_context()
+        plazo = contexto.get(_plazo_actual)
+
+        def tarea():
+            if plazo is not None:
+                plazo.verificar()
+            return fn(*args, **kwargs)
+
+        future = self._pool.submit(contexto.run, tarea)
+        future.add_done_callback(self._terminado)
+        if plazo is not None:
+            plazo.registrar(future)
+        return future
+
+    def _terminado(self, future):
+        with self._lock:
+            self._pendientes -= 1
+            if future.cancelled():
+                self.cancelados += 1
+            else:
+                self.completados += 1
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'nombre': self.nombre,
+                'max_workers': self.max_workers,
+                'max_cola': self.max_cola,
+                'en_vuelo': self._pendientes,
+                'profundidad_cola': max(0, self._pendientes - self.max_workers),
+                'enviados': self.enviados,
+                'completados': self.completados,
+                'rechazados': self.rechazados,
+                'cancelados': self.cancelados,
+            }
@@ -0,0 +1,244 @@
+# extraccion.py
+"""
+Extracción por lotes de series mensuales de NDVI para muchos puntos.
+
+Lee los sitios de un CSV (columnas lat/lon, o latitud/longitud, e id opcional)
+o de un GeoJSON de puntos, y escribe una fila por sitio y mes (id, lat, lon,
+mes, ndvi) en Parquet (requiere pyarrow) o CSV, a medida que llegan los lotes.
+
+Los sitios se ordenan por proximidad y se agrupan en lotes; cada lote es un
+único reduceRegions sobre una imagen con una banda por mes (mediana del NDVI de
+las escenas de Sentinel-2 del rectángulo del lote) y un único getInfo. El tamaño del
+lote respeta los límites del servidor (elementos por colección y valores por
+respuesta); si aun así el servidor lo rechaza por tamaño (memoria, tiempo,
+límites), se parte en dos y se reintenta. Un mes sin escenas queda vacío.
+
+Uso:
+    python extraccion.py sitios.csv ndvi.parquet --anio-inicio 2020 --anio-fin 2023
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+# Con SUPERBLOOM_EE_BACKEND=local, `ee` se resuelve al backend local sobre NumPy (ee_local.py)
+if os.environ.get('SUPERBLOOM_EE_BACKEND', 'gee') == 'local':
+    import ee_local
+    ee_local.instalar()
+import ee
+
+from series import meses_entre, siguiente_mes
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+S2_COLLECTION = 'COPERNICUS/S2_SR_HARMONIZED'
+ESCALA_NDVI = 10
+# Límites de una consulta: GEE aborta las colecciones de más de 5000 elementos y las
+# respuestas muy grandes, así que el lote también se acota por valores (sitios × meses)
+MAX_SITIOS_LOTE = 5000
+MAX_VALORES_LOTE = int(os.environ.get('SUPERBLOOM_EXTRACCION_MAX_VALORES', 100000))
+# Fragmentos (en minúsculas) de los errores de GEE que dependen del tamaño de la consulta:
+# memoria, tiempo de cómputo, límites de elementos o de respuesta. Sólo éstos se
+# resuelven partiendo el lote; cualquier otro error se repetiría en cada mitad
+ERRORES_TAMANO = ('memory limit', 'timed out', 'deadline', 'too many', 'exceeds', 'too large',
+                  'payload', 'aborted after accumulating')
+# Celda (grados) con la que se ordenan los sitios para que cada lote sea compacto
+CELDA_ORDEN = 1.0
+COLUMNAS = ('id', 'lat', 'lon', 'mes', 'ndvi')
+
+
+# ===========================================
+# 📥 LECTURA DE SITIOS
+# ===========================================
+
+def _columna(fila, *nombres):
+    for nombre in nombres:
+        for clave, valor in fila.items():
+            if clave and clave.strip().lower() == nombre and valor not in (None, ''):
+                return valor
+    return None
+
+def leer_sitios(ruta):
+    """-> [(id, lat, lon)] de un CSV o un GeoJSON de puntos."""
+    sitios = []
+    if ruta.lower().endswith(('.geojson', '.json')):
+        with open(ruta, encoding='utf-8') as f:
+            datos = json.load(f)
+        for n, feature in enumerate(datos.get('features', [])):
+            geometria = feature.get('geometry') or {}
+            if geometria.get('type') != 'Point':
+                raise ValueError(f"Elemento {n}: sólo se admiten geometrías Point.")
+            lon, lat = geometria['coordinates'][:2]
+            propiedades = feature.get('properties') or {}
+            sitios.append((str(propiedades.get('id', feature.get('id', n))), float(lat), float(lon)))
+    else:
+        with open(ruta, newline='', encoding='utf-8') as f:
+            for n, fila in enumerate(csv.DictReader(f)):
+                lat, lon = _columna(fila, 'lat', 'latitud'), _columna(fila, 'lon', 'lng', 'longitud')
+                if lat is None or lon is None:
+                    raise ValueError(f"Fila {n + 2}: faltan las columnas lat/lon.")
+                sitios.append((str(_columna(fila, 'id') or n), float(lat), float(lon)))
+    for id_sitio, lat, lon in sitios:
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError(f"Sitio {id_sitio}: coordenadas fuera de rango ({lat}, {lon}).")
+    return sitios
+
+
+# ===========================================
+# 🧩 LOTES
+# ===========================================
+
+def tamano_lote(meses):
+    return max(1, min(MAX_SITIOS_LOTE, MAX_VALORES_LOTE // max(1, meses)))
+
+def lotes_sitios(sitios, tamano):
+    """Sitios ordenados por celda de CELDA_ORDEN grados (en serpentina) y cortados en lotes:
+    los vecinos caen en el mismo lote y el rectángulo de cada uno es pequeño."""
+    def clave(sitio):
+        _, lat, lon = sitio
+        fila = int((lat + 90) // CELDA_ORDEN)
+        columna = int((lon + 180) // CELDA_ORDEN)
+        return fila, columna if fila % 2 == 0 else -columna, lon, lat
+    ordenados = sorted(sitios, key=clave)
+    return [ordenados[i:i + tamano] for i in range(0, len(ordenados), tamano)]
+
+
+# ===========================================
+# 🛰️ EXTRACCIÓN
+# ===========================================
+
+def mask_s2_clouds(img):
+    scl = img.select('SCL')
+    good_quality = scl.eq(4).Or(scl.eq(5)).Or(scl.eq(6)).Or(scl.eq(11))
+    return img.updateMask(good_quality).divide(10000)
+
+def banda_mes(mes):
+    return 'm' + mes.replace('-', '_')
+
+def ndvi_escena(img):
+    return mask_s2_clouds(img).normalizedDifference(['B8', 'B4']).rename('NDVI')
+
+def mediana_mes(coleccion, mes):
+    """Mediana del mes como banda banda_mes(mes); enmascarada si el mes no tiene escenas
+    (el compuesto de una colección vacía no tiene bandas e invalidaría toda la pila)."""
+    del_mes = coleccion.filterDate(f'{mes}-01', f'{siguiente_mes(mes)}-01')
+    return ee.Image(ee.Algorithms.If(del_mes.size().gt(0),
+                                     del_mes.median().rename(banda_mes(mes)),
+                                     ee.Image.constant(0).selfMask().rename(banda_mes(mes))))
+
+def pila_mensual(region, meses):
+    """Una banda por mes con la mediana del NDVI de sus escenas, como obtener_serie_temporal_ndvi."""
+    coleccion = (ee.ImageCollection(S2_COLLECTION).filterBounds(region)
+                 .filterDate(f'{meses[0]}-01', f'{siguiente_mes(meses[-1])}-01').map(ndvi_escena))
+    return ee.Image.cat([mediana_mes(coleccion, mes) for mes in meses])
+
+def extraer_lote(lote, meses, escala=ESCALA_NDVI):
+    """-> filas (id, lat, lon, mes, ndvi) del lote con un único reduceRegions y un getInfo."""
+    lats, lons = [lat for _, lat, _ in lote], [lon for _, _, lon in lote]
+    region = ee.Geometry.Rectangle([min(lons), min(lats), max(lons), max(lats)], None, False)
+    puntos = ee.FeatureCollection([ee.Feature(ee.Geometry.Point([lon, lat]), {'i': i})
+                                   for i, (_, lat, lon) in enumerate(lote)])
+    info = pila_mensual(region, meses).reduceRegions(
+        collection=puntos, reducer=ee.Reducer.mean(), scale=escala, tileScale=4).getInfo()
+    valores = {f['properties']['i']: f['properties'] for f in info['features']}
+    filas = []
+    for i, (id_sitio, lat, lon) in enumerate(lote):
+        propiedades = valores.get(i, {})
+        filas.extend((id_sitio, lat, lon, mes, propiedades.get(banda_mes(mes))) for mes in meses)
+    return filas
+
+def es_error_de_tamano(error):
+    mensaje = str(error).lower()
+    return any(fragmento in mensaje for fragmento in ERRORES_TAMANO)
+
+def extraer_con_reparto(lote, meses, escala=ESCALA_NDVI):
+    """Como extraer_lote, pero si el servidor rechaza el lote por su tamaño lo parte en dos y reintenta."""
+    try:
+        return extraer_lote(lote, meses, escala)
+    except ee.EEException as e:
+        if len(lote) == 1 or not es_error_de_tamano(e):
+            raise
+        print(f"⚠️ Lote de {len(lote)} sitios rechazado ({e}); se divide en dos.", file=sys.stderr)
+        mitad = len(lote) // 2
+        return extraer_con_reparto(lote[:mitad], meses, escala) + extraer_con_reparto(lote[mitad:], meses, escala)
+
+
+# ===========================================
+# 💾 SALIDA
+# ===========================================
+
+class EscritorCsv:
+    def __init__(self, ruta):
+        self._archivo = open(ruta, 'w', newline='', encoding='utf-8')
+        self._csv = csv.writer(self._archivo)
+        self._csv.writerow(COLUMNAS)
+
+    def escribir(self, filas):
+        self._csv.writerows(filas)
+        self._archivo.flush()
+
+    def cerrar(self):
+        self._archivo.close()
+
+
+class EscritorParquet:
+    """Un grupo de filas por lote: el archivo crece sin acumular la extracción en memoria."""
+    def __init__(self, ruta):
+        if pa is None:
+            raise RuntimeError("La salida Parquet requiere pyarrow (pip install pyarrow); use .csv.")
+        self._esquema = pa.schema([('id', pa.string()), ('lat', pa.float64()), ('lon', pa.float64()),
+                                   ('mes', pa.string()), ('ndvi', pa.float64())])
+        self._escritor = pq.ParquetWriter(ruta, self._esquema)
+
+    def escribir(self, filas):
+        columnas = list(zip(*filas)) if filas else [[] for _ in COLUMNAS]
+        self._escritor.write_table(pa.Table.from_arrays([pa.array(c, type=t) for c, t in zip(
+            columnas, self._esquema.types)], schema=self._esquema))
+
+    def cerrar(self):
+        self._escritor.close()
+
+
+def abrir_escritor(ruta):
+    return EscritorParquet(ruta) if ruta.lower().endswith('.parquet') else EscritorCsv(ruta)
+
+
+def extraer(ruta_sitios, ruta_salida, anio_inicio, anio_fin, escala=ESCALA_NDVI):
+    sitios = leer_sitios(ruta_sitios)
+    meses = meses_entre(anio_inicio, anio_fin)
+    if not sitios or not meses:
+        raise ValueError("No hay sitios o meses que extraer.")
+    lotes = lotes_sitios(sitios, tamano_lote(len(meses)))
+    escritor = abrir_escritor(ruta_salida)
+    inicio = time.time()
+    try:
+        for n, lote in enumerate(lotes, 1):
+            escritor.escribir(extraer_con_reparto(lote, meses, escala))
+            print(f"Lote {n}/{len(lotes)}: {len(lote)} sitios × {len(meses)} meses "
+                  f"({time.time() - inicio:.1f} s)", file=sys.stderr)
+    finally:
+        escritor.cerrar()
+    return {'sitios': len(sitios), 'meses': len(meses), 'lotes': len(lotes), 'segundos': round(time.time() - inicio, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Series mensuales de NDVI para muchos sitios (CSV o GeoJSON).")
+    parser.add_argument('sitios')
+    parser.add_argument('salida', help="archivo .parquet (requiere pyarrow) o .csv")
+    parser.add_argument('--anio-inicio', type=int, default=2020)
+    parser.add_argument('--anio-fin', type=int, default=2023)
+    parser.add_argument('--escala', type=int, default=ESCALA_NDVI)
+    args = parser.parse_args()
+
+    try:
+        ee.Initialize(project='super-bloom')
+    except Exception:
+        ee.Authenticate()
+        ee.Initialize(project='super-bloom')
+    print(json.dumps(extraer(args.sitios, args.salida, args.anio_inicio, args.anio_fin, args.escala)))
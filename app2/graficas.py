@@ -0,0 +1,243 @@
+# graficas.py
+"""
+Renderizado de gráficas sin pantalla (backend Agg) con caché por contenido.
+
+Las tres gráficas de codigoGraficas.py (serie de NDVI, factores ambientales y
+NDVI con tendencia) se dibujan aquí sobre figuras independientes de pyplot, de
+modo que varias pueden renderizarse a la vez en un pool de procesos. Cada
+archivo se nombra con el hash de (tipo, formato, serie): una serie que no ha
+cambiado reutiliza su PNG/SVG sin volver a dibujarlo.
+
+Los procesos se crean con forkserver (o spawn): hacer fork de un servidor con
+hilos puede dejar en el hijo cerrojos tomados por hilos que no existen en él.
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import matplotlib
+matplotlib.use('Agg')
+# Identificadores internos del SVG fijos: la misma serie produce el mismo archivo
+matplotlib.rcParams['svg.hashsalt'] = 'superbloom'
+from matplotlib.figure import Figure
+import numpy as np
+
+# Cambia con el estilo de las gráficas para que no se sirvan archivos dibujados con el anterior
+VERSION = 1
+FORMATOS = ('png', 'svg')
+TIPOS_MIME = {'png': 'image/png', 'svg': 'image/svg+xml'}
+DPI = 100
+
+
+# ===========================================
+# 📈 GRÁFICAS
+# ===========================================
+
+def _serie(timeseries, clave):
+    return np.array([np.nan if item.get(clave) is None else float(item[clave]) for item in timeseries])
+
+def _fechas(timeseries):
+    return [datetime.strptime(item['date'][:10], '%Y-%m-%d') for item in timeseries]
+
+def _rejilla(ax):
+    ax.grid(True, which='both', linestyle='--', linewidth=0.5)
+
+def figura_serie_ndvi(timeseries):
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    ax.plot(_fechas(timeseries), _serie(timeseries, 'ndvi'), marker='o', linestyle='-', color='g')
+    ax.set_title("Serie Temporal de Índices de Vegetación (NDVI)")
+    ax.set_xlabel("Tiempo")
+    ax.set_ylabel("Valor de NDVI")
+    _rejilla(ax)
+    fig.tight_layout()
+    return fig
+
+def figura_factores(timeseries):
+    lst, precip = _serie(timeseries, 'lst'), _serie(timeseries, 'precipitation')
+    if np.isnan(lst).all() or np.isnan(precip).all():
+        raise ValueError("Faltan datos de LST o precipitación para la gráfica de factores ambientales.")
+    fechas = _fechas(timeseries)
+    fig = Figure(figsize=(14, 7))
+    ax1 = fig.subplots()
+    ax1.set_xlabel('Tiempo')
+    ax1.set_ylabel('NDVI', color='g')
+    ax1.plot(fechas, _serie(timeseries, 'ndvi'), 'g-', marker='o', label='NDVI')
+    ax1.tick_params(axis='y', labelcolor='g')
+
+    ax2 = ax1.twinx()
+    ax2.set_ylabel('Temperatura (°C) y Precipitación (mm)', color='b')
+    ax2.plot(fechas, lst, 'r-', marker='s', alpha=0.7, label='Temperatura (LST)')
+    ax2.plot(fechas, precip, 'b-', marker='^', alpha=0.7, label='Precipitación')
+    ax2.tick_params(axis='y', labelcolor='b')
+
+    ax1.set_title('Análisis Comparativo de Factores Ambientales')
+    fig.legend(loc="upper right", bbox_to_anchor=(1, 1), bbox_transform=ax1.transAxes)
+    _rejilla(ax1)
+    fig.tight_layout()
+    return fig
+
+def figura_tendencia(timeseries):
+    fechas, ndvi = _fechas(timeseries), _serie(timeseries, 'ndvi')
+    validos = ~np.isnan(ndvi)
+    if validos.sum() < 2:
+        raise ValueError("Se necesitan al menos dos valores de NDVI para calcular una tendencia.")
+    ordinales = np.array([d.toordinal() for d in fechas], dtype=float)
+    tendencia = np.poly1d(np.polyfit(ordinales[validos], ndvi[validos], 1))(ordinales)
+
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    ax.plot(fechas, ndvi, marker='o', linestyle='-', color='g', label='NDVI Real')
+    ax.plot(fechas, tendencia, linestyle='--', color='r', linewidth=2, label='Línea de Tendencia')
+    ax.set_title("Serie Temporal de NDVI con Línea de Tendencia")
+    ax.set_xlabel("Tiempo")
+    ax.set_ylabel("Valor de NDVI")
+    ax.legend()
+    _rejilla(ax)
+    fig.tight_layout()
+    return fig
+
+GRAFICAS = {
+    'ndvi': figura_serie_ndvi,
+    'factores': figura_factores,
+    'tendencia': figura_tendencia,
+}
+
+
+CAMPOS_SERIE = ('ndvi', 'lst', 'precipitation')
+
+def validar_serie(timeseries):
+    """Lanza ValueError si la serie no es [{'date': 'AAAA-MM-DD...', 'ndvi'|'lst'|'precipitation': número o None}].
+
+    Se comprueba antes de enviarla al pool: un KeyError o TypeError dentro de un
+    proceso hijo llegaría como un error genérico en lugar de un 400.
+    """
+    if not isinstance(timeseries, list) or not timeseries:
+        raise ValueError("'timeseries' debe ser una lista no vacía de puntos.")
+    for n, item in enumerate(timeseries):
+        if not isinstance(item, dict) or not isinstance(item.get('date'), str):
+            raise ValueError(f"Punto {n} de 'timeseries': se esperaba un objeto con 'date'.")
+        try:
+            datetime.strptime(item['date'][:10], '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"Punto {n} de 'timeseries': fecha '{item['date']}' no válida (AAAA-MM-DD).")
+        for clave in CAMPOS_SERIE:
+            valor = item.get(clave)
+            if valor is not None and (isinstance(valor, bool) or not isinstance(valor, (int, float))):
+                raise ValueError(f"Punto {n} de 'timeseries': '{clave}' debe ser numérico o null.")
+
+def huella(tipo, timeseries, formato):
+    contenido = json.dumps([VERSION, tipo, formato, timeseries], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+def renderizar(tipo, timeseries, formato):
+    """-> bytes del archivo. Función de módulo para poder ejecutarse en otro proceso."""
+    buffer = io.BytesIO()
+    # Sin fecha de creación en los metadatos, por la misma razón
+    metadatos = {'Software': None} if formato == 'png' else {'Date': None}
+    GRAFICAS[tipo](timeseries).savefig(buffer, format=formato, dpi=DPI, metadata=metadatos)
+    return buffer.getvalue()
+
+
+# ===========================================
+# 🗂️ ALMACÉN
+# ===========================================
+
+class AlmacenGraficas:
+    def __init__(self, directorio, procesos=2):
+        self.directorio = directorio
+        self.procesos = procesos
+        os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pool = None
+        self.renderizadas = 0
+        self.reutilizadas = 0
+        self.errores = 0
+
+    def ruta(self, huella_grafica, formato):
+        return os.path.join(self.directorio, f'{huella_grafica}.{formato}')
+
+    def _ejecutor(self):
+        with self._lock:
+            if self._pool is None:
+                metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                contexto = multiprocessing.get_context(metodo)
+                if metodo == 'forkserver':
+                    # matplotlib se importa una vez en el servidor y los procesos lo heredan
+                    contexto.set_forkserver_preload(['graficas'])
+                self._pool = ProcessPoolExecutor(max_workers=self.procesos, mp_context=contexto)
+            return self._pool
+
+    def _guardar(self, ruta, contenido):
+        # Escritura atómica: un lector concurrente nunca ve un archivo a medias
+        descriptor, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+
+    def renderizar_lote(self, peticiones, formato='png'):
+        """peticiones: [(tipo, timeseries)] -> [{'tipo', 'huella'} o {'tipo', 'error'}] en el mismo orden.
+
+        Sólo se dibujan las gráficas cuyo archivo no existe, cada una una vez
+        aunque se pida repetida, repartidas entre los procesos del pool.
+        """
+        if formato not in FORMATOS:
+            raise ValueError(f"Formatos disponibles: {list(FORMATOS)}.")
+        resultados, pendientes = [], {}
+        for tipo, timeseries in peticiones:
+            if tipo not in GRAFICAS:
+                raise ValueError(f"Gráficas disponibles: {list(GRAFICAS)}.")
+            validar_serie(timeseries)
+            h = huella(tipo, timeseries, formato)
+            resultados.append({'tipo': tipo, 'huella': h})
+            if not os.path.exists(self.ruta(h, formato)):
+                pendientes.setdefault(h, (tipo, timeseries))
+
+        errores = {}
+        if pendientes:
+            try:
+                ejecutor = self._ejecutor()
+                futuros = {h: ejecutor.submit(renderizar, tipo, ts, formato) for h, (tipo, ts) in pendientes.items()}
+                contenidos = {}
+                for h, futuro in futuros.items():
+                    try:
+                        contenidos[h] = futuro.result()
+                    except ValueError as e:
+                        errores[h] = str(e)
+            except BrokenProcessPool:
+                # Un proceso murió: se descarta el pool y el lote se dibuja aquí
+                with self._lock:
+                    self._pool = None
+                contenidos, errores = {}, {}
+                for h, (tipo, ts) in pendientes.items():
+                    try:
+                        contenidos[h] = renderizar(tipo, ts, formato)
+                    except ValueError as e:
+                        errores[h] = str(e)
+            for h, contenido in contenidos.items():
+                self._guardar(self.ruta(h, formato), contenido)
+
+        with self._lock:
+            self.renderizadas += len(pendientes) - len(errores)
+            self.reutilizadas += len(resultados) - len(pendientes)
+            self.errores += len(errores)
+        for resultado in resultados:
+            if resultado['huella'] in errores:
+                resultado['error'] = errores[resultado.pop('huella')]
+        return resultados
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'procesos': self.procesos,
+                'renderizadas': self.renderizadas,
+                'reutilizadas': self.reutilizadas,
+                'errores': self.errores,
+            }
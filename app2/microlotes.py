@@ -0,0 +1,134 @@
+# microlotes.py
+"""
+Agrupación de evaluaciones getInfo entre peticiones concurrentes (micro-lotes).
+
+Las evaluaciones que llegan dentro de una ventana corta (p. ej. 20 ms) desde
+cualquier hilo se combinan en un único ee.Dictionary y se resuelven con un solo
+getInfo; cada llamador recibe un future con su parte. Si la evaluación conjunta
+falla, los elementos del lote se evalúan por separado y a la vez, de modo que un
+objeto inválido sólo afecta a quien lo envió.
+
+Con evaluar(), un elemento que viaja solo (o que hay que reevaluar tras un lote
+fallido) se evalúa en el hilo del propio llamador: el pool sólo hace los getInfo
+conjuntos y no limita la concurrencia con Earth Engine.
+
+Es opcional: app.py sólo crea el agrupador con SUPERBLOOM_GETINFO_VENTANA_MS > 0;
+sin ventana las evaluaciones son getInfo directos y este módulo no interviene.
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+import ee
+
+from ejecutor import PlazoExcedido, plazo_actual
+
+# Resultado que devuelve al llamador de evaluar() la evaluación de su propio objeto
+_PROPIO = object()
+
+
+class AgrupadorGetInfo:
+    def __init__(self, nombre, ventana=0.02, max_lote=32, max_workers=32):
+        self.nombre = nombre
+        self.ventana = ventana
+        self.max_lote = max_lote
+        self._pendientes = []
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'lote-{nombre}')
+        self.lotes = 0
+        self.elementos = 0
+        self.lotes_fallidos = 0
+        if ventana > 0:
+            threading.Thread(target=self._despachar, name=f'agrupador-{nombre}', daemon=True).start()
+
+    def enviar(self, objeto, propio=False):
+        """Encola un objeto ee y devuelve el future con su getInfo.
+
+        Con propio=True el future puede resolverse a _PROPIO: el llamador debe
+        evaluar el objeto él mismo (lo hace evaluar()).
+        """
+        future = Future()
+        if self.ventana <= 0:
+            # Sin ventana no hay despachador: cada objeto se evalúa por separado
+            self._evaluar_lote([(objeto, future, propio)])
+            return future
+        with self._cond:
+            self._pendientes.append((objeto, future, propio))
+            self._cond.notify()
+        return future
+
+    def evaluar(self, objeto):
+        """Equivale a objeto.getInfo(), pero compartiendo viaje con otras peticiones."""
+        if self.ventana <= 0:
+            return objeto.getInfo()
+        plazo = plazo_actual()
+        try:
+            resultado = self.enviar(objeto, propio=True).result(timeout=plazo.restante() if plazo else None)
+        except FuturesTimeout:
+            raise PlazoExcedido("Se agotó el tiempo de la petición.")
+        return objeto.getInfo() if resultado is _PROPIO else resultado
+
+    def _despachar(self):
+        while True:
+            with self._cond:
+                while not self._pendientes:
+                    self._cond.wait()
+                # La ventana empieza con el primer elemento; un lote lleno sale antes
+                limite = time.monotonic() + self.ventana
+                while len(self._pendientes) < self.max_lote:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._cond.wait(restante)
+                lote, self._pendientes = self._pendientes[:self.max_lote], self._pendientes[self.max_lote:]
+            # La evaluación va al pool para que la siguiente ventana empiece ya
+            self._pool.submit(self._evaluar_lote, lote)
+
+    def _evaluar_lote(self, lote):
+        lote = [(objeto, future, propio) for objeto, future, propio in lote if future.set_running_or_notify_cancel()]
+        if not lote:
+            return
+        with self._cond:
+            self.lotes += 1
+            self.elementos += len(lote)
+        if len(lote) == 1:
+            self._evaluar_aparte(*lote[0])
+            return
+        try:
+            info = ee.Dictionary({f'e{i}': objeto for i, (objeto, _, _) in enumerate(lote)}).getInfo() or {}
+        except Exception:
+            with self._cond:
+                self.lotes_fallidos += 1
+            for elemento in lote:
+                self._evaluar_aparte(*elemento)
+            return
+        for i, (_, future, _) in enumerate(lote):
+            future.set_result(info.get(f'e{i}'))
+
+    def _evaluar_aparte(self, objeto, future, propio):
+        # En el hilo del llamador si está esperando en evaluar(); si no, en otra tarea del
+        # pool, para que las reevaluaciones de un lote fallido no vayan una detrás de otra
+        if propio:
+            future.set_result(_PROPIO)
+        else:
+            self._pool.submit(self._evaluar_uno, objeto, future)
+
+    @staticmethod
+    def _evaluar_uno(objeto, future):
+        try:
+            future.set_result(objeto.getInfo())
+        except BaseException as e:
+            future.set_exception(e)
+
+    def estadisticas(self):
+        with self._cond:
+            return {
+                'nombre': self.nombre,
+                'ventana_ms': self.ventana * 1000,
+                'pendientes': len(self._pendientes),
+                'lotes': self.lotes,
+                'elementos': self.elementos,
+                'elementos_por_lote': round(self.elementos / self.lotes, 2) if self.lotes else None,
+                'lotes_fallidos': self.lotes_fallidos,
+            }
@@ -0,0 +1,229 @@
+# motor_local.py
+"""
+Motor ráster local (NumPy) que reproduce el pipeline de índices de app.py sin
+conexión a Earth Engine.
+
+Una "pila" es un dict {'bandas': {nombre: ndarray (t, y, x)}, 'fechas': [ISO, ...]}
+cargado desde .npz, .npy o GeoTIFF. Las funciones son equivalentes vectorizados de
+mask_s2_clouds, to_celsius, median()/mean()/sum(), normalizedDifference, la
+expresión EVI, NDSI_floral y la diferencia relativa de precipitación, de modo que
+los valores resultan comparables con los analizar_* de app.py.
+
+Uso:
+    python motor_local.py s2.npz lst.npz gpm.npz 2023-03-01 2023-05-31 2024-03-01 2024-05-31
+"""
+import json
+import os
+import shutil
+import sys
+import warnings
+import zipfile
+from datetime import date
+
+import numpy as np
+
+# Mismos valores que en app.py
+EVI_CONSTANTS = {"G": 2.5, "L": 1, "C1": 6, "C2": 7.5}
+SCL_VALIDAS = (4, 5, 6, 11)
+
+
+# ===========================================
+# 📂 CARGA DE PILAS
+# ===========================================
+
+def cargar_pila(ruta, bandas=None, fechas=None, limites=None, directorio_mmap=None):
+    """Carga una pila de bandas desde .npz, .npy o GeoTIFF.
+
+    - .npz: un arreglo por banda (t, y, x) o (y, x) y, opcionalmente, 'fechas' y
+      'limites' [xmin, ymin, xmax, ymax] en grados.
+    - .npy: arreglo (t, b, y, x) o (b, y, x); `bandas` da los nombres en orden.
+    - .tif/.tiff: una banda por canal (requiere rasterio); los nombres salen de
+      las descripciones del archivo o de `bandas`.
+
+    Con `directorio_mmap` las bandas de .npz y .npy no se leen a memoria: quedan
+    como np.memmap de sólo lectura con su tipo original (las de un .npz se extraen
+    a .npy en ese directorio) y sólo se convierten los trozos que se usan.
+    """
+    ruta_min = ruta.lower()
+    if ruta_min.endswith('.npz'):
+        if directorio_mmap is not None:
+            contenido = _npz_a_memmap(ruta, directorio_mmap)
+        else:
+            with np.load(ruta, allow_pickle=False) as datos:
+                contenido = {k: datos[k] for k in datos.files}
+        fechas = [str(f) for f in contenido.pop('fechas', fechas or [])]
+        limites = contenido.pop('limites', None)
+        arreglos = {k: _con_eje_tiempo(v) for k, v in contenido.items()}
+    elif ruta_min.endswith('.npy'):
+        if not bandas:
+            raise ValueError("Para un .npy hay que indicar los nombres de las bandas.")
+        arreglo = np.load(ruta, allow_pickle=False, mmap_mode='r' if directorio_mmap is not None else None)
+        if arreglo.ndim == 3:
+            arreglo = arreglo[np.newaxis]
+        arreglos = {nombre: arreglo[:, i] for i, nombre in enumerate(bandas)}
+    elif ruta_min.endswith(('.tif', '.tiff')):
+        try:
+            import rasterio
+        except ImportError:
+            raise ImportError("Leer GeoTIFF requiere rasterio: pip install rasterio")
+        with rasterio.open(ruta) as src:
+            arreglo = src.read()
+            nombres = bandas or [d or f'b{i + 1}' for i, d in enumerate(src.descriptions)]
+        arreglos = {nombre: arreglo[i][np.newaxis] for i, nombre in enumerate(nombres)}
+    else:
+        raise ValueError(f"Formato no soportado: {ruta}")
+
+    if directorio_mmap is None:
+        arreglos = {k: v.astype(np.float64) for k, v in arreglos.items()}
+    n = next(iter(arreglos.values())).shape[0]
+    fechas = list(fechas or [])
+    if fechas and len(fechas) != n:
+        raise ValueError(f"{ruta}: {len(fechas)} fechas para {n} escenas.")
+    if limites is not None:
+        limites = [float(v) for v in limites]
+    return {'bandas': arreglos, 'fechas': fechas, 'limites': limites}
+
+
+def _npz_a_memmap(ruta, directorio):
+    # np.load no puede mapear miembros de un zip: se copian por bloques a .npy sueltos
+    contenido = {}
+    with zipfile.ZipFile(ruta) as zf:
+        for miembro in zf.namelist():
+            nombre = miembro[:-4] if miembro.endswith('.npy') else miembro
+            destino = os.path.join(directorio, os.path.basename(ruta) + '.' + nombre + '.npy')
+            with zf.open(miembro) as origen, open(destino, 'wb') as f:
+                shutil.copyfileobj(origen, f)
+            arreglo = np.load(destino, allow_pickle=False, mmap_mode='r')
+            # fechas y límites son pequeños y se usan como listas
+            contenido[nombre] = np.asarray(arreglo) if nombre in ('fechas', 'limites') else arreglo
+    return contenido
+
+
+def _con_eje_tiempo(arreglo):
+    return arreglo[np.newaxis] if arreglo.ndim == 2 else arreglo
+
+
+def indices_fechas(fechas, inicio, fin):
+    """Posiciones de las escenas en [inicio, fin)."""
+    ini, fn = date.fromisoformat(inicio), date.fromisoformat(fin)
+    return [i for i, f in enumerate(fechas) if ini <= date.fromisoformat(f[:10]) < fn]
+
+
+def filtrar_fechas(pila, inicio, fin):
+    """Equivalente de filterDate: inicio incluido, fin excluido."""
+    indices = indices_fechas(pila['fechas'], inicio, fin)
+    return {
+        'bandas': {k: v[indices] for k, v in pila['bandas'].items()},
+        'fechas': [pila['fechas'][i] for i in indices],
+    }
+
+
+# ===========================================
+# 🧮 OPERACIONES (equivalentes de app.py)
+# ===========================================
+
+def enmascarar_nubes_s2(bandas):
+    """mask_s2_clouds: conserva SCL 4/5/6/11 y escala reflectancias (/10000)."""
+    validos = np.isin(bandas['SCL'], SCL_VALIDAS)
+    return {k: np.where(validos, v / 10000.0, np.nan) for k, v in bandas.items()}
+
+
+def a_celsius(lst_crudo):
+    """to_celsius: LST_Day_1km * 0.02 - 273.15; el valor 0 es relleno en MOD11A2."""
+    lst = np.asarray(lst_crudo, dtype=np.float64)
+    return np.where((lst == 0) | np.isnan(lst), np.nan, lst * 0.02 - 273.15)
+
+
+def _reducir_tiempo(funcion, arreglo):
+    # Las celdas sin ninguna observación válida quedan en NaN (píxel enmascarado)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return funcion(arreglo, axis=0)
+
+
+def compuesto_mediana(arreglo):
+    return _reducir_tiempo(np.nanmedian, arreglo)
+
+
+def compuesto_media(arreglo):
+    return _reducir_tiempo(np.nanmean, arreglo)
+
+
+def compuesto_suma(arreglo):
+    """sum() de GEE: suma de observaciones válidas; sin ninguna, enmascarado."""
+    suma = np.nansum(arreglo, axis=0)
+    return np.where(np.all(np.isnan(arreglo), axis=0), np.nan, suma)
+
+
+def diferencia_normalizada(a, b):
+    with np.errstate(all='ignore'):
+        resultado = (a - b) / (a + b)
+    return np.where(np.isfinite(resultado), resultado, np.nan)
+
+
+def evi(nir, red, blue, constantes=EVI_CONSTANTS):
+    c = constantes
+    with np.errstate(all='ignore'):
+        resultado = c['G'] * ((nir - red) / (nir + c['C1'] * red - c['C2'] * blue + c['L']))
+    return np.where(np.isfinite(resultado), resultado, np.nan)
+
+
+def ndsi_floral(green, red):
+    return diferencia_normalizada(green, red)
+
+
+def diferencia_relativa_precip(actual, historico):
+    with np.errstate(all='ignore'):
+        return (actual - historico) / (historico + 1e-6)
+
+
+def media_region(arreglo):
+    """reduceRegion(mean): None si no queda ningún píxel válido."""
+    validos = arreglo[np.isfinite(arreglo)]
+    return float(validos.mean()) if validos.size else None
+
+
+# ===========================================
+# 🌿 ANÁLISIS COMPLETO
+# ===========================================
+
+def compuesto_s2(pila_s2, inicio, fin):
+    bandas = enmascarar_nubes_s2(filtrar_fechas(pila_s2, inicio, fin)['bandas'])
+    return {k: compuesto_mediana(v) for k, v in bandas.items()}
+
+
+def analizar_local(pila_s2, pila_lst, pila_gpm, h_start, h_end, c_start, c_end):
+    """Devuelve los mismos escalares que analizar_ecosistema_avanzado (ndvi_c, lst_h, ...)."""
+    s2_actual = compuesto_s2(pila_s2, c_start, c_end)
+    s2_historico = compuesto_s2(pila_s2, h_start, h_end)
+    ndvi_c = diferencia_normalizada(s2_actual['B8'], s2_actual['B4'])
+    ndvi_h = diferencia_normalizada(s2_historico['B8'], s2_historico['B4'])
+
+    lst_c = compuesto_media(a_celsius(filtrar_fechas(pila_lst, c_start, c_end)['bandas']['LST_Day_1km']))
+    lst_h = compuesto_media(a_celsius(filtrar_fechas(pila_lst, h_start, h_end)['bandas']['LST_Day_1km']))
+
+    precip_c = compuesto_suma(filtrar_fechas(pila_gpm, c_start, c_end)['bandas']['precipitationCal'])
+    precip_h = compuesto_suma(filtrar_fechas(pila_gpm, h_start, h_end)['bandas']['precipitationCal'])
+
+    rasters = {
+        'ndvi_c': ndvi_c,
+        'ndvi_h': ndvi_h,
+        'ndvi_d': ndvi_c - ndvi_h,
+        'evi_c': evi(s2_actual['B8'], s2_actual['B4'], s2_actual['B2']),
+        'ndsi_c': ndsi_floral(s2_actual['B3'], s2_actual['B4']),
+        'lst_c': lst_c,
+        'lst_h': lst_h,
+        'lst_d': lst_c - lst_h,
+        'precip_c': precip_c,
+        'precip_h': precip_h,
+        'precip_d': diferencia_relativa_precip(precip_c, precip_h),
+    }
+    return {clave: media_region(raster) for clave, raster in rasters.items()}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 8:
+        print(__doc__)
+        sys.exit(1)
+    s2, lst, gpm = (cargar_pila(r) for r in sys.argv[1:4])
+    print(json.dumps(analizar_local(s2, lst, gpm, *sys.argv[4:8]), indent=2))
@@ -0,0 +1,84 @@
+# muestreo.py
+"""
+Estimador por muestreo estratificado para regiones grandes.
+
+La región se divide en estratos de igual área (teselas.dividir_igual_area) y en
+cada uno se toma una muestra aleatoria de m_h píxeles, de los que n_h son válidos
+(no enmascarados) para la banda. Se estima lo mismo que el cálculo exacto: la
+media sobre los píxeles válidos de la región. Cada estrato pesa por su área W_h y
+por su fracción válida estimada p_h = n_h/m_h (nubes, agua o falta de datos no se
+reparten igual entre estratos), con el estimador de razón
+
+    R = Σ W_h·p_h·ȳ_h / Σ W_h·p_h
+
+y su error estándar por linealización, sqrt(Σ W_h²·s²_zh/m_h) / Σ W_h·p_h, donde
+z = δ·(y − R) vale 0 en los píxeles no válidos. Sin píxeles enmascarados se reduce
+a Σ W_h·ȳ_h y sqrt(Σ W_h²·s_h²/n_h). El intervalo del 95 % es R ± 1.96·EE.
+
+La precisión objetivo se expresa como semiancho del intervalo en unidades de la
+desviación típica de la variable: precision=0.05 pide ±0.05σ, unas 1537 muestras.
+"""
+import math
+
+Z_95 = 1.959964
+MUESTRAS_MIN = 100
+MUESTRAS_MAX = 50000
+ESTRATOS_MAX = 16
+
+
+def tamano_muestra(precision):
+    n = math.ceil((Z_95 / precision) ** 2)
+    return min(MUESTRAS_MAX, max(MUESTRAS_MIN, n))
+
+
+def numero_estratos(muestras):
+    # Al menos ~10 muestras por estrato para estimar su varianza
+    return max(1, min(ESTRATOS_MAX, muestras // 10))
+
+
+def estimar_estratificado(resumenes, areas=None):
+    """resumenes: [(m_h, n_h, media_h, varianza_muestral_h), ...] por estrato: píxeles
+    muestreados, válidos entre ellos, y media y varianza de los válidos. areas: peso
+    de área de cada estrato (iguales por defecto).
+
+    Un estrato sin ningún píxel muestreado no informa de su fracción válida y se
+    descarta (renormalizando las áreas); uno sin píxeles válidos cuenta con p_h = 0.
+    Si un estrato tiene un solo valor válido se usa la varianza conjunta.
+    """
+    areas = areas or [1.0] * len(resumenes)
+    estratos = [(a, m, n if media is not None else 0, media, v)
+                for a, (m, n, media, v) in zip(areas, resumenes) if m]
+    n_total = sum(n for _, _, n, _, _ in estratos)
+    vacio = {'media': None, 'error_estandar': None, 'ic95': [None, None], 'muestras': n_total,
+             'estratos': len(estratos), 'fraccion_valida': 0.0 if estratos else None}
+    if not n_total:
+        return vacio
+    area_total = sum(a for a, _, _, _, _ in estratos)
+    validos = [(n, media, v) for _, _, n, media, v in estratos if n]
+    media_conjunta = sum(n * media for n, media, _ in validos) / n_total
+    suma_cuadrados = sum((n - 1) * (v or 0.0) + n * (media - media_conjunta) ** 2 for n, media, v in validos)
+    varianza_conjunta = suma_cuadrados / (n_total - 1) if n_total > 1 else 0.0
+
+    fraccion = sum(a / area_total * n / m for a, m, n, _, _ in estratos)
+    razon = sum(a / area_total * n / m * media for a, m, n, media, _ in estratos if n) / fraccion
+    varianza_z = 0.0
+    for a, m, n, media, v in estratos:
+        peso = a / area_total
+        if n:
+            varianza_h = v if n > 1 and v is not None else varianza_conjunta
+            suma_z = n * (media - razon)
+            suma_z2 = (n - 1) * varianza_h + n * (media - razon) ** 2
+        else:
+            suma_z = suma_z2 = 0.0
+        # Con un solo píxel muestreado no hay varianza propia: la conjunta ponderada por p_h
+        s2_z = (suma_z2 - suma_z ** 2 / m) / (m - 1) if m > 1 else varianza_conjunta * n / m
+        varianza_z += peso * peso * s2_z / m
+    error = math.sqrt(max(0.0, varianza_z)) / fraccion
+    return {
+        'media': razon,
+        'error_estandar': error,
+        'ic95': [razon - Z_95 * error, razon + Z_95 * error],
+        'muestras': n_total,
+        'estratos': len(estratos),
+        'fraccion_valida': fraccion,
+    }
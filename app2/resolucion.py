@@ -0,0 +1,37 @@
+# resolucion.py
+"""
+Política de resolución: escala, tileScale y bestEffort según el tamaño de la región.
+
+Cada variable tiene una escala mínima (su resolución útil). Se elige el escalón
+más fino cuya cantidad de píxeles cabe en el presupuesto de la petición
+(píxeles por segundo × segundos de plazo); así una región pequeña se reduce a
+resolución nativa y una continental a escala gruesa, en tiempo acotado.
+"""
+import math
+
+# Escalas (m) entre las que se elige; redondear a escalones mantiene estable la
+# clave de caché ante rectángulos de tamaño parecido
+ESCALONES = (10, 20, 30, 60, 100, 250, 500, 1000, 2000, 5000, 10000, 25000)
+
+
+def elegir_escala(area_km2, minima, pixeles_max):
+    ideal = math.sqrt(area_km2 * 1e6 / pixeles_max) if pixeles_max > 0 else ESCALONES[-1]
+    for escala in ESCALONES:
+        if escala >= minima and escala >= ideal:
+            return escala
+    return ESCALONES[-1]
+
+
+def opciones_reduccion(pixeles, pixeles_max):
+    """tileScale crece con los píxeles de la reducción; bestEffort sólo cuando ni el
+    escalón más grueso cabe en el presupuesto (GEE elige entonces una escala mayor)."""
+    if pixeles <= 2.5e5:
+        tile_scale = 1
+    elif pixeles <= 1e6:
+        tile_scale = 2
+    elif pixeles <= 4e6:
+        tile_scale = 4
+    else:
+        tile_scale = 8
+    best_effort = pixeles > pixeles_max
+    return {'tileScale': 16 if best_effort else tile_scale, 'bestEffort': best_effort}
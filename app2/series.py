@@ -0,0 +1,102 @@
+# series.py
+"""
+Almacén local, sólo de anexado, de series mensuales por punto.
+
+Cada fila es el valor mensual de una variable en un punto (redondeado a ~1 m) a
+una escala. Sólo se anexan los meses consolidados (terminados hace más de unos
+días, cuando ya no llegan escenas nuevas), así que una fila nunca cambia y cada
+consulta posterior sólo pide a Earth Engine los meses que aún no están.
+"""
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+
+def id_punto(lat, lon):
+    return f'{round(float(lat), 5):.5f},{round(float(lon), 5):.5f}'
+
+
+def siguiente_mes(mes):
+    anio, numero = (int(p) for p in mes.split('-'))
+    return f'{anio + numero // 12}-{numero % 12 + 1:02d}'
+
+
+def meses_entre(anio_inicio, anio_fin, hoy=None):
+    """Meses 'YYYY-MM' de los años pedidos, sin pasar del mes en curso."""
+    actual = (hoy or date.today()).strftime('%Y-%m')
+    return [f'{anio}-{mes:02d}' for anio in range(anio_inicio, anio_fin + 1) for mes in range(1, 13)
+            if f'{anio}-{mes:02d}' <= actual]
+
+
+def mes_consolidado(mes, margen_dias=5, hoy=None):
+    """True si el mes terminó hace más de `margen_dias` (latencia de ingesta)."""
+    fin = date.fromisoformat(siguiente_mes(mes) + '-01')
+    return fin + timedelta(days=margen_dias) <= (hoy or date.today())
+
+
+def mediana(valores):
+    valores = sorted(valores)
+    if not valores:
+        return None
+    mitad = len(valores) // 2
+    return valores[mitad] if len(valores) % 2 else (valores[mitad - 1] + valores[mitad]) / 2
+
+
+class AlmacenSeries:
+    def __init__(self, ruta_db):
+        self.ruta_db = ruta_db
+        self._lock = threading.Lock()
+        self.meses_almacen = 0
+        self.meses_calculados = 0
+        with self._conectar() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS series_mensuales (
+                    punto TEXT NOT NULL,
+                    variable TEXT NOT NULL,
+                    escala INTEGER NOT NULL,
+                    mes TEXT NOT NULL,
+                    valor REAL,
+                    observaciones INTEGER NOT NULL,
+                    guardado REAL NOT NULL,
+                    PRIMARY KEY (punto, variable, escala, mes)
+                )""")
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta_db, timeout=30)
+
+    def obtener(self, punto, variable, escala, meses):
+        """-> {mes: (valor, observaciones)} de los meses ya anexados."""
+        if not meses:
+            return {}
+        with self._conectar() as con:
+            filas = con.execute(
+                f"""SELECT mes, valor, observaciones FROM series_mensuales
+                    WHERE punto = ? AND variable = ? AND escala = ? AND mes IN ({','.join('?' * len(meses))})""",
+                (punto, variable, escala, *meses)).fetchall()
+        with self._lock:
+            self.meses_almacen += len(filas)
+        return {mes: (valor, observaciones) for mes, valor, observaciones in filas}
+
+    def anexar(self, filas):
+        """filas: [(punto, variable, escala, mes, valor, observaciones)]; lo ya anexado no se toca."""
+        ahora = time.time()
+        with self._conectar() as con:
+            con.executemany("INSERT OR IGNORE INTO series_mensuales VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            [(*fila, ahora) for fila in filas])
+
+    def contar_calculados(self, n):
+        with self._lock:
+            self.meses_calculados += n
+
+    def estadisticas(self):
+        with self._conectar() as con:
+            filas, puntos = con.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT punto) FROM series_mensuales").fetchone()
+        with self._lock:
+            return {
+                'filas': filas,
+                'puntos': puntos,
+                'meses_almacen': self.meses_almacen,
+                'meses_calculados': self.meses_calculados,
+            }
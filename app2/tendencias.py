@@ -0,0 +1,236 @@
+# tendencias.py
+"""
+Tendencias de NDVI píxel a píxel sobre un cubo (t, y, x): rásteres de pendiente
+(unidades por año) y de significancia para mapas de reverdecimiento/pardeamiento.
+
+Es la versión por píxel de graficar_ndvi_con_tendencia (codigoGraficas.py):
+- OLS: pendiente de mínimos cuadrados en forma cerrada y p-valor bilateral de
+  la t de Student con n - 2 grados de libertad.
+- Theil–Sen: mediana de las pendientes entre todos los pares de meses, con la
+  prueba de Mann–Kendall (aproximación normal) como significancia.
+
+Los meses enmascarados (NaN) se excluyen píxel a píxel y los píxeles con menos
+de `minimo` observaciones quedan en NaN. El cubo se recorre por franjas de filas
+cuyo tamaño sale de `memoria_max`, así que puede ser un np.memmap mayor que la
+memoria; la línea de órdenes construye el cubo igual, franja a franja desde la pila
+mapeada, en un np.memmap temporal. Theil–Sen además reparte los píxeles de cada franja según el número de
+pares. Con `meses`, a cada píxel se le resta su media por mes del año antes del
+ajuste, para que el ciclo estacional no sesgue la pendiente.
+
+Uso:
+    python tendencias.py s2.npz 2019 2024 tendencia.npz [--metodo theil-sen]
+"""
+import argparse
+import math
+import os
+import tempfile
+
+import numpy as np
+
+import motor_local
+from series import meses_entre, siguiente_mes
+
+MINIMO_OBSERVACIONES = 6
+MEMORIA_MAX = 64 * 1024 ** 2
+_erfc = np.frompyfunc(math.erfc, 1, 1)
+
+
+# ===========================================
+# 🧊 CUBO MENSUAL
+# ===========================================
+
+def cubo_ndvi_mensual(pila_s2, meses, salida=None, memoria_max=MEMORIA_MAX):
+    """(t, y, x) con la mediana mensual del NDVI de las escenas (NaN sin escenas válidas).
+
+    Se calcula por franjas de filas, leyendo de la pila sólo las escenas del mes y
+    las filas de la franja, así que con una pila memmap (motor_local.cargar_pila con
+    `directorio_mmap`) y `salida` un np.memmap (t, y, x) la memoria queda acotada
+    por `memoria_max` de principio a fin.
+    """
+    alto, ancho = pila_s2['bandas']['B8'].shape[1:]
+    por_mes = [motor_local.indices_fechas(pila_s2['fechas'], f'{mes}-01', f'{siguiente_mes(mes)}-01')
+               for mes in meses]
+    if salida is None:
+        salida = np.empty((len(meses), alto, ancho))
+    # B8, B4, SCL y los temporales del enmascarado y del NDVI, en float64
+    escenas = max([len(indices) for indices in por_mes] + [1])
+    filas = max(1, min(alto, int(memoria_max // (8 * 8 * escenas * ancho))))
+    for y0 in range(0, alto, filas):
+        for t, indices in enumerate(por_mes):
+            if not indices:
+                salida[t, y0:y0 + filas] = np.nan
+                continue
+            bandas = motor_local.enmascarar_nubes_s2(
+                {k: pila_s2['bandas'][k][indices, y0:y0 + filas] for k in ('B8', 'B4', 'SCL')})
+            salida[t, y0:y0 + filas] = motor_local.compuesto_mediana(
+                motor_local.diferencia_normalizada(bandas['B8'], bandas['B4']))
+    return salida
+
+def tiempos_decimales(meses):
+    """'YYYY-MM' -> años decimales (mitad de mes), para pendientes por año."""
+    return np.array([int(m[:4]) + (int(m[5:7]) - 0.5) / 12 for m in meses])
+
+def desestacionalizar(bloque, meses):
+    """Resta a cada píxel su media de cada mes del año (sólo observaciones válidas)."""
+    numero = np.array([int(m[5:7]) for m in meses])
+    anomalias = np.array(bloque, dtype=np.float64)
+    for mes in np.unique(numero):
+        filas = numero == mes
+        anomalias[filas] -= motor_local.compuesto_media(anomalias[filas])
+    return anomalias
+
+
+# ===========================================
+# 📉 ESTIMADORES (bloques (t, píxeles))
+# ===========================================
+
+def p_valor_student(t, grados):
+    """P(|T| >= |t|) exacta para grados de libertad enteros (A&S 26.7.3 y 26.7.4)."""
+    t, grados = np.asarray(t, dtype=np.float64), np.asarray(grados)
+    p = np.full(t.shape, np.nan)
+    for nu in np.unique(grados[np.isfinite(t) & (grados >= 1)]):
+        nu = int(nu)
+        sel = (grados == nu) & np.isfinite(t)
+        theta = np.arctan(np.abs(t[sel]) / math.sqrt(nu))
+        seno, coseno2 = np.sin(theta), np.cos(theta) ** 2
+        if nu % 2 == 0:
+            termino = suma = np.ones_like(theta)
+            for k in range(1, (nu - 2) // 2 + 1):
+                termino = termino * (2 * k - 1) / (2 * k) * coseno2
+                suma = suma + termino
+            acumulada = seno * suma
+        else:
+            termino = suma = np.sqrt(coseno2) if nu > 1 else np.zeros_like(theta)
+            for k in range(1, (nu - 3) // 2 + 1):
+                termino = termino * (2 * k) / (2 * k + 1) * coseno2
+                suma = suma + termino
+            acumulada = 2 / math.pi * (theta + seno * suma)
+        p[sel] = np.clip(1 - acumulada, 0, 1)
+    return p
+
+def ols(bloque, tiempos, minimo=MINIMO_OBSERVACIONES):
+    validos = np.isfinite(bloque)
+    n = validos.sum(axis=0)
+    x = np.where(validos, tiempos[:, None], 0.0)
+    y = np.where(validos, bloque, 0.0)
+    with np.errstate(all='ignore'):
+        x_media, y_media = x.sum(axis=0) / n, y.sum(axis=0) / n
+        dx = np.where(validos, x - x_media, 0.0)
+        dy = np.where(validos, y - y_media, 0.0)
+        sxx = (dx * dx).sum(axis=0)
+        pendiente = (dx * dy).sum(axis=0) / sxx
+        residuos = ((dy - pendiente * dx) ** 2).sum(axis=0)
+        error = np.sqrt(residuos / (n - 2) / sxx)
+        t = pendiente / error
+    # Ajuste perfecto: error nulo, pendiente sin duda
+    t = np.where((error == 0) & np.isfinite(pendiente), np.copysign(np.inf, pendiente), t)
+    suficientes = (n >= max(3, minimo)) & (sxx > 0)
+    p = p_valor_student(np.where(suficientes, t, np.nan), n - 2)
+    p = np.where(np.isinf(t) & suficientes, 0.0, p)
+    return {'pendiente': np.where(suficientes, pendiente, np.nan), 'p_valor': p, 'observaciones': n}
+
+def mediana_nan(arreglo):
+    """np.nanmedian(arreglo, axis=0) con una sola ordenación (los NaN quedan al final)."""
+    ordenado = np.sort(arreglo, axis=0)
+    k = np.isfinite(arreglo).sum(axis=0)
+    bajo = np.take_along_axis(ordenado, np.maximum(k - 1, 0)[None] // 2, axis=0)[0]
+    alto = np.take_along_axis(ordenado, (k // 2)[None], axis=0)[0]
+    return np.where(k > 0, (bajo + alto) / 2, np.nan)
+
+def theil_sen(bloque, tiempos, minimo=MINIMO_OBSERVACIONES):
+    validos = np.isfinite(bloque)
+    n = validos.sum(axis=0)
+    i, j = np.triu_indices(len(tiempos), 1)
+    diferencias = bloque[j] - bloque[i]
+    pendiente = mediana_nan(diferencias / (tiempos[j] - tiempos[i])[:, None])
+    # Mann–Kendall: S = Σ signo(x_j - x_i) sobre pares válidos; var(S) sin corrección por empates
+    s = np.nansum(np.sign(diferencias), axis=0)
+    varianza = n * (n - 1) * (2 * n + 5) / 18.0
+    with np.errstate(all='ignore'):
+        z = (s - np.sign(s)) / np.sqrt(varianza)
+    suficientes = n >= max(3, minimo)
+    p = np.where(suficientes, _erfc(np.abs(np.where(suficientes, z, 0.0)) / math.sqrt(2)).astype(np.float64), np.nan)
+    return {'pendiente': np.where(suficientes, pendiente, np.nan), 'p_valor': p, 'observaciones': n}
+
+METODOS = {'ols': ols, 'theil-sen': theil_sen}
+
+
+# ===========================================
+# 🗺️ RÁSTERES
+# ===========================================
+
+def pixeles_por_bloque(pasos, metodo, memoria_max=MEMORIA_MAX):
+    # Arreglos float64 (t, píxeles) o (pares, píxeles) que el estimador tiene vivos a la vez
+    if metodo == 'theil-sen':
+        por_pixel = 3 * pasos * (pasos - 1) // 2 * 8
+    else:
+        por_pixel = 6 * pasos * 8
+    return max(1, int(memoria_max // max(1, por_pixel)))
+
+def rasters_tendencia(cubo, tiempos, metodo='ols', meses=None, minimo=MINIMO_OBSERVACIONES,
+                      memoria_max=MEMORIA_MAX):
+    """-> {'pendiente', 'p_valor', 'observaciones'} (y, x) del cubo (t, y, x).
+
+    Se recorre por franjas de filas (y, dentro de cada una, por grupos de
+    píxeles) de modo que los temporales no superen `memoria_max` bytes.
+    """
+    if metodo not in METODOS:
+        raise ValueError(f"Métodos disponibles: {list(METODOS)}.")
+    pasos, alto, ancho = cubo.shape
+    tiempos = np.asarray(tiempos, dtype=np.float64)
+    if len(tiempos) != pasos:
+        raise ValueError(f"{len(tiempos)} tiempos para un cubo de {pasos} pasos.")
+    salida = {'pendiente': np.full((alto, ancho), np.nan, dtype=np.float32),
+              'p_valor': np.full((alto, ancho), np.nan, dtype=np.float32),
+              'observaciones': np.zeros((alto, ancho), dtype=np.int16)}
+    pixeles = pixeles_por_bloque(pasos, metodo, memoria_max)
+    filas = max(1, min(alto, pixeles // max(1, ancho)))
+    for y0 in range(0, alto, filas):
+        franja = np.asarray(cubo[:, y0:y0 + filas], dtype=np.float64).reshape(pasos, -1)
+        if meses is not None:
+            franja = desestacionalizar(franja, meses)
+        resultados = {clave: [] for clave in salida}
+        for p0 in range(0, franja.shape[1], pixeles):
+            parcial = METODOS[metodo](franja[:, p0:p0 + pixeles], tiempos, minimo)
+            for clave in salida:
+                resultados[clave].append(parcial[clave])
+        alto_franja = min(filas, alto - y0)
+        for clave, partes in resultados.items():
+            salida[clave][y0:y0 + alto_franja] = np.concatenate(partes).reshape(alto_franja, ancho)
+    return salida
+
+def clasificar(pendiente, p_valor, alfa=0.05):
+    """1 reverdecimiento, -1 pardeamiento, 0 sin tendencia significativa (o sin datos)."""
+    significativo = np.nan_to_num(p_valor, nan=1.0) < alfa
+    return np.where(significativo, np.sign(np.nan_to_num(pendiente)), 0).astype(np.int8)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rásteres de tendencia de NDVI (pendiente por año y p-valor).")
+    parser.add_argument('pila_s2')
+    parser.add_argument('anio_inicio', type=int)
+    parser.add_argument('anio_fin', type=int)
+    parser.add_argument('salida', help="archivo .npz (pendiente, p_valor, observaciones, clase, limites)")
+    parser.add_argument('--metodo', choices=list(METODOS), default='ols')
+    parser.add_argument('--sin-desestacionalizar', action='store_true')
+    parser.add_argument('--alfa', type=float, default=0.05)
+    args = parser.parse_args()
+
+    meses = meses_entre(args.anio_inicio, args.anio_fin)
+    # Pila y cubo en disco: sólo las franjas en curso ocupan memoria
+    with tempfile.TemporaryDirectory(prefix='tendencias-') as temporal:
+        pila = motor_local.cargar_pila(args.pila_s2, directorio_mmap=temporal)
+        alto, ancho = pila['bandas']['B8'].shape[1:]
+        cubo = np.lib.format.open_memmap(os.path.join(temporal, 'cubo.npy'), mode='w+', dtype=np.float32,
+                                         shape=(len(meses), alto, ancho))
+        rasters = rasters_tendencia(cubo_ndvi_mensual(pila, meses, cubo), tiempos_decimales(meses), args.metodo,
+                                    None if args.sin_desestacionalizar else meses)
+        limites = pila['limites']
+        del cubo, pila
+    rasters['clase'] = clasificar(rasters['pendiente'], rasters['p_valor'], args.alfa)
+    if limites is not None:
+        rasters['limites'] = np.asarray(limites)
+    np.savez_compressed(args.salida, **rasters)
+    clases = rasters['clase']
+    print(f"{args.metodo}: {int((clases == 1).sum())} píxeles reverdecen, {int((clases == -1).sum())} pardean "
+          f"(p < {args.alfa}) de {clases.size}.")
@@ -0,0 +1,51 @@
+# teselas.py
+"""
+División de regiones grandes en teselas de igual área.
+
+El número de píxeles de una reducción se estima localmente (área / escala²),
+sin consultar a Earth Engine; si supera el máximo por llamada, la región se
+reparte en una rejilla nx × ny: uniforme en longitud y uniforme en sen(latitud),
+de modo que todas las teselas tienen la misma área.
+"""
+import math
+
+from cache_celdas import area_km2
+
+
+def pixeles_estimados(coords, escala):
+    return area_km2(coords) * 1e6 / (escala * escala)
+
+
+def teselas_necesarias(coords, escala, max_pixeles):
+    return max(1, math.ceil(pixeles_estimados(coords, escala) / max_pixeles))
+
+
+def margen_geodesico(coords):
+    """Holgura (grados) para que la unión de teselas planas cubra un rectángulo geodésico.
+
+    Los lados este-oeste de un rectángulo geodésico se curvan hacia el polo; el
+    exceso queda fuera del clip de las imágenes y no cuenta en la reducción.
+    """
+    xmin, ymin, xmax, ymax = coords
+    ancho = math.radians(xmax - xmin)
+    lat = math.radians(min(89.0, max(abs(ymin), abs(ymax))))
+    return math.degrees(ancho * ancho / 8 * math.tan(lat)) * 2 + 1e-3
+
+
+def dividir_igual_area(coords, n, margen=0.0):
+    """Al menos n teselas [xmin, ymin, xmax, ymax] de igual área que cubren coords (+ margen)."""
+    xmin, ymin, xmax, ymax = coords
+    xmin, xmax = xmin - margen, xmax + margen
+    ymin, ymax = max(-90.0, ymin - margen), min(90.0, ymax + margen)
+    # Rejilla lo más cuadrada posible en km
+    proporcion = ((xmax - xmin) * math.cos(math.radians((ymin + ymax) / 2))) / max(1e-9, ymax - ymin)
+    nx = max(1, round(math.sqrt(n * proporcion)))
+    ny = max(1, math.ceil(n / nx))
+
+    xs = [xmin + (xmax - xmin) * k / nx for k in range(nx + 1)]
+    s0, s1 = math.sin(math.radians(ymin)), math.sin(math.radians(ymax))
+    ys = [math.degrees(math.asin(s0 + (s1 - s0) * k / ny)) for k in range(ny + 1)]
+    # Los bordes exteriores se fijan exactos; los interiores se comparten tal cual
+    xs[0], xs[-1], ys[0], ys[-1] = xmin, xmax, ymin, ymax
+    return [[xs[i], ys[j], xs[i + 1], ys[j + 1]] for j in range(ny) for i in range(nx)]
+
@@ -0,0 +1,56 @@
+# conftest.py
+"""
+Configuración común de las pruebas.
+
+Los módulos de app2 se importan como en producción (sin paquete) y `ee` se
+resuelve al backend local sobre NumPy (ee_local.py), así que ninguna prueba
+llama a Earth Engine. La aplicación se importa una sola vez por sesión, con
+datos sintéticos y bases de datos en un directorio temporal.
+"""
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+os.environ['SUPERBLOOM_EE_BACKEND'] = 'local'
+
+import ee_local  # noqa: E402
+
+ee_local.instalar()
+
+# Región y ventanas dentro de los datos sintéticos (2022-2024, -116..-114, 32..33.5)
+COORDS = [-115.3, 32.5, -115.1, 32.7]
+FECHAS = {
+    'historic_start': '2023-03-01',
+    'historic_end': '2023-05-31',
+    'current_start': '2024-03-01',
+    'current_end': '2024-05-31',
+}
+
+
+@pytest.fixture(scope='session')
+def app_local(tmp_path_factory):
+    directorio = tmp_path_factory.mktemp('superbloom')
+    datos = str(directorio / 'datos')
+    ee_local.generar_datos_sinteticos(datos, tamano_s2=60, tamano_modis=24)
+    ee_local.DATOS_DIR = datos
+    os.environ.update(
+        SUPERBLOOM_EE_LOCAL_DATOS=datos,
+        SUPERBLOOM_CACHE_DB=str(directorio / 'cache.sqlite3'),
+        SUPERBLOOM_TRABAJOS_DB=str(directorio / 'trabajos.sqlite3'),
+        SUPERBLOOM_GRAFICAS_DIR=str(directorio / 'graficas'),
+    )
+    import app
+    return app
+
+
+@pytest.fixture
+def cliente(app_local):
+    return app_local.app.test_client()
+
+
+@pytest.fixture
+def cuerpo():
+    return dict(FECHAS, coords=list(COORDS))
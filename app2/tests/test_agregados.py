@@ -0,0 +1,33 @@
+import math
+
+import numpy as np
+
+from agregados import SUFIJO_CUADRADO, agregado_desde_salida, resumir, sumar
+
+
+def agregado(valores):
+    valores = np.asarray(valores, dtype=float)
+    return (float(valores.sum()), int(valores.size), float((valores ** 2).sum()))
+
+
+def test_sumar_partes_equivale_a_la_region_completa():
+    rng = np.random.default_rng(0)
+    valores = rng.normal(0.4, 0.1, 1000)
+    partes = [agregado(p) for p in np.array_split(valores, 7)]
+    media, desviacion, pixeles = resumir(sumar(partes))
+    assert pixeles == 1000
+    assert math.isclose(media, valores.mean(), rel_tol=1e-12)
+    assert math.isclose(desviacion, valores.std(), rel_tol=1e-9)
+
+
+def test_resumir_sin_pixeles():
+    assert resumir((0.0, 0, 0.0)) == (None, None, 0)
+    assert resumir(sumar([])) == (None, None, 0)
+
+
+def test_agregado_desde_salida():
+    salida = {'ndvi_sum': 3.0, 'ndvi_count': 6, f'ndvi{SUFIJO_CUADRADO}_sum': 1.75}
+    assert agregado_desde_salida(salida, 'ndvi') == (3.0, 6, 1.75)
+    # Una celda sin píxeles válidos (conteo 0 o ausente) aporta un agregado nulo
+    assert agregado_desde_salida({'ndvi_sum': None, 'ndvi_count': 0}, 'ndvi') == (0.0, 0, 0.0)
+    assert agregado_desde_salida({}, 'lst') == (0.0, 0, 0.0)
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from cache_celdas import CacheCeldas
+from cache_resultados import CacheResultados
+
+
+@pytest.fixture
+def caches_vacias(app_local, tmp_path, monkeypatch):
+    # Cada prueba parte de cachés propias para no depender del orden de ejecución
+    def reiniciar(sufijo=''):
+        monkeypatch.setattr(app_local, 'cache_resultados', CacheResultados(str(tmp_path / f'resultados{sufijo}.sqlite3')))
+        monkeypatch.setattr(app_local, 'cache_celdas',
+                            CacheCeldas(str(tmp_path / f'celdas{sufijo}.sqlite3'), tamano=app_local.cache_celdas.tamano))
+    reiniciar()
+    return reiniciar
+
+
+def test_analizar_avanzado(cliente, cuerpo, caches_vacias):
+    respuesta = cliente.post('/analizar-avanzado', json=cuerpo)
+    assert respuesta.status_code == 200
+    datos = respuesta.get_json()
+    ndvi = datos['dashboard_data']['actual']['ndvi']['valor']
+    assert ndvi is not None and -1 <= ndvi <= 1
+    assert datos['cobertura']['modo'] == 'celdas'
+    assert datos['estadisticas']['lst_c']['media'] is not None
+
+
+def test_parametros_invalidos(cliente, cuerpo):
+    assert cliente.post('/analizar-avanzado', json={'coords': cuerpo['coords']}).status_code == 400
+    assert cliente.post('/analizar-avanzado', json=dict(cuerpo, modo='muestreo', precision=2)).status_code == 400
+
+
+def test_acierto_de_cache_devuelve_los_mismos_bytes(app_local, cliente, cuerpo, caches_vacias):
+    primera = cliente.post('/analizar-avanzado', json=cuerpo).get_data()
+    segunda = cliente.post('/analizar-avanzado', json=cuerpo).get_data()
+    assert segunda == primera
+    assert app_local.cache_resultados.estadisticas()['aciertos_memoria'] == 1
+    # También desde disco, con la memoria del proceso vacía
+    app_local.cache_resultados._memoria.clear()
+    assert cliente.post('/analizar-avanzado', json=cuerpo).get_data() == primera
+    assert app_local.cache_resultados.estadisticas()['aciertos_disco'] == 1
+
+
+def test_las_celdas_se_reutilizan_entre_regiones(app_local, cliente, cuerpo, caches_vacias):
+    # Región desplazada del mismo tamaño (mismas escalas): comparte un cuarto de las celdas
+    desplazada = dict(cuerpo, coords=[-115.2, 32.6, -115.0, 32.8])
+    assert app_local.escalas_adaptativas(desplazada['coords']) == app_local.escalas_adaptativas(cuerpo['coords'])
+    cliente.post('/analizar-avanzado', json=cuerpo)
+    reutilizada = cliente.post('/analizar-avanzado', json=desplazada).get_json()
+    cobertura = reutilizada['cobertura']
+    assert (cobertura['celdas'], cobertura['celdas_cache'], cobertura['celdas_calculadas']) == (400, 100, 300)
+
+    # Con cachés vacías la misma región se calcula entera y da los mismos valores
+    caches_vacias('_nuevas')
+    calculada = cliente.post('/analizar-avanzado', json=desplazada).get_json()
+    assert calculada['cobertura']['celdas_calculadas'] == 400
+    for nombre, estadistica in calculada['estadisticas'].items():
+        assert reutilizada['estadisticas'][nombre]['media'] == pytest.approx(estadistica['media'], rel=1e-9)
+
+
+def test_muestreo_informa_la_fraccion_valida(cliente, cuerpo, caches_vacias):
+    datos = cliente.post('/analizar-avanzado', json=dict(cuerpo, modo='muestreo', precision=0.2)).get_json()
+    assert datos['cobertura']['modo'] == 'muestreo'
+    ndvi = datos['estadisticas']['ndvi_c']
+    assert 0 < ndvi['fraccion_valida'] <= 1
+    assert ndvi['ic95'][0] <= ndvi['media'] <= ndvi['ic95'][1]
+
+
+def test_explain_no_evalua_el_analisis(cliente, cuerpo):
+    plan = cliente.post('/explain', json=cuerpo).get_json()
+    assert plan['decision'] == 'ejecutar' and plan['reduccion'] == 'celdas'
+    assert set(plan['variables']) >= {'ndvi', 'temperatura', 'precipitacion'}
+
+
+@pytest.mark.parametrize('series', [
+    5,
+    [5],
+    [{'timeseries': 'x'}],
+    [{'timeseries': [{'ndvi': 0.3}]}],
+    [{'timeseries': [{'date': '2024-13-01'}]}],
+    [{'timeseries': [{'date': '2024-01-01', 'ndvi': 'alto'}]}],
+])
+def test_graficas_rechaza_series_mal_formadas(cliente, series):
+    respuesta = cliente.post('/graficas', json={'series': series, 'tipos': ['ndvi']})
+    assert respuesta.status_code == 400
+    assert 'error' in json.loads(respuesta.get_data())
+
+
+def test_estado(cliente):
+    estado = cliente.get('/estado').get_json()
+    assert {'ejecutores', 'cache_resultados', 'cache_celdas', 'coalescencia'} <= set(estado)
+    # Sin SUPERBLOOM_GETINFO_VENTANA_MS no hay agrupador de getInfo
+    assert estado['microlotes'] is None
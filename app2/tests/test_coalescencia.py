@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from coalescencia import VueloUnico
+
+
+def lanzar(vuelo, clave, fn, resultados, n):
+    hilos = [threading.Thread(target=lambda i=i: resultados.__setitem__(i, capturar(vuelo.ejecutar, clave, fn)))
+             for i in range(n)]
+    for hilo in hilos:
+        hilo.start()
+    return hilos
+
+
+def capturar(fn, *args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        return e
+
+
+def test_peticiones_identicas_comparten_un_calculo():
+    vuelo = VueloUnico('prueba')
+    llamadas, liberar = [], threading.Event()
+
+    def calculo():
+        llamadas.append(1)
+        liberar.wait(5)
+        return 'payload'
+
+    resultados = {}
+    hilos = lanzar(vuelo, 'k', calculo, resultados, 4)
+    # Los seguidores esperan al líder, que sigue bloqueado hasta liberar
+    while vuelo.estadisticas()['coalescidas'] < 3:
+        pass
+    liberar.set()
+    for hilo in hilos:
+        hilo.join(5)
+    assert llamadas == [1]
+    assert list(resultados.values()) == ['payload'] * 4
+    assert vuelo.estadisticas() == {'nombre': 'prueba', 'en_vuelo': 0, 'lideres': 1, 'coalescidas': 3}
+
+
+def test_claves_distintas_no_se_coalescen_y_el_error_se_comparte():
+    vuelo = VueloUnico('prueba')
+    assert vuelo.ejecutar('a', lambda: 1) == 1
+    assert vuelo.ejecutar('b', lambda: 2) == 2
+    liberar = threading.Event()
+
+    def falla():
+        liberar.wait(5)
+        raise ValueError('sin datos')
+
+    resultados = {}
+    hilos = lanzar(vuelo, 'c', falla, resultados, 2)
+    while vuelo.estadisticas()['coalescidas'] < 1:
+        pass
+    liberar.set()
+    for hilo in hilos:
+        hilo.join(5)
+    assert all(isinstance(r, ValueError) for r in resultados.values())
+    # Terminado el vuelo, la clave se puede volver a calcular
+    with pytest.raises(ValueError):
+        vuelo.ejecutar('c', falla)
+    assert vuelo.estadisticas()['lideres'] == 4
@@ -0,0 +1,20 @@
+from coste import cota_escenas, dias, escenas_por_pixel, factor_reduccion
+
+
+def test_dias_y_cota_de_escenas():
+    assert dias('2024-03-01', '2024-05-31') == 91
+    assert dias('2024-05-31T00:00:00', '2024-03-01') == 0
+    assert cota_escenas('2024-03-01', '2024-03-11', 0.5) == 5
+
+
+def test_escenas_por_pixel():
+    assert escenas_por_pixel(40, 1e4, None) == 40
+    assert escenas_por_pixel(40, 1e4, 1e5) == 40
+    assert escenas_por_pixel(40, 1e6, 1e5) == 4
+
+
+def test_factor_reduccion():
+    assert factor_reduccion(10, 100) == 1
+    assert factor_reduccion(400, 100) == 2
+    assert factor_reduccion(401, 100) == 4
+    assert factor_reduccion(1e30, 1) == 1024
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+import motor_local
+
+
+def test_enmascarar_nubes_s2():
+    bandas = {'SCL': np.array([[4, 8], [11, 3]]), 'B4': np.array([[1000, 2000], [3000, 4000]])}
+    enmascaradas = motor_local.enmascarar_nubes_s2(bandas)
+    np.testing.assert_array_equal(enmascaradas['B4'], [[0.1, np.nan], [0.3, np.nan]])
+
+
+def test_a_celsius_descarta_el_relleno():
+    np.testing.assert_allclose(motor_local.a_celsius(np.array([0, 15000])), [np.nan, 26.85])
+
+
+def test_compuestos_con_observaciones_enmascaradas():
+    pila = np.array([[[1.0, np.nan]], [[3.0, np.nan]]])
+    np.testing.assert_array_equal(motor_local.compuesto_suma(pila), [[4.0, np.nan]])
+    np.testing.assert_array_equal(motor_local.compuesto_media(pila), [[2.0, np.nan]])
+    np.testing.assert_array_equal(motor_local.compuesto_mediana(pila), [[2.0, np.nan]])
+
+
+def test_indices():
+    np.testing.assert_allclose(motor_local.diferencia_normalizada(np.array([3.0, 0.0]), np.array([1.0, 0.0])),
+                               [0.5, np.nan])
+    evi = motor_local.evi(np.array([0.4]), np.array([0.1]), np.array([0.05]))
+    assert evi[0] == pytest.approx(2.5 * 0.3 / (0.4 + 0.6 - 0.375 + 1))
+    assert motor_local.media_region(np.array([np.nan, 1.0, 3.0])) == 2.0
+    assert motor_local.media_region(np.array([np.nan])) is None
+
+
+def test_cargar_y_filtrar_pila(tmp_path):
+    fechas = ['2024-01-05', '2024-01-20', '2024-02-05']
+    np.savez(tmp_path / 'pila.npz', fechas=np.array(fechas), limites=np.array([0, 0, 1, 1]),
+             B4=np.arange(12, dtype=np.uint16).reshape(3, 2, 2))
+    pila = motor_local.cargar_pila(str(tmp_path / 'pila.npz'))
+    assert pila['bandas']['B4'].dtype == np.float64 and pila['limites'] == [0.0, 0.0, 1.0, 1.0]
+    enero = motor_local.filtrar_fechas(pila, '2024-01-01', '2024-02-01')
+    assert enero['fechas'] == fechas[:2] and enero['bandas']['B4'].shape == (2, 2, 2)
+    assert motor_local.indices_fechas(fechas, '2024-01-20', '2024-02-05') == [1]
+
+    mapeada = motor_local.cargar_pila(str(tmp_path / 'pila.npz'), directorio_mmap=str(tmp_path))
+    assert mapeada['bandas']['B4'].dtype == np.uint16
+    np.testing.assert_array_equal(mapeada['bandas']['B4'], pila['bandas']['B4'])
+    assert mapeada['fechas'] == fechas
+
+
+def test_formato_no_soportado():
+    with pytest.raises(ValueError):
+        motor_local.cargar_pila('pila.csv')
@@ -0,0 +1,63 @@
+import math
+
+import numpy as np
+
+from muestreo import ESTRATOS_MAX, MUESTRAS_MAX, MUESTRAS_MIN, estimar_estratificado, numero_estratos, tamano_muestra
+
+
+def resumen(muestreados, valores):
+    valores = np.asarray(valores, dtype=float)
+    n = valores.size
+    return (muestreados, n, float(valores.mean()) if n else None,
+            float(valores.var(ddof=1)) if n > 1 else None)
+
+
+def test_tamano_muestra_y_estratos():
+    assert tamano_muestra(0.05) == math.ceil((1.959964 / 0.05) ** 2)
+    assert tamano_muestra(1.0) == MUESTRAS_MIN
+    assert tamano_muestra(1e-4) == MUESTRAS_MAX
+    assert numero_estratos(5) == 1
+    assert numero_estratos(10 ** 6) == ESTRATOS_MAX
+
+
+def test_sin_mascara_es_el_estimador_estratificado_clasico():
+    resumenes = [(10, 10, 1.0, 0.5), (10, 10, 3.0, 0.5)]
+    estimacion = estimar_estratificado(resumenes)
+    assert estimacion['media'] == 2.0
+    assert math.isclose(estimacion['error_estandar'], math.sqrt(0.25 * 0.5 / 10 * 2))
+    assert estimacion['fraccion_valida'] == 1.0
+    assert estimacion['ic95'][0] < 2.0 < estimacion['ic95'][1]
+
+
+def test_pondera_cada_estrato_por_su_fraccion_valida():
+    # Mismo área, pero el segundo estrato sólo tiene un 10 % de píxeles válidos: la media
+    # sobre los píxeles válidos pesa 10:1 hacia el primero, no 1:1
+    resumenes = [resumen(100, [1.0] * 100), resumen(100, [3.0] * 10)]
+    estimacion = estimar_estratificado(resumenes)
+    assert math.isclose(estimacion['media'], (100 * 1.0 + 10 * 3.0) / 110)
+    assert math.isclose(estimacion['fraccion_valida'], 0.55)
+    assert estimacion['muestras'] == 110
+
+
+def test_insesgado_y_cobertura_con_mascaras_desiguales():
+    rng = np.random.default_rng(1)
+    verdad = (1000 * 1.0 + 100 * 3.0) / 1100
+    errores, cubre = [], 0
+    for _ in range(400):
+        resumenes = [resumen(200, rng.normal(media, 1, rng.binomial(200, fraccion)))
+                     for fraccion, media in ((1.0, 1.0), (0.1, 3.0))]
+        estimacion = estimar_estratificado(resumenes)
+        errores.append(estimacion['media'] - verdad)
+        cubre += estimacion['ic95'][0] <= verdad <= estimacion['ic95'][1]
+    assert abs(np.mean(errores)) < 0.02
+    assert 0.9 <= cubre / 400 <= 0.99
+
+
+def test_estratos_vacios():
+    # Un estrato sin píxeles muestreados se descarta; uno sin válidos cuenta con fracción 0
+    estimacion = estimar_estratificado([(0, 0, None, None), (50, 0, None, None), resumen(50, [2.0, 4.0])])
+    assert estimacion['estratos'] == 2
+    assert estimacion['media'] == 3.0
+    assert math.isclose(estimacion['fraccion_valida'], 0.02)
+    vacia = estimar_estratificado([(20, 0, None, None)])
+    assert vacia['media'] is None and vacia['fraccion_valida'] == 0.0
@@ -0,0 +1,19 @@
+from resolucion import ESCALONES, elegir_escala, opciones_reduccion
+
+
+def test_elegir_escala_respeta_la_minima_y_el_presupuesto():
+    # 1 km² a 10 m son 10⁴ píxeles: cabe en el presupuesto a la escala mínima
+    assert elegir_escala(1.0, 10, 1e6) == 10
+    assert elegir_escala(1.0, 250, 1e6) == 250
+    # 10⁴ km² con 10⁶ píxeles piden ~100 m
+    assert elegir_escala(1e4, 10, 1e6) == 100
+    assert elegir_escala(1e9, 10, 1e6) == ESCALONES[-1]
+    assert elegir_escala(1.0, 10, 0) == ESCALONES[-1]
+
+
+def test_opciones_reduccion():
+    assert opciones_reduccion(1e5, 1e7) == {'tileScale': 1, 'bestEffort': False}
+    assert opciones_reduccion(5e5, 1e7) == {'tileScale': 2, 'bestEffort': False}
+    assert opciones_reduccion(3e6, 1e7) == {'tileScale': 4, 'bestEffort': False}
+    assert opciones_reduccion(5e6, 1e7) == {'tileScale': 8, 'bestEffort': False}
+    assert opciones_reduccion(2e7, 1e7) == {'tileScale': 16, 'bestEffort': True}
@@ -0,0 +1,30 @@
+from datetime import date
+
+from series import AlmacenSeries, id_punto, mediana, mes_consolidado, meses_entre, siguiente_mes
+
+
+def test_meses():
+    assert siguiente_mes('2024-01') == '2024-02'
+    assert siguiente_mes('2024-12') == '2025-01'
+    assert meses_entre(2023, 2024, hoy=date(2024, 3, 15))[-1] == '2024-03'
+    assert len(meses_entre(2022, 2023, hoy=date(2025, 1, 1))) == 24
+    assert mes_consolidado('2024-02', hoy=date(2024, 3, 6))
+    assert not mes_consolidado('2024-02', hoy=date(2024, 3, 5))
+
+
+def test_mediana_e_id_punto():
+    assert mediana([]) is None
+    assert mediana([3, 1, 2]) == 2
+    assert mediana([4, 1, 3, 2]) == 2.5
+    assert id_punto(32.123456, -115.0) == '32.12346,-115.00000'
+
+
+def test_almacen_solo_anexa(tmp_path):
+    almacen = AlmacenSeries(str(tmp_path / 'series.sqlite3'))
+    punto = id_punto(32.5, -115.2)
+    almacen.anexar([(punto, 'ndvi', 10, '2024-01', 0.4, 3), (punto, 'ndvi', 10, '2024-02', None, 0)])
+    # Un mes ya anexado no se sobrescribe
+    almacen.anexar([(punto, 'ndvi', 10, '2024-01', 0.9, 5)])
+    assert almacen.obtener(punto, 'ndvi', 10, ['2024-01', '2024-02', '2024-03']) == {
+        '2024-01': (0.4, 3), '2024-02': (None, 0)}
+    assert almacen.obtener(punto, 'ndvi', 20, ['2024-01']) == {}
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import motor_local
+import tendencias
+from series import siguiente_mes
+
+MESES = [f'{a}-{m:02d}' for a in range(2019, 2025) for m in range(1, 13)]
+
+
+@pytest.fixture
+def cubo():
+    rng = np.random.default_rng(0)
+    t = tendencias.tiempos_decimales(MESES)
+    pendiente = rng.normal(0, 0.02, (17, 13))
+    valores = (0.3 + pendiente[None] * (t - t[0])[:, None, None] + 0.15 * np.sin(2 * np.pi * t)[:, None, None]
+               + rng.normal(0, 0.03, (len(t), 17, 13)))
+    valores[rng.random(valores.shape) < 0.3] = np.nan
+    valores[:, 0, 0] = np.nan
+    return valores
+
+
+def test_ols_coincide_con_polyfit(cubo):
+    t = tendencias.tiempos_decimales(MESES)
+    rasters = tendencias.rasters_tendencia(cubo, t)
+    y = cubo[:, 5, 7]
+    validos = np.isfinite(y)
+    assert rasters['pendiente'][5, 7] == pytest.approx(np.polyfit(t[validos], y[validos], 1)[0], rel=1e-5)
+    assert np.isnan(rasters['pendiente'][0, 0]) and rasters['observaciones'][0, 0] == 0
+
+
+def test_theil_sen_coincide_con_la_fuerza_bruta(cubo):
+    t = tendencias.tiempos_decimales(MESES)
+    rasters = tendencias.rasters_tendencia(cubo, t, 'theil-sen', meses=MESES)
+    d = tendencias.desestacionalizar(cubo[:, 9, 3], MESES)
+    v = np.flatnonzero(np.isfinite(d))
+    pares = [(d[j] - d[i]) / (t[j] - t[i]) for k, i in enumerate(v) for j in v[k + 1:]]
+    assert rasters['pendiente'][9, 3] == pytest.approx(np.median(pares), rel=1e-5)
+
+
+@pytest.mark.parametrize('metodo', ['ols', 'theil-sen'])
+def test_el_resultado_no_depende_de_las_franjas(cubo, metodo):
+    t = tendencias.tiempos_decimales(MESES)
+    completo = tendencias.rasters_tendencia(cubo, t, metodo)
+    por_franjas = tendencias.rasters_tendencia(cubo, t, metodo, memoria_max=30000)
+    for clave in completo:
+        np.testing.assert_array_equal(completo[clave], por_franjas[clave])
+
+
+def test_p_valor_student():
+    p = tendencias.p_valor_student(np.array([2.228, 12.706, 0.0]), np.array([10, 1, 5]))
+    np.testing.assert_allclose(p, [0.05, 0.05, 1.0], atol=1e-3)
+
+
+def test_cubo_por_franjas_desde_memmap(tmp_path):
+    rng = np.random.default_rng(2)
+    fechas = [f'2023-{m:02d}-{d:02d}' for m in range(1, 13) for d in (3, 17) if m != 4]
+    forma = (len(fechas), 23, 19)
+    np.savez(tmp_path / 'pila.npz', fechas=np.array(fechas), limites=np.array([0, 0, 1, 1.]),
+             B8=rng.integers(1000, 5000, forma).astype(np.uint16), B4=rng.integers(300, 3000, forma).astype(np.uint16),
+             SCL=rng.choice([4, 5, 8, 9], forma).astype(np.uint8))
+    meses = [f'2023-{m:02d}' for m in range(1, 13)]
+    pila = motor_local.cargar_pila(str(tmp_path / 'pila.npz'))
+    capas = []
+    for mes in meses:
+        bandas = motor_local.enmascarar_nubes_s2(
+            motor_local.filtrar_fechas(pila, f'{mes}-01', f'{siguiente_mes(mes)}-01')['bandas'])
+        ndvi = motor_local.diferencia_normalizada(bandas['B8'], bandas['B4'])
+        capas.append(motor_local.compuesto_mediana(ndvi) if ndvi.shape[0] else np.full(forma[1:], np.nan))
+    referencia = np.stack(capas)
+    np.testing.assert_array_equal(tendencias.cubo_ndvi_mensual(pila, meses), referencia)
+
+    mapeada = motor_local.cargar_pila(str(tmp_path / 'pila.npz'), directorio_mmap=str(tmp_path))
+    assert isinstance(mapeada['bandas']['B8'], np.memmap)
+    salida = np.lib.format.open_memmap(str(tmp_path / 'cubo.npy'), mode='w+', dtype=np.float64, shape=referencia.shape)
+    np.testing.assert_array_equal(tendencias.cubo_ndvi_mensual(mapeada, meses, salida, memoria_max=20000), referencia)
+    assert np.isnan(referencia[3]).all()
+
+
+def test_clasificar():
+    clases = tendencias.clasificar(np.array([0.1, -0.1, 0.1, np.nan]), np.array([0.01, 0.01, 0.5, np.nan]))
+    np.testing.assert_array_equal(clases, [1, -1, 0, 0])
@@ -0,0 +1,34 @@
+import math
+
+import pytest
+
+from cache_celdas import area_km2
+from teselas import dividir_igual_area, margen_geodesico, pixeles_estimados, teselas_necesarias
+
+COORDS = [-116.0, 30.0, -110.0, 34.0]
+
+
+@pytest.mark.parametrize('n', [1, 4, 7, 16])
+def test_teselas_de_igual_area_que_cubren_la_region(n):
+    teselas = dividir_igual_area(COORDS, n)
+    assert len(teselas) >= n
+    areas = [area_km2(t) for t in teselas]
+    assert max(areas) == pytest.approx(min(areas), rel=1e-9)
+    assert sum(areas) == pytest.approx(area_km2(COORDS), rel=1e-9)
+    assert min(t[0] for t in teselas) == COORDS[0] and max(t[2] for t in teselas) == COORDS[2]
+    assert min(t[1] for t in teselas) == COORDS[1] and max(t[3] for t in teselas) == COORDS[3]
+
+
+def test_margen_amplia_la_cobertura():
+    margen = margen_geodesico(COORDS)
+    assert margen > 0
+    teselas = dividir_igual_area(COORDS, 4, margen)
+    assert min(t[1] for t in teselas) == pytest.approx(COORDS[1] - margen)
+    assert max(t[3] for t in teselas) == pytest.approx(COORDS[3] + margen)
+
+
+def test_teselas_necesarias():
+    pixeles = pixeles_estimados(COORDS, 100)
+    assert pixeles == pytest.approx(area_km2(COORDS) * 1e6 / 1e4)
+    assert teselas_necesarias(COORDS, 100, pixeles * 2) == 1
+    assert teselas_necesarias(COORDS, 100, pixeles / 3) == math.ceil(3)
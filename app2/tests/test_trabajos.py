@@ -0,0 +1,56 @@
+import sqlite3
+import threading
+import time
+
+from trabajos import COMPLETADO, GestorTrabajos
+
+
+def esperar(gestor, job_id, plazo=5):
+    limite = time.time() + plazo
+    while time.time() < limite:
+        trabajo = gestor.obtener(job_id)
+        if trabajo['estado'] == COMPLETADO:
+            return trabajo
+        time.sleep(0.02)
+    return gestor.obtener(job_id)
+
+
+def test_un_trabajo_en_curso_no_se_reclama_y_uno_huerfano_lo_gana_un_solo_proceso(tmp_path):
+    ruta = str(tmp_path / 'trabajos.sqlite3')
+    ejecuciones, liberar = [], threading.Event()
+
+    def funcion(parametros, progreso):
+        ejecuciones.append(parametros['n'])
+        liberar.wait(5)
+        return '{}'
+
+    # Dos gestores sobre la misma base de datos hacen de dos workers de gunicorn
+    primero = GestorTrabajos(ruta, funcion, concesion=30)
+    segundo = GestorTrabajos(ruta, funcion, concesion=30)
+    job_id, nuevo = primero.enviar('clave', {'n': 1})
+    assert nuevo
+    assert segundo.reanudar_pendientes() == 0
+
+    with sqlite3.connect(ruta) as con:
+        con.execute("INSERT INTO trabajos (id, clave, estado, parametros, creado, actualizado, propietario, concesion) "
+                    "VALUES ('huerfano', 'otra', 'en_proceso', '{\"n\": 2}', 0, 0, 'caido', 0)")
+    reclamados = []
+    hilos = [threading.Thread(target=lambda g=g: reclamados.append(g.reanudar_pendientes())) for g in (primero, segundo)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(5)
+    assert sorted(reclamados) == [0, 1]
+
+    liberar.set()
+    assert esperar(primero, job_id)['estado'] == COMPLETADO
+    assert esperar(segundo, 'huerfano')['estado'] == COMPLETADO
+    assert sorted(ejecuciones) == [1, 2]
+
+
+def test_envio_duplicado_se_adjunta(tmp_path):
+    gestor = GestorTrabajos(str(tmp_path / 'trabajos.sqlite3'), lambda parametros, progreso: '{"ok": true}')
+    job_id, nuevo = gestor.enviar('clave', {})
+    assert nuevo
+    assert gestor.enviar('clave', {}) == (job_id, False)
+    assert esperar(gestor, job_id)['resultado'] == {'ok': True}
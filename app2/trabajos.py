@@ -0,0 +1,168 @@
+# trabajos.py
+"""
+Trabajos asíncronos para análisis largos.
+
+Un POST crea (o reutiliza) un trabajo y responde de inmediato con su id; un pool
+acotado de hilos ejecuta el análisis y el estado se guarda en SQLite, de modo
+que los resultados sobreviven a un reinicio y los trabajos que quedaron a medias
+se vuelven a encolar.
+
+Varios procesos (workers de gunicorn) comparten la base de datos, así que cada
+trabajo sin terminar tiene un propietario y una concesión que caduca: el proceso
+que lo ejecuta la renueva periódicamente, y sólo un trabajo con la concesión
+caducada (su proceso murió) puede reclamarse, con un UPDATE condicional atómico.
+"""
+import json
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PENDIENTE = 'pendiente'
+EN_PROCESO = 'en_proceso'
+COMPLETADO = 'completado'
+ERROR = 'error'
+
+
+class GestorTrabajos:
+    def __init__(self, ruta_db, funcion, max_workers=2, concesion=60):
+        # funcion(parametros, progreso) -> payload JSON (str); progreso(fraccion, etapa)
+        self.ruta_db = ruta_db
+        self.funcion = funcion
+        self.concesion = concesion
+        self.propietario = uuid.uuid4().hex
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='trabajo')
+        self._lock = threading.Lock()
+        self._renovador = None
+        with self._conectar() as con:
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    id TEXT PRIMARY KEY,
+                    clave TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    progreso REAL NOT NULL DEFAULT 0,
+                    etapa TEXT,
+                    parametros TEXT NOT NULL,
+                    resultado TEXT,
+                    error TEXT,
+                    creado REAL NOT NULL,
+                    actualizado REAL NOT NULL
+                )""")
+            columnas = {fila[1] for fila in con.execute("PRAGMA table_info(trabajos)")}
+            for columna, tipo in (('propietario', 'TEXT'), ('concesion', 'REAL')):
+                if columna not in columnas:
+                    con.execute(f"ALTER TABLE trabajos ADD COLUMN {columna} {tipo}")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_clave ON trabajos (clave)")
+
+    def _conectar(self):
+        return sqlite3.connect(self.ruta_db, timeout=30)
+
+    def _actualizar(self, job_id, **campos):
+        campos['actualizado'] = time.time()
+        columnas = ', '.join(f"{c} = ?" for c in campos)
+        with self._conectar() as con:
+            con.execute(f"UPDATE trabajos SET {columnas} WHERE id = ?", (*campos.values(), job_id))
+
+    def enviar(self, clave, parametros, ttl=None):
+        """Devuelve (job_id, nuevo). Un envío duplicado se adjunta al trabajo existente.
+
+        Un trabajo completado hace más de `ttl` segundos ya no se reutiliza.
+        """
+        with self._lock, self._conectar() as con:
+            fila = con.execute(
+                "SELECT id, estado, actualizado FROM trabajos WHERE clave = ? AND estado != ? "
+                "ORDER BY creado DESC LIMIT 1",
+                (clave, ERROR)).fetchone()
+            if fila is not None and not (fila[1] == COMPLETADO and ttl is not None
+                                         and time.time() - fila[2] > ttl):
+                return fila[0], False
+            job_id = uuid.uuid4().hex
+            ahora = time.time()
+            con.execute(
+                "INSERT INTO trabajos (id, clave, estado, parametros, creado, actualizado, propietario, concesion) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, clave, PENDIENTE, json.dumps(parametros), ahora, ahora, self.propietario,
+                 ahora + self.concesion))
+        self._iniciar_renovador()
+        self._pool.submit(self._ejecutar, job_id, parametros)
+        return job_id, True
+
+    def _iniciar_renovador(self):
+        with self._lock:
+            if self._renovador is None:
+                self._renovador = threading.Thread(target=self._renovar, name='trabajos-concesion', daemon=True)
+                self._renovador.start()
+
+    def _renovar(self):
+        # Renueva las concesiones propias y, de paso, reclama las de procesos caídos
+        while True:
+            time.sleep(self.concesion / 3)
+            try:
+                with self._conectar() as con:
+                    con.execute("UPDATE trabajos SET concesion = ? WHERE propietario = ? AND estado IN (?, ?)",
+                                (time.time() + self.concesion, self.propietario, PENDIENTE, EN_PROCESO))
+                self.reanudar_pendientes()
+            except sqlite3.Error as e:
+                print(f"Error renovando concesiones de trabajos: {e}", file=sys.stderr)
+
+    def _ejecutar(self, job_id, parametros):
+        self._actualizar(job_id, estado=EN_PROCESO, etapa='iniciando')
+
+        def progreso(fraccion, etapa):
+            self._actualizar(job_id, progreso=round(fraccion, 3), etapa=etapa)
+
+        try:
+            payload = self.funcion(parametros, progreso)
+        except Exception as e:
+            print(f"Error en trabajo {job_id}: {e}", file=sys.stderr)
+            self._actualizar(job_id, estado=ERROR, error=str(e))
+            return
+        self._actualizar(job_id, estado=COMPLETADO, progreso=1.0, etapa='terminado', resultado=payload)
+
+    def obtener(self, job_id):
+        with self._conectar() as con:
+            fila = con.execute(
+                "SELECT id, estado, progreso, etapa, resultado, error, creado, actualizado FROM trabajos WHERE id = ?",
+                (job_id,)).fetchone()
+        if fila is None:
+            return None
+        job_id, estado, progreso, etapa, resultado, error, creado, actualizado = fila
+        return {
+            'job_id': job_id,
+            'estado': estado,
+            'progreso': progreso,
+            'etapa': etapa,
+            'resultado': json.loads(resultado) if resultado else None,
+            'error': error,
+            'creado': creado,
+            'actualizado': actualizado,
+        }
+
+    def reanudar_pendientes(self):
+        """Reclama y vuelve a encolar los trabajos sin terminar cuya concesión caducó.
+
+        Un trabajo que otro proceso vivo sigue ejecutando conserva su concesión y no
+        se toca; el UPDATE condicional garantiza que sólo un proceso gana cada trabajo.
+        """
+        with self._conectar() as con:
+            filas = con.execute(
+                "SELECT id, parametros FROM trabajos WHERE estado IN (?, ?) "
+                "AND (concesion IS NULL OR concesion < ?)",
+                (PENDIENTE, EN_PROCESO, time.time())).fetchall()
+        reclamados = 0
+        for job_id, parametros in filas:
+            ahora = time.time()
+            with self._conectar() as con:
+                ganado = con.execute(
+                    "UPDATE trabajos SET estado = ?, progreso = 0, etapa = 'reencolado', actualizado = ?, "
+                    "propietario = ?, concesion = ? WHERE id = ? AND estado IN (?, ?) "
+                    "AND (concesion IS NULL OR concesion < ?)",
+                    (PENDIENTE, ahora, self.propietario, ahora + self.concesion, job_id,
+                     PENDIENTE, EN_PROCESO, ahora)).rowcount
+            if ganado:
+                reclamados += 1
+                self._pool.submit(self._ejecutar, job_id, json.loads(parametros))
+        self._iniciar_renovador()
+        return reclamados